@@ -0,0 +1,147 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+
+Compression ratio against throughput for the occurrence resource data codecs, plus the end-to-end effect on database
+size and 'get_occurrence_data' throughput.
+
+    python benchmarks/compression.py [--occurrences 2000] [--size 16384]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.store.codec import Codec, LzmaCodec, ZlibCodec
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.topicstore import TopicStore
+
+WORDS = (
+    "topic",
+    "map",
+    "association",
+    "occurrence",
+    "scope",
+    "role",
+    "member",
+    "knowledge",
+    "graph",
+    "semantic",
+    "context",
+    "note",
+    "text",
+    "image",
+    "video",
+    "city",
+    "person",
+    "organisation",
+    "event",
+    "period",
+    "place",
+    "relation",
+    "narrower",
+    "broader",
+    "related",
+    "category",
+    "tag",
+    "the",
+    "of",
+    "and",
+    "in",
+    "to",
+)
+
+
+def make_text(size: int, random_: random.Random) -> bytes:
+    words: list[str] = []
+    length = 0
+    while length < size:
+        word = random_.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words).encode("utf-8")[:size]
+
+
+def make_json(size: int, random_: random.Random) -> bytes:
+    vertices = []
+    while len(json.dumps(vertices)) < size:
+        vertices.append({"x": round(random_.uniform(-1, 1), 4), "y": round(random_.uniform(-1, 1), 4), "z": 0.0})
+    return json.dumps({"scene": {"vertices": vertices}}).encode("utf-8")[:size]
+
+
+def benchmark_codec(codec: Codec, payload: bytes, repetitions: int) -> tuple[float, float, float]:
+    compressed = codec.compress(payload)
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        codec.compress(payload)
+    compress_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        codec.decompress(compressed)
+    decompress_seconds = time.perf_counter() - start
+    megabytes = len(payload) * repetitions / 1_000_000
+    return len(compressed) / len(payload), megabytes / compress_seconds, megabytes / decompress_seconds
+
+
+async def benchmark_store(codec: Codec | None, payloads: list[bytes]) -> tuple[int, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "benchmark.sqlite3")
+        store = TopicStore(database_path, codec=codec)
+        await store.create_database()
+        map_identifier = await store.create_map(1, "Benchmark")
+        occurrences = [
+            Occurrence(instance_of="text", topic_identifier=f"topic-{index}", resource_data=payload)
+            for index, payload in enumerate(payloads)
+        ]
+        await store.set_occurrences(map_identifier, occurrences, ontology_mode=OntologyMode.LENIENT)
+        size = os.path.getsize(database_path)
+        start = time.perf_counter()
+        for occurrence in occurrences[:500]:
+            await store.get_occurrence_data(map_identifier, occurrence.identifier)
+        reads_per_second = min(500, len(occurrences)) / (time.perf_counter() - start)
+    return size, reads_per_second
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--occurrences", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=16384, help="payload size in bytes")
+    parser.add_argument("--repetitions", type=int, default=50)
+    arguments = parser.parse_args()
+
+    random_ = random.Random(42)
+    payloads = {
+        "text": make_text(arguments.size, random_),
+        "json (3d scene)": make_json(arguments.size, random_),
+        "random (media)": random_.randbytes(arguments.size),
+    }
+    codecs: list[tuple[str, Codec]] = [
+        ("zlib level 1", ZlibCodec(1)),
+        ("zlib level 6", ZlibCodec(6)),
+        ("zlib level 9", ZlibCodec(9)),
+        ("lzma preset 1", LzmaCodec(1)),
+        ("lzma preset 6", LzmaCodec(6)),
+    ]
+    print(f"{'payload':<18}{'codec':<16}{'ratio':>8}{'compress MB/s':>16}{'decompress MB/s':>18}")
+    for payload_name, payload in payloads.items():
+        for codec_name, codec in codecs:
+            ratio, compress_rate, decompress_rate = benchmark_codec(codec, payload, arguments.repetitions)
+            print(f"{payload_name:<18}{codec_name:<16}{ratio:>8.3f}{compress_rate:>16.1f}{decompress_rate:>18.1f}")
+
+    print()
+    text_payloads = [make_text(arguments.size, random_) for _ in range(arguments.occurrences)]
+    print(f"{'store codec':<16}{'database bytes':>16}{'reads/s':>12}")
+    for codec_name, store_codec in (("none", None), ("zlib level 6", ZlibCodec(6))):
+        size, reads_per_second = asyncio.run(benchmark_store(store_codec, text_payloads))
+        print(f"{codec_name:<16}{size:>16}{reads_per_second:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+
+Load test: N concurrent clients share one TopicStore and run a weighted mix of reads and writes against a synthetic
+database for a fixed duration. Reports throughput, p50/p95/p99 latency per operation, SQLITE_BUSY ('database is
+locked') errors and event-loop lag, both per interval and in total.
+
+    python benchmarks/loadtest.py [--clients 32] [--duration 10] [--interval 1] [--pool-size 8] [--shards 0]
+        [--maps 4] [--topics 2000] [--associations 6000] [--occurrences 2000]
+        [--mix get_topic=40,get_related_topics=15,get_topic_occurrences=15,get_occurrence_data=15,get_maps=5,
+               set_topic=4,set_occurrence=4,set_association=2]
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+import aiosqlite
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+USER_IDENTIFIER = 1
+DEFAULT_MIX = (
+    "get_topic=40,get_related_topics=15,get_topic_occurrences=15,get_occurrence_data=15,get_maps=5,"
+    "set_topic=4,set_occurrence=4,set_association=2"
+)
+
+
+class Dataset:
+    def __init__(self) -> None:
+        self.map_identifiers: list[int] = []
+        self.topic_identifiers: dict[int, list[str]] = {}  # Map -> topics
+        self.occurrence_identifiers: dict[int, list[str]] = {}  # Map -> occurrences
+
+
+class Statistics:
+    # Latencies, errors and event-loop lag of one interval (or of the whole run)
+    def __init__(self) -> None:
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.errors: defaultdict[str, int] = defaultdict(int)
+        self.busy: defaultdict[str, int] = defaultdict(int)
+        self.lags: list[float] = []
+
+    def all_latencies(self) -> list[float]:
+        return [latency for latencies in self.latencies.values() for latency in latencies]
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    result = {}
+    for item in mix.split(","):
+        operation, _, weight = item.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise SystemExit(f"Unknown operation '{operation}' (available: {', '.join(OPERATIONS)})")
+        result[operation] = int(weight or 1)
+    return result
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    # Nearest-rank percentile of unsorted values
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values), max(1, math.ceil(fraction * len(values)))) - 1]
+
+
+def is_busy(error: Exception) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def make_payload(random_: random.Random) -> bytes:
+    return random_.randbytes(random_.randint(256, 4096))
+
+
+async def populate(
+    store: TopicStore, map_count: int, topic_count: int, association_count: int, occurrence_count: int
+) -> Dataset:
+    dataset = Dataset()
+    random_ = random.Random(42)
+    for index in range(map_count):
+        map_identifier = await store.create_map(USER_IDENTIFIER, f"Load test {index}")
+        topics = [Topic(instance_of="topic") for _ in range(topic_count)]
+        await store.set_topics(map_identifier, topics, ontology_mode=OntologyMode.LENIENT)
+        topic_identifiers = [topic.identifier for topic in topics]
+        associations = [
+            Association(
+                instance_of="related",
+                src_topic_ref=random_.choice(topic_identifiers),
+                dest_topic_ref=random_.choice(topic_identifiers),
+            )
+            for _ in range(association_count)
+        ]
+        await store.set_associations(map_identifier, associations, ontology_mode=OntologyMode.LENIENT)
+        occurrences = [
+            Occurrence(
+                instance_of="text",
+                topic_identifier=random_.choice(topic_identifiers),
+                resource_data=make_payload(random_),
+            )
+            for _ in range(occurrence_count)
+        ]
+        await store.set_occurrences(map_identifier, occurrences, ontology_mode=OntologyMode.LENIENT)
+        dataset.map_identifiers.append(map_identifier)
+        dataset.topic_identifiers[map_identifier] = topic_identifiers
+        dataset.occurrence_identifiers[map_identifier] = [occurrence.identifier for occurrence in occurrences]
+    return dataset
+
+
+# region Operations
+async def get_topic(store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random) -> None:
+    await store.get_topic(map_identifier, random_.choice(dataset.topic_identifiers[map_identifier]))
+
+
+async def get_related_topics(store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random) -> None:
+    await store.get_related_topics(map_identifier, random_.choice(dataset.topic_identifiers[map_identifier]))
+
+
+async def get_topic_occurrences(
+    store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random
+) -> None:
+    await store.get_topic_occurrences(map_identifier, random_.choice(dataset.topic_identifiers[map_identifier]))
+
+
+async def get_occurrence_data(store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random) -> None:
+    await store.get_occurrence_data(map_identifier, random_.choice(dataset.occurrence_identifiers[map_identifier]))
+
+
+async def get_maps(store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random) -> None:
+    await store.get_maps(USER_IDENTIFIER)
+
+
+async def set_topic(store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random) -> None:
+    topic = Topic(instance_of="topic")
+    await store.set_topic(map_identifier, topic, ontology_mode=OntologyMode.LENIENT)
+    dataset.topic_identifiers[map_identifier].append(topic.identifier)
+
+
+async def set_occurrence(store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random) -> None:
+    occurrence = Occurrence(
+        instance_of="text",
+        topic_identifier=random_.choice(dataset.topic_identifiers[map_identifier]),
+        resource_data=make_payload(random_),
+    )
+    await store.set_occurrence(map_identifier, occurrence, ontology_mode=OntologyMode.LENIENT)
+    dataset.occurrence_identifiers[map_identifier].append(occurrence.identifier)
+
+
+async def set_association(store: TopicStore, dataset: Dataset, map_identifier: int, random_: random.Random) -> None:
+    topic_identifiers = dataset.topic_identifiers[map_identifier]
+    association = Association(
+        instance_of="related",
+        src_topic_ref=random_.choice(topic_identifiers),
+        dest_topic_ref=random_.choice(topic_identifiers),
+    )
+    await store.set_association(map_identifier, association, ontology_mode=OntologyMode.LENIENT)
+
+
+OPERATIONS = {
+    "get_topic": get_topic,
+    "get_related_topics": get_related_topics,
+    "get_topic_occurrences": get_topic_occurrences,
+    "get_occurrence_data": get_occurrence_data,
+    "get_maps": get_maps,
+    "set_topic": set_topic,
+    "set_occurrence": set_occurrence,
+    "set_association": set_association,
+}
+# endregion
+
+
+async def client(
+    store: TopicStore,
+    dataset: Dataset,
+    mix: dict[str, int],
+    deadline: float,
+    seed: int,
+    intervals: list[Statistics],
+    total: Statistics,
+) -> None:
+    random_ = random.Random(seed)
+    operations = list(mix)
+    weights = list(mix.values())
+    while (start := time.perf_counter()) < deadline:
+        operation = random_.choices(operations, weights)[0]
+        map_identifier = random_.choice(dataset.map_identifiers)
+        error = None
+        try:
+            await OPERATIONS[operation](store, dataset, map_identifier, random_)
+        except (TopicDbError, aiosqlite.Error) as exception:
+            error = exception
+        latency = time.perf_counter() - start
+        for statistics in (intervals[-1], total):
+            if error is None:
+                statistics.latencies[operation].append(latency)
+            else:
+                statistics.errors[operation] += 1
+                if is_busy(error):
+                    statistics.busy[operation] += 1
+
+
+async def monitor_lag(deadline: float, period: float, intervals: list[Statistics], total: Statistics) -> None:
+    # Event-loop lag: how much later than requested a short sleep returns
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await asyncio.sleep(period)
+        lag = max(0.0, time.perf_counter() - start - period)
+        intervals[-1].lags.append(lag)
+        total.lags.append(lag)
+
+
+def print_interval(elapsed: float, interval: float, statistics: Statistics) -> None:
+    latencies = statistics.all_latencies()
+    print(
+        f"{elapsed:>8.1f}{len(latencies) / interval:>10.0f}{percentile(latencies, 0.5) * 1000:>10.2f}"
+        f"{percentile(latencies, 0.99) * 1000:>10.2f}{sum(statistics.errors.values()):>8}"
+        f"{sum(statistics.busy.values()):>8}{max(statistics.lags, default=0.0) * 1000:>12.2f}"
+    )
+
+
+async def report_intervals(start: float, deadline: float, interval: float, intervals: list[Statistics]) -> None:
+    print(f"{'time s':>8}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'busy':>8}{'max lag ms':>12}")
+    next_report = start + interval
+    while next_report <= deadline + 1e-9:
+        await asyncio.sleep(max(0.0, next_report - time.perf_counter()))
+        statistics = intervals[-1]
+        intervals.append(Statistics())
+        print_interval(next_report - start, interval, statistics)
+        next_report += interval
+
+
+def print_summary(duration: float, statistics: Statistics) -> None:
+    print()
+    print(
+        f"{'operation':<24}{'count':>9}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        f"{'errors':>8}{'busy':>8}"
+    )
+    rows = [(operation, latencies) for operation, latencies in sorted(statistics.latencies.items())]
+    rows.append(("all", statistics.all_latencies()))
+    for operation, latencies in rows:
+        errors = sum(statistics.errors.values()) if operation == "all" else statistics.errors[operation]
+        busy = sum(statistics.busy.values()) if operation == "all" else statistics.busy[operation]
+        print(
+            f"{operation:<24}{len(latencies):>9}{len(latencies) / duration:>10.0f}"
+            f"{percentile(latencies, 0.5) * 1000:>10.2f}{percentile(latencies, 0.95) * 1000:>10.2f}"
+            f"{percentile(latencies, 0.99) * 1000:>10.2f}{max(latencies, default=0.0) * 1000:>10.2f}"
+            f"{errors:>8}{busy:>8}"
+        )
+    lags = statistics.lags
+    print()
+    print(
+        f"event-loop lag: p50 {percentile(lags, 0.5) * 1000:.2f} ms, p99 {percentile(lags, 0.99) * 1000:.2f} ms, "
+        f"max {max(lags, default=0.0) * 1000:.2f} ms"
+    )
+
+
+async def run(arguments: argparse.Namespace, database_path: str) -> None:
+    mix = parse_mix(arguments.mix)
+    async with TopicStore(database_path, pool_size=arguments.pool_size, shard_count=arguments.shards) as store:
+        start = time.perf_counter()
+        await store.create_database()
+        dataset = await populate(store, arguments.maps, arguments.topics, arguments.associations, arguments.occurrences)
+        print(
+            f"populated {arguments.maps} map(s) with {arguments.topics} topics, {arguments.associations} associations "
+            f"and {arguments.occurrences} occurrences each: {time.perf_counter() - start:.2f} s"
+        )
+        print(
+            f"{arguments.clients} clients for {arguments.duration:g} s, mix {', '.join(f'{k}={v}' for k, v in mix.items())}"
+        )
+        print()
+
+        intervals = [Statistics()]
+        total = Statistics()
+        start = time.perf_counter()
+        deadline = start + arguments.duration
+        await asyncio.gather(
+            report_intervals(start, deadline, arguments.interval, intervals),
+            monitor_lag(deadline, arguments.lag_period, intervals, total),
+            *(client(store, dataset, mix, deadline, seed, intervals, total) for seed in range(arguments.clients)),
+        )
+        print_summary(time.perf_counter() - start, total)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between interval reports")
+    parser.add_argument("--lag-period", type=float, default=0.01, help="seconds between event-loop lag probes")
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--shards", type=int, default=0)
+    parser.add_argument("--maps", type=int, default=4)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--associations", type=int, default=6000)
+    parser.add_argument("--occurrences", type=int, default=2000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated operation=weight pairs")
+    parser.add_argument("--database", help="database path (default: a temporary file)")
+    arguments = parser.parse_args()
+
+    if arguments.database:
+        asyncio.run(run(arguments, arguments.database))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(arguments, os.path.join(directory, "loadtest.sqlite3")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+
+File size and lookup speed of the standard and the compact storage layouts, for a map with UUID identifiers. The
+compact database is produced from the standard one with 'migrate_storage_layout'; both are vacuumed before measuring.
+
+    python benchmarks/storagelayout.py [--topics 20000] [--associations 60000] [--lookups 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.storagelayout import StorageLayout
+from aiotopicdb.store.topicstore import TopicStore
+
+
+def member_bytes(database_path: str) -> int | None:
+    # Bytes used by the association member rows and their indexes ('dbstat' is not available in every SQLite build)
+    connection = sqlite3.connect(database_path)
+    try:
+        record = connection.execute(
+            """SELECT SUM(pgsize) FROM dbstat WHERE name IN (
+                SELECT name FROM sqlite_schema WHERE tbl_name IN ('member', 'member_compact', 'topic_key')
+                UNION SELECT 'sqlite_autoindex_member_1'
+            )"""
+        ).fetchone()
+        return record[0]
+    except sqlite3.Error:
+        return None
+    finally:
+        connection.close()
+
+
+def vacuum(database_path: str) -> None:
+    connection = sqlite3.connect(database_path)
+    connection.execute("VACUUM")
+    connection.close()
+
+
+async def populate(database_path: str, topic_count: int, association_count: int) -> tuple[int, list[str], list[str]]:
+    store = TopicStore(database_path)
+    await store.create_database()
+    map_identifier = await store.create_map(1, "Benchmark")
+    random_ = random.Random(42)
+    topics = [Topic(instance_of="topic") for _ in range(topic_count)]
+    await store.set_topics(map_identifier, topics, ontology_mode=OntologyMode.LENIENT)
+    topic_identifiers = [topic.identifier for topic in topics]
+    association_identifiers = []
+    for start in range(0, association_count, 10_000):
+        associations = [
+            Association(
+                instance_of="related",
+                src_topic_ref=random_.choice(topic_identifiers),
+                dest_topic_ref=random_.choice(topic_identifiers),
+            )
+            for _ in range(min(10_000, association_count - start))
+        ]
+        await store.set_associations(map_identifier, associations, ontology_mode=OntologyMode.LENIENT)
+        association_identifiers.extend(association.identifier for association in associations)
+    return map_identifier, topic_identifiers, association_identifiers
+
+
+async def benchmark_lookups(
+    database_path: str, map_identifier: int, topic_identifiers: list[str], association_identifiers: list[str]
+) -> tuple[float, float, float]:
+    async with TopicStore(database_path, pool_size=4) as store:
+        start = time.perf_counter()
+        for identifier in association_identifiers:
+            await store.get_association(map_identifier, identifier)
+        association_rate = len(association_identifiers) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for identifier in topic_identifiers:
+            await store.get_topic_associations(map_identifier, identifier)
+        topic_association_rate = len(topic_identifiers) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        await store.get_topic_graph(map_identifier)
+        graph_seconds = time.perf_counter() - start
+    return association_rate, topic_association_rate, graph_seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=20_000)
+    parser.add_argument("--associations", type=int, default=60_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        standard_path = os.path.join(directory, "standard.sqlite3")
+        compact_path = os.path.join(directory, "compact.sqlite3")
+        map_identifier, topic_identifiers, association_identifiers = asyncio.run(
+            populate(standard_path, arguments.topics, arguments.associations)
+        )
+        shutil.copyfile(standard_path, compact_path)
+        start = time.perf_counter()
+        asyncio.run(TopicStore(compact_path).migrate_storage_layout(StorageLayout.COMPACT))
+        print(f"migration to the compact layout: {time.perf_counter() - start:.2f} s")
+        vacuum(standard_path)
+        vacuum(compact_path)
+
+        random_ = random.Random(7)
+        topic_sample = random_.sample(topic_identifiers, min(arguments.lookups, len(topic_identifiers)))
+        association_sample = random_.sample(
+            association_identifiers, min(arguments.lookups, len(association_identifiers))
+        )
+        print()
+        print(
+            f"{'layout':<10}{'file bytes':>14}{'member bytes':>14}{'get_association/s':>20}"
+            f"{'get_topic_associations/s':>26}{'graph load s':>14}"
+        )
+        for layout, database_path in ((StorageLayout.STANDARD, standard_path), (StorageLayout.COMPACT, compact_path)):
+            association_rate, topic_association_rate, graph_seconds = asyncio.run(
+                benchmark_lookups(database_path, map_identifier, topic_sample, association_sample)
+            )
+            members = member_bytes(database_path)
+            print(
+                f"{str(layout).lower():<10}{os.path.getsize(database_path):>14}"
+                f"{members if members is not None else 'n/a':>14}{association_rate:>20.0f}"
+                f"{topic_association_rate:>26.0f}{graph_seconds:>14.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,104 @@ December 8, 2024
 """
 
 NETWORK_MAX_DEPTH = 3
+EARTH_RADIUS = 6371.0088  # Mean earth radius in kilometres
 UNIVERSAL_SCOPE = "*"
 DATABASE_PATH = "contextualise.sqlite3"
-DDL = """
+# Attribute values are stored as text. The typed value is what range and equality queries are evaluated (and indexed)
+# against: numbers as REAL, timestamps as Julian day numbers, booleans as 0/1 and strings as-is.
+ATTRIBUTE_TYPED_VALUE = """CASE data_type
+        WHEN 'number' THEN CAST(value AS REAL)
+        WHEN 'timestamp' THEN julianday(value)
+        WHEN 'boolean' THEN CASE WHEN lower(value) IN ('true', '1', 'yes') THEN 1 ELSE 0 END
+        ELSE value
+    END"""
+MEMBER_DDL = """CREATE TABLE IF NOT EXISTS member (
+    map_identifier INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    association_identifier TEXT NOT NULL,
+    src_topic_ref TEXT NOT NULL,
+    src_role_spec TEXT NOT NULL,
+    dest_topic_ref TEXT NOT NULL,
+    dest_role_spec TEXT NOT NULL,
+    PRIMARY KEY (map_identifier, identifier)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS member_1_index ON member(map_identifier, association_identifier, src_role_spec, src_topic_ref, dest_role_spec, dest_topic_ref);
+"""
+# Compact storage layout: identifiers are interned to integer keys per map ('topic_key'), so a member row is six
+# integers instead of seven columns of identifiers, and the unique index over it shrinks accordingly. 'member' becomes a view with
+# the standard layout's columns (and 'rowid', the member's key), written through INSTEAD OF triggers, so queries work
+# unchanged against either layout.
+COMPACT_MEMBER_DDL = """CREATE TABLE IF NOT EXISTS topic_key (
+    key INTEGER PRIMARY KEY,
+    map_identifier INTEGER NOT NULL,
+    identifier TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS topic_key_1_index ON topic_key (map_identifier, identifier);
+CREATE TABLE IF NOT EXISTS member_compact (
+    member_key INTEGER PRIMARY KEY,
+    association_key INTEGER NOT NULL,
+    src_topic_key INTEGER NOT NULL,
+    src_role_key INTEGER NOT NULL,
+    dest_topic_key INTEGER NOT NULL,
+    dest_role_key INTEGER NOT NULL
+);
+-- Keys are unique across maps, so a member's map is the map of its association's key
+CREATE UNIQUE INDEX IF NOT EXISTS member_compact_1_index ON member_compact (
+    association_key, src_role_key, src_topic_key, dest_role_key, dest_topic_key
+);
+CREATE INDEX IF NOT EXISTS member_compact_2_index ON member_compact (src_topic_key);
+CREATE INDEX IF NOT EXISTS member_compact_3_index ON member_compact (dest_topic_key);
+CREATE VIEW IF NOT EXISTS member AS SELECT
+    member_compact.member_key AS rowid,
+    association.map_identifier AS map_identifier,
+    member_.identifier AS identifier,
+    association.identifier AS association_identifier,
+    src_topic.identifier AS src_topic_ref,
+    src_role.identifier AS src_role_spec,
+    dest_topic.identifier AS dest_topic_ref,
+    dest_role.identifier AS dest_role_spec
+FROM member_compact
+JOIN topic_key AS association ON association.key = member_compact.association_key
+JOIN topic_key AS member_ ON member_.key = member_compact.member_key
+JOIN topic_key AS src_topic
+    ON src_topic.map_identifier = association.map_identifier AND src_topic.key = member_compact.src_topic_key
+JOIN topic_key AS src_role ON src_role.key = member_compact.src_role_key
+JOIN topic_key AS dest_topic
+    ON dest_topic.map_identifier = association.map_identifier AND dest_topic.key = member_compact.dest_topic_key
+JOIN topic_key AS dest_role ON dest_role.key = member_compact.dest_role_key;
+CREATE TRIGGER IF NOT EXISTS member_insert_trigger INSTEAD OF INSERT ON member BEGIN
+    INSERT OR IGNORE INTO topic_key (map_identifier, identifier) VALUES
+        (new.map_identifier, new.identifier),
+        (new.map_identifier, new.association_identifier),
+        (new.map_identifier, new.src_topic_ref),
+        (new.map_identifier, new.src_role_spec),
+        (new.map_identifier, new.dest_topic_ref),
+        (new.map_identifier, new.dest_role_spec);
+    INSERT INTO member_compact (member_key, association_key, src_topic_key, src_role_key, dest_topic_key, dest_role_key)
+    SELECT member_.key, association.key, src_topic.key, src_role.key, dest_topic.key, dest_role.key
+    FROM topic_key AS member_, topic_key AS association, topic_key AS src_topic, topic_key AS src_role,
+        topic_key AS dest_topic, topic_key AS dest_role
+    WHERE member_.map_identifier = new.map_identifier AND member_.identifier = new.identifier
+        AND association.map_identifier = new.map_identifier AND association.identifier = new.association_identifier
+        AND src_topic.map_identifier = new.map_identifier AND src_topic.identifier = new.src_topic_ref
+        AND src_role.map_identifier = new.map_identifier AND src_role.identifier = new.src_role_spec
+        AND dest_topic.map_identifier = new.map_identifier AND dest_topic.identifier = new.dest_topic_ref
+        AND dest_role.map_identifier = new.map_identifier AND dest_role.identifier = new.dest_role_spec;
+END;
+CREATE TRIGGER IF NOT EXISTS member_delete_trigger INSTEAD OF DELETE ON member BEGIN
+    DELETE FROM member_compact WHERE member_key = old.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS member_update_trigger INSTEAD OF UPDATE ON member BEGIN
+    DELETE FROM member_compact WHERE member_key = old.rowid;
+    INSERT INTO member (
+        map_identifier, identifier, association_identifier, src_topic_ref, src_role_spec, dest_topic_ref, dest_role_spec
+    )
+    VALUES (
+        new.map_identifier, new.identifier, new.association_identifier, new.src_topic_ref, new.src_role_spec,
+        new.dest_topic_ref, new.dest_role_spec
+    );
+END;"""
+DDL = f"""
 CREATE TABLE IF NOT EXISTS topic (
     map_identifier INTEGER NOT NULL,
     identifier TEXT NOT NULL,
@@ -21,6 +116,7 @@ CREATE INDEX IF NOT EXISTS topic_2_index ON topic (map_identifier, instance_of);
 CREATE INDEX IF NOT EXISTS topic_3_index ON topic (map_identifier, identifier, scope);
 CREATE INDEX IF NOT EXISTS topic_4_index ON topic (map_identifier, instance_of, scope);
 CREATE INDEX IF NOT EXISTS topic_5_index ON topic (map_identifier, scope);
+CREATE INDEX IF NOT EXISTS topic_6_index ON topic (map_identifier, instance_of, identifier);
 CREATE TABLE IF NOT EXISTS basename (
     map_identifier INTEGER NOT NULL,
     identifier TEXT NOT NULL,
@@ -34,18 +130,8 @@ CREATE INDEX IF NOT EXISTS basename_1_index ON basename (map_identifier);
 CREATE INDEX IF NOT EXISTS basename_2_index ON basename (map_identifier, topic_identifier);
 CREATE INDEX IF NOT EXISTS basename_3_index ON basename (map_identifier, topic_identifier, scope);
 CREATE INDEX IF NOT EXISTS basename_4_index ON basename (map_identifier, topic_identifier, scope, language);
-CREATE TABLE IF NOT EXISTS member (
-    map_identifier INTEGER NOT NULL,
-    identifier TEXT NOT NULL,
-    association_identifier TEXT NOT NULL,
-    src_topic_ref TEXT NOT NULL,
-    src_role_spec TEXT NOT NULL,
-    dest_topic_ref TEXT NOT NULL,
-    dest_role_spec TEXT NOT NULL,
-    PRIMARY KEY (map_identifier, identifier)
-);
-CREATE UNIQUE INDEX IF NOT EXISTS member_1_index ON member(map_identifier, association_identifier, src_role_spec, src_topic_ref, dest_role_spec, dest_topic_ref);
-CREATE TABLE IF NOT EXISTS occurrence (
+CREATE INDEX IF NOT EXISTS basename_5_index ON basename (map_identifier, name, topic_identifier);
+{MEMBER_DDL}CREATE TABLE IF NOT EXISTS occurrence (
     map_identifier INTEGER NOT NULL,
     identifier TEXT NOT NULL,
     instance_of TEXT NOT NULL,
@@ -54,12 +140,15 @@ CREATE TABLE IF NOT EXISTS occurrence (
     resource_data BLOB,
     topic_identifier TEXT NOT NULL,
     language TEXT NOT NULL,
+    resource_hash TEXT,
+    resource_codec TEXT,
     PRIMARY KEY (map_identifier, identifier)
 );
 CREATE INDEX IF NOT EXISTS occurrence_1_index ON occurrence (map_identifier);
 CREATE INDEX IF NOT EXISTS occurrence_2_index ON occurrence (map_identifier, topic_identifier);
 CREATE INDEX IF NOT EXISTS occurrence_3_index ON occurrence (map_identifier, topic_identifier, scope, language);
 CREATE INDEX IF NOT EXISTS occurrence_4_index ON occurrence (map_identifier, topic_identifier, instance_of, scope, language);
+CREATE INDEX IF NOT EXISTS occurrence_5_index ON occurrence (map_identifier, instance_of, scope, language);
 CREATE TABLE IF NOT EXISTS attribute (
     map_identifier INTEGER NOT NULL,
     identifier TEXT NOT NULL,
@@ -69,6 +158,7 @@ CREATE TABLE IF NOT EXISTS attribute (
     data_type TEXT NOT NULL,
     scope TEXT NOT NULL,
     language TEXT NOT NULL,
+    typed_value GENERATED ALWAYS AS ({ATTRIBUTE_TYPED_VALUE}) VIRTUAL,
     PRIMARY KEY (map_identifier, entity_identifier, name, scope, language)
 );
 CREATE INDEX IF NOT EXISTS attribute_1_index ON attribute (map_identifier);
@@ -77,6 +167,7 @@ CREATE INDEX IF NOT EXISTS attribute_3_index ON attribute (map_identifier, entit
 CREATE INDEX IF NOT EXISTS attribute_4_index ON attribute (map_identifier, entity_identifier, language);
 CREATE INDEX IF NOT EXISTS attribute_5_index ON attribute (map_identifier, entity_identifier, scope);
 CREATE INDEX IF NOT EXISTS attribute_6_index ON attribute (map_identifier, entity_identifier, scope, language);
+CREATE INDEX IF NOT EXISTS attribute_7_index ON attribute (map_identifier, name, data_type, typed_value, entity_identifier);
 CREATE TABLE IF NOT EXISTS map (
     identifier INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
@@ -84,10 +175,17 @@ CREATE TABLE IF NOT EXISTS map (
     image_path TEXT,
     initialised BOOLEAN DEFAULT FALSE NOT NULL,
     published BOOLEAN DEFAULT FALSE NOT NULL,
-    promoted BOOLEAN DEFAULT FALSE NOT NULL
+    promoted BOOLEAN DEFAULT FALSE NOT NULL,
+    deleted BOOLEAN DEFAULT FALSE NOT NULL
 );
 CREATE INDEX IF NOT EXISTS map_1_index ON map (published);
 CREATE INDEX IF NOT EXISTS map_2_index ON map (promoted);
+CREATE INDEX IF NOT EXISTS map_3_index ON map (deleted);
+CREATE TABLE IF NOT EXISTS map_purge (
+    map_identifier INTEGER PRIMARY KEY,
+    table_name TEXT,
+    purged_rows INTEGER DEFAULT 0 NOT NULL
+);
 CREATE TABLE IF NOT EXISTS user_map (
     user_identifier INT NOT NULL,
     map_identifier INT NOT NULL,
@@ -96,8 +194,158 @@ CREATE TABLE IF NOT EXISTS user_map (
     PRIMARY KEY (user_identifier, map_identifier)
 );
 CREATE INDEX IF NOT EXISTS user_map_1_index ON user_map (owner);
+-- Resource data stored in the external (content-addressed) blob store. Reference counts are maintained by the
+-- triggers below, so cloning and purging maps share and release blobs without further bookkeeping.
+CREATE TABLE IF NOT EXISTS blob (
+    hash TEXT PRIMARY KEY,
+    reference_count INTEGER DEFAULT 0 NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS blob_1_index ON blob (reference_count);
+CREATE TRIGGER IF NOT EXISTS occurrence_blob_insert_trigger AFTER INSERT ON occurrence
+WHEN new.resource_hash IS NOT NULL BEGIN
+    INSERT INTO blob (hash, reference_count) VALUES (new.resource_hash, 1)
+    ON CONFLICT (hash) DO UPDATE SET reference_count = reference_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS occurrence_blob_update_trigger AFTER UPDATE OF resource_hash ON occurrence
+WHEN old.resource_hash IS NOT new.resource_hash BEGIN
+    UPDATE blob SET reference_count = reference_count - 1 WHERE hash = old.resource_hash;
+    INSERT INTO blob (hash, reference_count) SELECT new.resource_hash, 1 WHERE new.resource_hash IS NOT NULL
+    ON CONFLICT (hash) DO UPDATE SET reference_count = reference_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS occurrence_blob_delete_trigger AFTER DELETE ON occurrence
+WHEN old.resource_hash IS NOT NULL BEGIN
+    UPDATE blob SET reference_count = reference_count - 1 WHERE hash = old.resource_hash;
+END;
+CREATE TABLE IF NOT EXISTS base_topic (
+    identifier TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+) WITHOUT ROWID;
+-- Prebuilt rows of the base topics and their base names, which 'initialise_map' copies into a map
+CREATE TABLE IF NOT EXISTS base_topic_template (
+    identifier TEXT PRIMARY KEY,
+    instance_of TEXT NOT NULL,
+    base_name_identifier TEXT NOT NULL,
+    name TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    language TEXT NOT NULL
+) WITHOUT ROWID;
+-- The version of each map's content, bumped by the store once per write transaction. Caches of derived, map-wide
+-- data (facets, graphs, rankings and so on) are validated against it.
+CREATE TABLE IF NOT EXISTS map_state (
+    map_identifier INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
 CREATE VIRTUAL TABLE IF NOT EXISTS text USING fts5 (
     occurrence_identifier,
     resource_data
 );
-"""
\ No newline at end of file
+CREATE TABLE IF NOT EXISTS temporal (
+    map_identifier INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    topic_identifier TEXT NOT NULL,
+    type TEXT NOT NULL,
+    description TEXT,
+    media_url TEXT,
+    start_date TEXT NOT NULL,
+    end_date TEXT,
+    start_day INTEGER NOT NULL,
+    end_day INTEGER NOT NULL,
+    PRIMARY KEY (map_identifier, identifier)
+);
+CREATE INDEX IF NOT EXISTS temporal_1_index ON temporal (map_identifier, topic_identifier);
+CREATE INDEX IF NOT EXISTS temporal_2_index ON temporal (map_identifier, start_day);
+-- Interval index: one dimension for the map, one for the [start_day, end_day] interval (day numbers are proleptic
+-- Gregorian ordinals). Kept in sync with the 'temporal' table by the triggers below.
+CREATE VIRTUAL TABLE IF NOT EXISTS temporal_index USING rtree_i32 (
+    id,
+    min_map_identifier, max_map_identifier,
+    start_day, end_day
+);
+CREATE TRIGGER IF NOT EXISTS temporal_1_trigger AFTER INSERT ON temporal BEGIN
+    INSERT INTO temporal_index VALUES (new.rowid, new.map_identifier, new.map_identifier, new.start_day, new.end_day);
+END;
+CREATE TRIGGER IF NOT EXISTS temporal_2_trigger AFTER UPDATE ON temporal BEGIN
+    UPDATE temporal_index SET
+        min_map_identifier = new.map_identifier, max_map_identifier = new.map_identifier,
+        start_day = new.start_day, end_day = new.end_day
+    WHERE id = new.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS temporal_3_trigger AFTER DELETE ON temporal BEGIN
+    DELETE FROM temporal_index WHERE id = old.rowid;
+END;
+CREATE TABLE IF NOT EXISTS location (
+    map_identifier INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    topic_identifier TEXT NOT NULL,
+    description TEXT,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    PRIMARY KEY (map_identifier, identifier)
+);
+CREATE INDEX IF NOT EXISTS location_1_index ON location (map_identifier, topic_identifier);
+-- Spatial index: one dimension for the map and a degenerate (point) box for the coordinates. R*Tree boxes are stored
+-- as 32-bit floats (large map identifiers included), so candidates are re-checked against the 'location' table.
+CREATE VIRTUAL TABLE IF NOT EXISTS location_index USING rtree (
+    id,
+    min_map_identifier, max_map_identifier,
+    min_latitude, max_latitude,
+    min_longitude, max_longitude
+);
+CREATE TRIGGER IF NOT EXISTS location_1_trigger AFTER INSERT ON location BEGIN
+    INSERT INTO location_index VALUES (
+        new.rowid, new.map_identifier, new.map_identifier, new.latitude, new.latitude, new.longitude, new.longitude
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS location_2_trigger AFTER UPDATE ON location BEGIN
+    UPDATE location_index SET
+        min_map_identifier = new.map_identifier, max_map_identifier = new.map_identifier,
+        min_latitude = new.latitude, max_latitude = new.latitude,
+        min_longitude = new.longitude, max_longitude = new.longitude
+    WHERE id = new.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS location_3_trigger AFTER DELETE ON location BEGIN
+    DELETE FROM location_index WHERE id = old.rowid;
+END;
+-- Topic importance, computed in batch from the map's association graph ('topic_score_state' records the map version
+-- the scores were computed from)
+CREATE TABLE IF NOT EXISTS topic_score (
+    map_identifier INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    degree INTEGER NOT NULL,
+    pagerank REAL NOT NULL,
+    PRIMARY KEY (map_identifier, identifier)
+);
+CREATE INDEX IF NOT EXISTS topic_score_1_index ON topic_score (map_identifier, pagerank DESC);
+CREATE INDEX IF NOT EXISTS topic_score_2_index ON topic_score (map_identifier, degree DESC);
+CREATE TABLE IF NOT EXISTS topic_score_state (
+    map_identifier INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+-- The k most similar topics of every topic (by shared neighbours), with the fingerprints of the neighbour sets they
+-- were computed from so that refreshes only recompute what changed
+CREATE TABLE IF NOT EXISTS similar_topic (
+    map_identifier INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    similar_identifier TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (map_identifier, identifier, rank)
+);
+CREATE INDEX IF NOT EXISTS similar_topic_1_index ON similar_topic (map_identifier, similar_identifier);
+CREATE TABLE IF NOT EXISTS similar_topic_fingerprint (
+    map_identifier INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    fingerprint INTEGER NOT NULL,
+    PRIMARY KEY (map_identifier, identifier)
+);
+CREATE TABLE IF NOT EXISTS similar_topic_state (
+    map_identifier INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL,
+    measure TEXT NOT NULL,
+    k INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+# The same schema in the compact storage layout
+COMPACT_DDL = DDL.replace(MEMBER_DDL, COMPACT_MEMBER_DDL)
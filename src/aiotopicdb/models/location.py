@@ -6,6 +6,9 @@ December 8, 2024
 """
 
 import re
+import uuid
+
+from slugify import slugify  # type: ignore
 
 
 class Location:
@@ -13,31 +16,53 @@ class Location:
         r"^\s*([-+]?(?:90(?:\.0+)?|(?:[1-8]?\d(?:\.\d+)?)))\s*,\s*([-+]?(?:180(?:\.0+)?|(?:1[0-7]\d(?:\.\d+)?|(?:[1-9]?\d(?:\.\d+)?))))\s*$"
     )
 
-    def __init__(self, identifier: str = "", description: str = "Not provided") -> None:
-        self.__identifier = identifier
+    def __init__(self, identifier: str = "", description: str = "Not provided", topic_identifier: str = "") -> None:
+        self.__identifier = str(uuid.uuid4()) if identifier == "" else slugify(str(identifier))
+        self.__topic_identifier = slugify(str(topic_identifier))
         self.description = description
         self.__coordinates: str | None = None
+        self.__latitude: float | None = None
+        self.__longitude: float | None = None
 
     @property
     def identifier(self) -> str:
         return self.__identifier
 
+    @property
+    def topic_identifier(self) -> str:
+        return self.__topic_identifier
+
+    @topic_identifier.setter
+    def topic_identifier(self, value: str) -> None:
+        if value == "":
+            raise ValueError("Empty 'value' parameter")
+        self.__topic_identifier = slugify(str(value))
+
     @property
     def coordinates(self) -> str | None:
         return self.__coordinates
 
     @coordinates.setter
     def coordinates(self, value: str) -> None:
-        if not Location.coordinate_regex.match(value):
+        match = Location.coordinate_regex.match(value)
+        if not match:
             raise ValueError("Invalid coordinates")
         self.__coordinates = value
-        self.__latitude = value.split(",")[0] if value else ""
-        self.__longitude = value.split(",")[1] if value else ""
+        self.__latitude = float(match.group(1))
+        self.__longitude = float(match.group(2))
 
     @property
-    def latitude(self) -> str:
+    def latitude(self) -> float | None:
         return self.__latitude
 
     @property
-    def longitude(self) -> str:
+    def longitude(self) -> float | None:
         return self.__longitude
+
+    def set_position(self, latitude: float, longitude: float) -> None:
+        # Numeric counterpart of the 'coordinates' setter (avoids formatting and re-parsing a string)
+        if not -90.0 <= latitude <= 90.0 or not -180.0 <= longitude <= 180.0:
+            raise ValueError("Invalid coordinates")
+        self.__coordinates = f"{latitude},{longitude}"
+        self.__latitude = float(latitude)
+        self.__longitude = float(longitude)
@@ -6,6 +6,9 @@ December 8, 2024
 """
 
 import re
+import uuid
+
+from slugify import slugify  # type: ignore
 
 from .temporaltype import TemporalType
 
@@ -14,14 +17,19 @@ class Temporal:
     date_regex = re.compile(r"^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])$")  # Regex pattern for yyyy-mm-dd dates
 
     def __init__(
-        self, identifier: str = "", type: TemporalType = TemporalType.EVENT, description: str = "Not provided"
+        self,
+        identifier: str = "",
+        type: TemporalType = TemporalType.EVENT,
+        description: str = "Not provided",
+        topic_identifier: str = "",
     ) -> None:
-        self.__identifier = identifier
+        self.__identifier = str(uuid.uuid4()) if identifier == "" else slugify(str(identifier))
         self.__type = type
+        self.__topic_identifier = slugify(str(topic_identifier))
         self.description = description
         self.media_url = ""
         self.__start_date = ""
-        self.__end_date: str | None = None  # TODO: Include logic to check that the end date is always greater than the start date
+        self.__end_date: str | None = None
 
     @property
     def identifier(self) -> str:
@@ -35,6 +43,16 @@ class Temporal:
     def type_(self, value: TemporalType) -> None:
         self.__type = value
 
+    @property
+    def topic_identifier(self) -> str:
+        return self.__topic_identifier
+
+    @topic_identifier.setter
+    def topic_identifier(self, value: str) -> None:
+        if value == "":
+            raise ValueError("Empty 'value' parameter")
+        self.__topic_identifier = slugify(str(value))
+
     @property
     def start_date(self) -> str:
         return self.__start_date
@@ -43,6 +61,8 @@ class Temporal:
     def start_date(self, value: str) -> None:
         if not Temporal.date_regex.match(value):
             raise ValueError("Invalid date")
+        if self.__end_date is not None and value > self.__end_date:  # ISO 8601 dates compare lexicographically
+            raise ValueError("Start date cannot be later than the end date")
         self.__start_date = value
 
     @property
@@ -55,4 +75,6 @@ class Temporal:
             raise ValueError("Temporal event cannot have an end date")
         if not Temporal.date_regex.match(value):
             raise ValueError("Invalid date")
+        if self.__start_date and value < self.__start_date:
+            raise ValueError("End date cannot be earlier than the start date")
         self.__end_date = value
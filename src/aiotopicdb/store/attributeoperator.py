@@ -0,0 +1,22 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from enum import Enum
+
+
+class AttributeOperator(Enum):
+    EQUAL = 1
+    LESS_THAN = 2
+    LESS_THAN_OR_EQUAL = 3
+    GREATER_THAN = 4
+    GREATER_THAN_OR_EQUAL = 5
+    BETWEEN = 6  # Inclusive
+    PREFIX = 7  # String attributes only
+    IN = 8
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,68 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class BatchLoader:
+    # Collects the keys requested within one event-loop tick and loads them with a single call of 'load' per group
+    # (for instance, one 'IN (...)' query per map), in batches of at most 'batch_size' keys. Every caller gets the
+    # value loaded for its key, or None if there is none; if a batch fails, all of its callers get the error.
+    #
+    # Values are shared between the callers that request the same key, so 'load' should return immutable values
+    # (database rows rather than model objects).
+    def __init__(
+        self, load: Callable[[Hashable, list[Hashable]], Awaitable[dict[Hashable, Any]]], batch_size: int = 500
+    ) -> None:
+        self.load = load
+        self.batch_size = batch_size
+        self.__pending: dict[Hashable, dict[Hashable, list[asyncio.Future]]] = {}  # Group -> key -> callers
+        self.__scheduled = False
+        self.__tasks: set[asyncio.Task] = set()
+
+    async def get(self, group: Hashable, key: Hashable) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__pending.setdefault(group, {}).setdefault(key, []).append(future)
+        if not self.__scheduled:
+            # Runs once the tasks that are ready now have had their turn (and queued their keys)
+            self.__scheduled = True
+            loop.call_soon(self.__dispatch)
+        return await future
+
+    def __dispatch(self) -> None:
+        self.__scheduled = False
+        pending, self.__pending = self.__pending, {}
+        for group, callers in pending.items():
+            keys = list(callers)
+            for index in range(0, len(keys), self.batch_size):
+                batch = {key: callers[key] for key in keys[index : index + self.batch_size]}
+                task = asyncio.ensure_future(self.__load(group, batch))
+                self.__tasks.add(task)
+                task.add_done_callback(self.__tasks.discard)
+
+    async def __load(self, group: Hashable, batch: dict[Hashable, list[asyncio.Future]]) -> None:
+        try:
+            values = await self.load(group, list(batch))
+        except Exception as error:  # noqa: BLE001 - handed to every caller waiting on the batch
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+            return
+        except BaseException:
+            for futures in batch.values():
+                for future in futures:
+                    future.cancel()
+            raise
+        for key, futures in batch.items():
+            value = values.get(key)
+            for future in futures:
+                if not future.done():  # The caller may have been cancelled
+                    future.set_result(value)
@@ -0,0 +1,103 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+
+from aiotopicdb.topicdberror import TopicDbError
+
+BLOB_THRESHOLD = 64 * 1024  # Resource data of this size (in bytes) or larger is stored externally
+
+
+class BlobStore:
+    # Content-addressed file store: each distinct blob is stored once, under its SHA-256 hash. Reference counts live
+    # in the database's 'blob' table (maintained by triggers on 'occurrence'), not here. The methods are blocking
+    # and are meant to be run in a worker thread.
+    def __init__(self, directory: str, threshold: int = BLOB_THRESHOLD) -> None:
+        if threshold < 1:
+            raise TopicDbError("The blob threshold has to be a positive number of bytes")
+        self.__directory = directory
+        self.threshold = threshold
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    @staticmethod
+    def hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, hash_: str) -> str:
+        return os.path.join(self.__directory, hash_[:2], hash_[2:4], hash_)
+
+    def write(self, data: bytes) -> str:
+        result = self.hash(data)
+        path = self.path(result)
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # Keeps the garbage collector's grace period from expiring under a new reference
+                return result
+            except FileNotFoundError:
+                pass  # Collected in the meantime; stored anew
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so that readers never see a partially written blob
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return result
+
+    def read(self, hash_: str) -> bytes:
+        try:
+            with (
+                open(self.path(hash_), "rb") as file,
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file,
+            ):
+                return mapped_file[:]
+        except (OSError, ValueError) as error:
+            raise TopicDbError(f"Error reading blob {hash_}: {error}")
+
+    def delete(self, hash_: str) -> None:
+        try:
+            os.remove(self.path(hash_))
+        except FileNotFoundError:
+            pass
+
+    def collect(self, hash_: str, min_age: float = 0.0) -> bool:
+        # Deletes the blob unless it was modified less than 'min_age' seconds ago. The blob is moved out of the way
+        # before its age is checked, so a concurrent 'write' either refreshes it first (and it is kept) or finds it
+        # gone (and stores it anew). Returns whether the blob was deleted.
+        path = self.path(hash_)
+        collected_path = f"{path}.collected"
+        try:
+            os.replace(path, collected_path)
+        except FileNotFoundError:
+            return False
+        if os.path.getmtime(collected_path) > time.time() - min_age:
+            os.replace(collected_path, path)  # Identical to any copy a concurrent write has stored in the meantime
+            return False
+        os.remove(collected_path)
+        return True
+
+    def hashes(self, min_age: float = 0.0) -> list[str]:
+        # Hashes of the stored blobs last modified at least 'min_age' seconds ago
+        result: list[str] = []
+        cutoff = time.time() - min_age
+        for directory, _, file_names in os.walk(self.__directory):
+            for file_name in file_names:
+                if len(file_name) == 64 and os.path.getmtime(os.path.join(directory, file_name)) <= cutoff:
+                    result.append(file_name)
+        return result
@@ -0,0 +1,70 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import hashlib
+import math
+from collections.abc import Iterable
+
+
+class BloomFilter:
+    # Set membership without false negatives: a key that was added is always reported as (possibly) present, a key
+    # that was not is reported as absent except for a share of about 'false_positive_rate' of them. Keys cannot be
+    # removed. Once more keys than 'capacity' have been added the false-positive rate rises; 'saturated' tells when to
+    # rebuild the filter with a larger capacity.
+    #
+    # A 'max_bytes' limit takes precedence over the false-positive rate: the filter is made smaller (and less precise)
+    # to fit.
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01, max_bytes: int | None = None) -> None:
+        if not 0.0 < false_positive_rate < 1.0:
+            raise ValueError("The false-positive rate has to be between 0 and 1")
+        self.capacity = max(capacity, 1)
+        bit_count = math.ceil(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        if max_bytes is not None:
+            bit_count = min(bit_count, max(max_bytes, 1) * 8)
+        self.bit_count = max(bit_count, 8)
+        self.hash_count = max(1, round(self.bit_count / self.capacity * math.log(2)))
+        self.count = 0  # Keys added (including duplicates)
+        self.version = 0  # Version of the map the filter reflects
+        self.__bits = bytearray((self.bit_count + 7) // 8)
+
+    def __positions(self, key: str) -> Iterable[int]:
+        # Double hashing: k positions from two independent 64-bit hashes
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        hash1 = int.from_bytes(digest[:8], "little")
+        hash2 = int.from_bytes(digest[8:], "little") | 1
+        bit_count = self.bit_count
+        return ((hash1 + index * hash2) % bit_count for index in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        bits = self.__bits
+        for position in self.__positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.__bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(key))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def saturated(self) -> bool:
+        return self.count > self.capacity
+
+    @property
+    def false_positive_rate(self) -> float:
+        # Expected rate for the keys added so far
+        return (1.0 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+    @property
+    def memory_usage(self) -> int:
+        return len(self.__bits)
@@ -0,0 +1,53 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import lzma
+import zlib
+from abc import ABC, abstractmethod
+
+
+class Codec(ABC):
+    # Compression codec for occurrence resource data. The name is stored alongside the compressed data (in the
+    # occurrence's 'resource_codec' column) and has to stay stable once data has been written with it.
+    name = ""
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes: ...
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes: ...
+
+
+class ZlibCodec(Codec):
+    name = "zlib"
+
+    def __init__(self, level: int = 6) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class LzmaCodec(Codec):
+    name = "lzma"
+
+    def __init__(self, preset: int = 6) -> None:
+        self.preset = preset
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data, preset=self.preset)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data)
+
+
+def default_codecs() -> dict[str, Codec]:
+    # The codecs every store can decode resource data with, by name
+    return {codec.name: codec for codec in (ZlibCodec(), LzmaCodec())}
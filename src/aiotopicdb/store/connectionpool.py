@@ -0,0 +1,49 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+
+class ConnectionPool:
+    # Keeps up to 'size' idle connections open for reuse. The pool never makes callers wait: when no idle connection
+    # is available a new one is opened, and it is closed again on release if the pool is full. A size of 0 disables
+    # pooling (every connection is opened for a single use).
+    #
+    # aiosqlite runs every connection in its own (non-daemon) thread, so a pool with idle connections has to be
+    # closed before the interpreter exits.
+    def __init__(self, database_path: str, size: int = 0) -> None:
+        self.database_path = database_path
+        self.size = size
+        self.__idle: deque[aiosqlite.Connection] = deque()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        db = self.__idle.pop() if self.__idle else await aiosqlite.connect(self.database_path)
+        db.row_factory = None
+        try:
+            yield db
+        except BaseException:
+            # The connection may be in any state; don't hand it out again
+            await db.close()
+            raise
+        if db.in_transaction:
+            await db.rollback()
+        if len(self.__idle) < self.size:
+            self.__idle.append(db)
+        else:
+            await db.close()
+
+    async def close(self) -> None:
+        while self.__idle:
+            await self.__idle.pop().close()
+
+    def __len__(self) -> int:
+        return len(self.__idle)
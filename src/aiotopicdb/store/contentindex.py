@@ -0,0 +1,240 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # NumPy is optional; without it, scores are accumulated in pure Python
+    np = None
+
+CONTENT_INSTANCE_OFS = ("text", "note")  # Occurrence types that carry a topic's prose
+COMPACTION_RATIO = 0.1  # Rebuild the arrays once this share of the documents has been added or changed since
+MIN_COMPACTION_SIZE = 256
+
+_TOKEN = re.compile(r"[^\W\d_]{2,}")
+
+
+def tokenize(text: str) -> Counter:
+    return Counter(_TOKEN.findall(text.lower()))
+
+
+def term_weights(counts: Counter) -> dict[str, float]:
+    # Sublinear term frequency
+    return {term: 1.0 + math.log(count) for term, count in counts.items()}
+
+
+class ContentIndex:
+    # TF-IDF index of a map's topics, one document per topic (the text of its text and note occurrences).
+    #
+    # Documents are kept in two segments. The main segment is a pair of compact sparse arrays: documents -> terms
+    # (CSR) and terms -> documents (CSC, the postings that scoring runs over). Documents added or changed since the
+    # arrays were built live in a small delta segment of dictionaries, and the documents they replace are marked as
+    # deleted. Once the delta segment grows beyond COMPACTION_RATIO of the documents, both are merged into new
+    # arrays. Inverse document frequencies are always current; the norms of the main segment's documents are those
+    # of the last build, which drift only slightly between compactions.
+    def __init__(self, documents: Iterable[tuple[str, str]] = ()) -> None:
+        self.version = 0  # Version of the map the index reflects
+        self.__build([(identifier, term_weights(tokenize(text))) for identifier, text in documents])
+
+    def __build(self, documents: list[tuple[str, dict[str, float]]]) -> None:
+        self.__terms: dict[str, int] = {}
+        self.__term_list: list[str] = []
+        self.__document_frequencies = array("i")
+        self.__identifiers: list[str | None] = []
+        self.__documents: dict[str, int] = {}
+        document_offsets = array("q", [0])
+        document_terms = array("i")
+        document_weights = array("f")
+        for identifier, vector in documents:
+            if not vector:
+                continue
+            for term, weight in vector.items():
+                term_number = self.__intern(term)
+                document_terms.append(term_number)
+                document_weights.append(weight)
+                self.__document_frequencies[term_number] += 1
+            document_offsets.append(len(document_terms))
+            self.__documents[identifier] = len(self.__identifiers)
+            self.__identifiers.append(identifier)
+        self.__main_count = len(self.__identifiers)
+        self.__document_offsets = document_offsets
+        self.__document_terms = document_terms
+        self.__document_weights = document_weights
+        self.__live = bytearray(b"\x01") * self.__main_count
+        self.__live_count = self.__main_count
+        self.__delta: dict[int, dict[int, float]] = {}
+
+        # Postings: the main segment's (document, weight) pairs, grouped by term
+        term_count = len(self.__term_list)
+        if np is not None and document_terms:
+            terms = np.frombuffer(document_terms, np.int32)
+            order = np.argsort(terms, kind="stable")
+            documents_ = np.repeat(np.arange(self.__main_count, dtype=np.int32), np.diff(document_offsets))
+            counts = np.bincount(terms, minlength=term_count)
+            self.__term_offsets = array("q", np.concatenate([[0], np.cumsum(counts)]).astype(np.int64).tobytes())
+            self.__term_documents = array("i", documents_[order].tobytes())
+            self.__term_weights = array("f", np.frombuffer(document_weights, np.float32)[order].tobytes())
+        else:
+            term_offsets = array("q", [0]) * (term_count + 1)
+            for term_number in document_terms:
+                term_offsets[term_number + 1] += 1
+            for term_number in range(term_count):
+                term_offsets[term_number + 1] += term_offsets[term_number]
+            positions = array("q", term_offsets)
+            term_documents = array("i", [0]) * len(document_terms)
+            term_weights_ = array("f", [0.0]) * len(document_terms)
+            for document in range(self.__main_count):
+                for position in range(document_offsets[document], document_offsets[document + 1]):
+                    term_number = document_terms[position]
+                    term_documents[positions[term_number]] = document
+                    term_weights_[positions[term_number]] = document_weights[position]
+                    positions[term_number] += 1
+            self.__term_offsets = term_offsets
+            self.__term_documents = term_documents
+            self.__term_weights = term_weights_
+        self.__norms = array("d", (self.__norm(self.__vector(document)) for document in range(self.__main_count)))
+
+    def __len__(self) -> int:
+        return self.__live_count
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self.__documents
+
+    def __intern(self, term: str) -> int:
+        term_number = self.__terms.get(term)
+        if term_number is None:
+            term_number = self.__terms[term] = len(self.__term_list)
+            self.__term_list.append(term)
+            self.__document_frequencies.append(0)
+        return term_number
+
+    def __idf(self, term_number: int) -> float:
+        return math.log((1.0 + self.__live_count) / (1.0 + self.__document_frequencies[term_number])) + 1.0
+
+    def __vector(self, document: int) -> dict[int, float]:
+        if document >= self.__main_count:
+            return self.__delta[document]
+        start = self.__document_offsets[document]
+        end = self.__document_offsets[document + 1]
+        return dict(zip(self.__document_terms[start:end], self.__document_weights[start:end]))
+
+    def __norm(self, vector: dict[int, float]) -> float:
+        return math.sqrt(sum((weight * self.__idf(term_number)) ** 2 for term_number, weight in vector.items()))
+
+    def set_document(self, identifier: str, text: str) -> None:
+        self.remove_document(identifier)
+        counts = tokenize(text)
+        if not counts:
+            return
+        vector = {self.__intern(term): weight for term, weight in term_weights(counts).items()}
+        for term_number in vector:
+            self.__document_frequencies[term_number] += 1
+        document = len(self.__identifiers)
+        self.__documents[identifier] = document
+        self.__identifiers.append(identifier)
+        self.__live.append(1)
+        self.__live_count += 1
+        self.__delta[document] = vector
+        self.__norms.append(self.__norm(vector))
+        if len(self.__delta) > max(MIN_COMPACTION_SIZE, COMPACTION_RATIO * self.__live_count):
+            self.compact()
+
+    def remove_document(self, identifier: str) -> None:
+        document = self.__documents.pop(identifier, None)
+        if document is None:
+            return
+        for term_number in self.__vector(document):
+            self.__document_frequencies[term_number] -= 1
+        self.__live[document] = 0
+        self.__live_count -= 1
+        self.__identifiers[document] = None
+        self.__delta.pop(document, None)
+
+    def compact(self) -> None:
+        term_list = self.__term_list
+        documents = [
+            (identifier, {term_list[term_number]: weight for term_number, weight in self.__vector(document).items()})
+            for identifier, document in self.__documents.items()
+        ]
+        version = self.version
+        self.__build(documents)
+        self.version = version
+
+    def similar(self, identifier: str, k: int = 10) -> list[tuple[str, float]]:
+        # The k documents with the highest cosine similarity to the given topic's document, most similar first
+        document = self.__documents.get(identifier)
+        if document is None or k < 1:
+            return []
+        query = {
+            term_number: weight * self.__idf(term_number) for term_number, weight in self.__vector(document).items()
+        }
+        query_norm = math.sqrt(sum(weight * weight for weight in query.values()))
+        if query_norm == 0.0:
+            return []
+        main_term_count = len(self.__term_offsets) - 1
+        candidates: list[tuple[float, int]] = []
+
+        # Main segment: accumulate the postings of the query's terms
+        term_offsets = self.__term_offsets
+        if np is not None and self.__main_count:
+            documents = []
+            weights = []
+            term_documents = np.frombuffer(self.__term_documents, np.int32)
+            term_weights_ = np.frombuffer(self.__term_weights, np.float32)
+            for term_number, weight in query.items():
+                if term_number < main_term_count:
+                    start, end = term_offsets[term_number], term_offsets[term_number + 1]
+                    documents.append(term_documents[start:end])
+                    weights.append(term_weights_[start:end] * (weight * self.__idf(term_number)))
+            if documents:
+                scores = np.bincount(
+                    np.concatenate(documents), weights=np.concatenate(weights), minlength=self.__main_count
+                )
+                scores *= np.frombuffer(self.__live, np.uint8)[: self.__main_count]
+                norms = np.frombuffer(self.__norms, np.float64)[: self.__main_count]
+                scores = np.divide(scores, norms * query_norm, out=np.zeros_like(scores), where=norms > 0)
+                if document < self.__main_count:
+                    scores[document] = 0.0
+                count = min(k, len(scores))
+                top = np.argpartition(-scores, count - 1)[:count]
+                candidates.extend((float(scores[index]), int(index)) for index in top if scores[index] > 0.0)
+        else:
+            accumulator: dict[int, float] = {}
+            term_documents = self.__term_documents
+            term_weights_ = self.__term_weights
+            for term_number, weight in query.items():
+                if term_number < main_term_count:
+                    weight *= self.__idf(term_number)
+                    for position in range(term_offsets[term_number], term_offsets[term_number + 1]):
+                        other = term_documents[position]
+                        accumulator[other] = accumulator.get(other, 0.0) + term_weights_[position] * weight
+            for other, score in accumulator.items():
+                if other != document and self.__live[other] and self.__norms[other] > 0.0:
+                    candidates.append((score / (self.__norms[other] * query_norm), other))
+
+        # Delta segment
+        for other, vector in self.__delta.items():
+            if other == document or self.__norms[other] == 0.0:
+                continue
+            score = sum(
+                query[term_number] * weight * self.__idf(term_number)
+                for term_number, weight in vector.items()
+                if term_number in query
+            )
+            if score > 0.0:
+                candidates.append((score / (self.__norms[other] * query_norm), other))
+
+        return [
+            (self.__identifiers[other], score)  # type: ignore
+            for score, other in heapq.nlargest(k, candidates, key=lambda item: (item[0], -item[1]))
+        ]
@@ -0,0 +1,47 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from collections.abc import Iterable
+
+
+class OntologyRegistry:
+    # Per-map set of the identifiers known to refer to existing type topics (instance of, role spec and scope
+    # references). Each set is tagged with the map version it was last synchronised with.
+    def __init__(self, base_topics: Iterable[str]) -> None:
+        self.__base_topics = frozenset(base_topics)
+        self.__identifiers: dict[int, set[str]] = {}
+        self.__versions: dict[int, int] = {}
+
+    def is_loaded(self, map_identifier: int, version: int) -> bool:
+        return self.__versions.get(map_identifier) == version
+
+    def load(self, map_identifier: int, identifiers: Iterable[str], version: int) -> None:
+        self.__identifiers[map_identifier] = set(identifiers)
+        self.__versions[map_identifier] = version
+
+    def add(self, map_identifier: int, identifiers: Iterable[str], version: int | None = None) -> None:
+        self.__identifiers.setdefault(map_identifier, set()).update(identifiers)
+        if version is not None:
+            self.__versions[map_identifier] = version
+
+    def invalidate(self, map_identifier: int | None = None) -> None:
+        if map_identifier is None:
+            self.__identifiers.clear()
+            self.__versions.clear()
+        else:
+            self.__identifiers.pop(map_identifier, None)
+            self.__versions.pop(map_identifier, None)
+
+    def __contains__(self, keys: tuple[int, str]) -> bool:
+        map_identifier, identifier = keys
+        return identifier in self.__base_topics or identifier in self.__identifiers.get(map_identifier, ())
+
+    def missing(self, map_identifier: int, identifiers: Iterable[str]) -> set[str]:
+        known = self.__identifiers.get(map_identifier, set())
+        return {
+            identifier for identifier in identifiers if identifier not in self.__base_topics and identifier not in known
+        }
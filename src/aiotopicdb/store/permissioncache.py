@@ -0,0 +1,77 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import time
+from collections import OrderedDict, namedtuple
+
+Permission = namedtuple("Permission", ["owner", "collaboration_mode"])
+
+
+class PermissionCache:
+    # Short-lived (user identifier, map identifier) -> permission cache. A cached None means 'no access'. Changes made
+    # through the store invalidate entries right away; the TTL bounds staleness for changes made by other processes.
+    # Past 'max_entries', the least recently used entries are evicted.
+    def __init__(self, ttl: float = 5.0, max_entries: int = 100_000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__entries: OrderedDict[tuple[int, int], tuple[float, Permission | None]] = OrderedDict()
+        self.__users: dict[int, set[int]] = {}  # Map identifier -> users with a cached entry for the map
+        # Bumped by every invalidation. A read captures it before querying the database and passes it to 'set', which
+        # drops the result if an invalidation has happened since: it may predate the change invalidated for.
+        self.__generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
+    def get(self, user_identifier: int, map_identifier: int) -> tuple[bool, Permission | None]:
+        # (hit, permission) pair; a hit's permission can be None
+        entry = self.__entries.get((user_identifier, map_identifier))
+        if entry is None:
+            return False, None
+        if entry[0] < time.monotonic():
+            self.__remove(user_identifier, map_identifier)
+            return False, None
+        self.__entries.move_to_end((user_identifier, map_identifier))
+        return True, entry[1]
+
+    def set(
+        self, user_identifier: int, map_identifier: int, permission: Permission | None, generation: int | None = None
+    ) -> None:
+        if self.ttl <= 0 or (generation is not None and generation != self.__generation):
+            return
+        key = (user_identifier, map_identifier)
+        if key not in self.__entries:
+            while self.__entries and len(self.__entries) >= self.max_entries:
+                self.__remove(*next(iter(self.__entries)))
+        self.__entries[key] = (time.monotonic() + self.ttl, permission)
+        self.__entries.move_to_end(key)
+        self.__users.setdefault(map_identifier, set()).add(user_identifier)
+
+    def invalidate(self, map_identifier: int, user_identifier: int | None = None) -> None:
+        self.__generation += 1
+        if user_identifier is not None:
+            self.__remove(user_identifier, map_identifier)
+        else:
+            for user in self.__users.pop(map_identifier, set()):
+                self.__entries.pop((user, map_identifier), None)
+
+    def clear(self) -> None:
+        self.__generation += 1
+        self.__entries.clear()
+        self.__users.clear()
+
+    def __remove(self, user_identifier: int, map_identifier: int) -> None:
+        self.__entries.pop((user_identifier, map_identifier), None)
+        users = self.__users.get(map_identifier)
+        if users:
+            users.discard(user_identifier)
+            if not users:
+                del self.__users[map_identifier]
+
+    def __len__(self) -> int:
+        return len(self.__entries)
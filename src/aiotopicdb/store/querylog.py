@@ -0,0 +1,263 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import logging
+import re
+import time
+from collections import deque, namedtuple
+from collections.abc import AsyncIterator, Iterable
+from typing import Any
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+SlowQuery = namedtuple(
+    "SlowQuery", ["shape", "parameter_count", "row_count", "duration", "timestamp", "plan", "full_scans"]
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+class QueryLog:
+    # Opt-in slow-query log. Every statement run through a connection wrapped by 'connection' is timed (execution
+    # plus fetching its rows); statements that take at least 'threshold' seconds are kept in a ring buffer of the
+    # last 'max_entries' and logged. The first time a statement of a given shape is slow, its query plan is captured
+    # (with EXPLAIN QUERY PLAN) and the steps that scan a whole table or index are flagged.
+    def __init__(self, threshold: float = 0.1, max_entries: int = 1000) -> None:
+        self.threshold = threshold
+        self.__entries: deque[SlowQuery] = deque(maxlen=max_entries)
+        self.__plans: dict[str, tuple[str, ...]] = {}  # Shape -> plan
+
+    @staticmethod
+    def shape(sql: str) -> str:
+        # The statement with literals replaced by placeholders and placeholder lists collapsed, so that statements
+        # that only differ in their values (or in the length of an 'IN (...)' list) have the same shape
+        sql = _STRING_LITERAL.sub("?", sql)
+        sql = _NUMBER_LITERAL.sub("?", sql)
+        sql = _IN_LIST.sub("IN (?, ...)", sql)
+        sql = _PLACEHOLDER_LIST.sub("?, ...", sql)
+        return _WHITESPACE.sub(" ", sql).strip()
+
+    @staticmethod
+    def full_scans(plan: Iterable[str]) -> tuple[str, ...]:
+        # Plan steps that read a whole table or index (lookups through virtual tables, such as full-text and R*Tree
+        # indexes, are not)
+        return tuple(
+            step
+            for step in plan
+            if step.startswith("SCAN ") and "VIRTUAL TABLE" not in step and "CONSTANT ROW" not in step
+        )
+
+    def connection(self, db: aiosqlite.Connection) -> aiosqlite.Connection:
+        return _LoggedConnection(db, self)  # type: ignore
+
+    def entries(
+        self, shape: str | None = None, min_duration: float = 0.0, full_scans_only: bool = False
+    ) -> list[SlowQuery]:
+        # Logged statements, oldest first
+        return [
+            entry
+            for entry in self.__entries
+            if (shape is None or entry.shape == shape)
+            and entry.duration >= min_duration
+            and (entry.full_scans or not full_scans_only)
+        ]
+
+    def get_plan(self, shape: str) -> tuple[str, ...] | None:
+        return self.__plans.get(shape)
+
+    def clear(self) -> None:
+        self.__entries.clear()
+        self.__plans.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    async def _record(
+        self,
+        db: aiosqlite.Connection,
+        sql: str,
+        parameters: Any,
+        parameter_count: int,
+        row_count: int,
+        duration: float,
+        explain: bool = True,
+    ) -> None:
+        if duration < self.threshold:
+            return
+        shape = self.shape(sql)
+        plan = self.__plans.get(shape)
+        first = plan is None
+        if plan is None:
+            plan = await self.__explain(db, sql, parameters) if explain else None
+            if plan is None:
+                plan = ()  # Not cached, so the next slow statement of the shape is explained again
+            else:
+                self.__plans[shape] = plan
+        entry = SlowQuery(shape, parameter_count, row_count, duration, time.time(), plan, self.full_scans(plan))
+        self.__entries.append(entry)
+        logger.warning(
+            "Slow query (%.1f ms, %d parameters, %d rows%s): %s",
+            duration * 1000.0,
+            parameter_count,
+            row_count,
+            ", full scan" if entry.full_scans else "",
+            shape,
+        )
+        if first and plan:
+            logger.warning(
+                "Query plan of %s:\n%s",
+                shape,
+                "\n".join(f"{step}{'  <- full scan' if step in entry.full_scans else ''}" for step in plan),
+            )
+
+    @staticmethod
+    async def __explain(db: aiosqlite.Connection, sql: str, parameters: Any) -> tuple[str, ...] | None:
+        # None if the statement cannot be explained (with these parameters)
+        try:
+            async with db.execute(f"EXPLAIN QUERY PLAN {sql}", parameters) as cursor:
+                return tuple(record[3] for record in await cursor.fetchall())
+        except aiosqlite.Error:
+            return None
+
+
+class _LoggedCursor:
+    # Cursor that adds the time spent fetching rows to its statement's duration, and records the statement when it
+    # is closed
+    def __init__(self, cursor: aiosqlite.Cursor, statement: "_Statement", duration: float) -> None:
+        self.__cursor = cursor
+        self.__statement = statement
+        self.duration = duration
+        self.row_count = 0
+        self.recorded = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__cursor, name)
+
+    async def fetchone(self) -> Any:
+        start = time.perf_counter()
+        record = await self.__cursor.fetchone()
+        self.duration += time.perf_counter() - start
+        if record is not None:
+            self.row_count += 1
+        return record
+
+    async def fetchmany(self, size: int | None = None) -> Iterable[Any]:
+        start = time.perf_counter()
+        records = await self.__cursor.fetchmany(size)
+        self.duration += time.perf_counter() - start
+        self.row_count += len(records)  # type: ignore
+        return records
+
+    async def fetchall(self) -> Iterable[Any]:
+        start = time.perf_counter()
+        records = await self.__cursor.fetchall()
+        self.duration += time.perf_counter() - start
+        self.row_count += len(records)  # type: ignore
+        return records
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self.__iterate()
+
+    async def __iterate(self) -> AsyncIterator[Any]:
+        while True:
+            records = await self.fetchmany(self.__cursor.arraysize)
+            if not records:
+                return
+            for record in records:
+                yield record
+
+    async def close(self) -> None:
+        await self.__cursor.close()
+        if not self.recorded:
+            self.recorded = True
+            await self.__statement.record(self.row_count, self.duration)
+
+
+class _Statement:
+    # Like the result of aiosqlite's 'execute': it can be awaited (the statement is recorded right away) or used as
+    # an async context manager (the statement is recorded once its cursor is closed)
+    def __init__(
+        self, connection: "_LoggedConnection", sql: str, parameters: Any, parameter_count: int, many: bool
+    ) -> None:
+        self.connection = connection
+        self.sql = sql
+        self.parameters = parameters
+        self.parameter_count = parameter_count
+        self.many = many
+        self.__cursor: _LoggedCursor | None = None
+
+    async def __execute(self) -> _LoggedCursor:
+        db = self.connection.db
+        start = time.perf_counter()
+        if self.many:
+            cursor = await db.executemany(self.sql, self.parameters)
+        else:
+            cursor = await db.execute(self.sql, self.parameters)
+        return _LoggedCursor(cursor, self, time.perf_counter() - start)
+
+    async def __run(self) -> _LoggedCursor:
+        cursor = await self.__execute()
+        cursor.recorded = True
+        await self.record(cursor.row_count, cursor.duration)
+        return cursor
+
+    def __await__(self):  # type: ignore
+        return self.__run().__await__()
+
+    async def __aenter__(self) -> _LoggedCursor:
+        self.__cursor = await self.__execute()
+        return self.__cursor
+
+    async def __aexit__(self, *exception_info: object) -> None:
+        if self.__cursor is not None:
+            await self.__cursor.close()
+
+    async def record(self, row_count: int, duration: float) -> None:
+        # The plan of an 'executemany' statement is captured with its first set of parameters
+        parameters = self.parameters
+        if self.many:
+            parameters = next(iter(parameters), ()) if isinstance(parameters, (list, tuple)) else ()
+        await self.connection.query_log._record(
+            self.connection.db, self.sql, parameters, self.parameter_count, row_count, duration
+        )
+
+
+class _LoggedConnection:
+    # Wraps an aiosqlite connection; everything but running statements is passed on to it
+    def __init__(self, db: aiosqlite.Connection, query_log: QueryLog) -> None:
+        object.__setattr__(self, "db", db)
+        object.__setattr__(self, "query_log", query_log)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.db, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.db, name, value)  # For instance, 'row_factory'
+
+    def execute(self, sql: str, parameters: Any = None) -> _Statement:
+        parameter_count = len(parameters) if parameters is not None else 0
+        return _Statement(self, sql, parameters, parameter_count, False)
+
+    def executemany(self, sql: str, parameters: Iterable[Any]) -> _Statement:
+        # Materialised so the parameters can be counted and the first set reused for the query plan
+        parameters = list(parameters)
+        parameter_count = sum(len(item) for item in parameters)
+        return _Statement(self, sql, parameters, parameter_count, True)
+
+    async def executescript(self, sql_script: str) -> None:
+        # Timed as a whole; scripts have no query plan
+        start = time.perf_counter()
+        await self.db.executescript(sql_script)
+        duration = time.perf_counter() - start
+        if duration >= self.query_log.threshold:
+            await self.query_log._record(self.db, sql_script, None, 0, 0, duration, explain=False)
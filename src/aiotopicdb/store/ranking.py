@@ -0,0 +1,84 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from array import array
+from collections import namedtuple
+from itertools import pairwise
+
+from .topicgraph import TopicGraph
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # NumPy is optional; without it, a (much slower) pure-Python power iteration is used
+    np = None
+
+TopicScore = namedtuple("TopicScore", ["identifier", "degree", "pagerank"])
+
+
+def pagerank(
+    graph: TopicGraph,
+    damping: float = 0.85,
+    tolerance: float = 1e-6,
+    max_iterations: int = 100,
+    initial: array | None = None,
+) -> array:
+    # PageRank of every node (by node index) over the undirected association graph, by power iteration. Every node
+    # of the graph has at least one association, so there are no dangling nodes. An 'initial' vector (for instance,
+    # the scores of a previous run) warm-starts the iteration.
+    node_count = graph.node_count
+    if node_count == 0:
+        return array("d")
+    base = (1.0 - damping) / node_count
+    if np is not None:
+        offsets = np.frombuffer(graph.offsets, np.int64)
+        neighbours = np.frombuffer(graph.neighbours, np.int32)
+        degrees = np.diff(offsets).astype(np.float64)
+        heads = np.repeat(np.arange(node_count), np.diff(offsets))
+        scores = np.frombuffer(initial, np.float64).copy() if initial else np.full(node_count, 1.0 / node_count)
+        scores /= scores.sum()
+        for _ in range(max_iterations):
+            contributions = scores / degrees
+            next_scores = np.bincount(heads, weights=contributions[neighbours], minlength=node_count)
+            next_scores = next_scores * damping + base
+            error = np.abs(next_scores - scores).sum()
+            scores = next_scores
+            if error < node_count * tolerance:
+                break
+        return array("d", scores.tobytes())
+
+    offsets = graph.offsets
+    neighbours = graph.neighbours
+    degrees = graph.degrees()
+    scores = array("d", initial) if initial else array("d", [1.0 / node_count]) * node_count
+    total = sum(scores)
+    scores = array("d", (score / total for score in scores))
+    for _ in range(max_iterations):
+        contributions = [score / degree for score, degree in zip(scores, degrees)]
+        next_scores = array(
+            "d",
+            (
+                base + damping * sum(contributions[neighbours[position]] for position in range(start, end))
+                for start, end in pairwise(offsets)
+            ),
+        )
+        error = sum(abs(next_score - score) for next_score, score in zip(next_scores, scores))
+        scores = next_scores
+        if error < node_count * tolerance:
+            break
+    return scores
+
+
+def topic_scores(graph: TopicGraph, initial: dict[str, float] | None = None) -> list[TopicScore]:
+    # Degree and PageRank of every topic with at least one association. 'initial' maps topic identifiers to the
+    # PageRank of a previous run; topics that are new to the graph start from the average.
+    warm_start = None
+    if initial:
+        average = 1.0 / graph.node_count
+        warm_start = array("d", (initial.get(graph.identifier(index), average) for index in range(graph.node_count)))
+    degrees = graph.degrees()
+    scores = pagerank(graph, initial=warm_start)
+    return [TopicScore(graph.identifier(index), degrees[index], scores[index]) for index in range(graph.node_count)]
@@ -0,0 +1,16 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from enum import Enum
+
+
+class RankingMeasure(Enum):
+    PAGERANK = 1
+    DEGREE = 2  # Number of associations
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,170 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import hashlib
+import heapq
+import math
+import random
+from array import array
+from collections import namedtuple
+from collections.abc import Iterable
+
+from .similaritymeasure import SimilarityMeasure
+from .topicgraph import TopicGraph
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # NumPy is optional; without it, shared neighbours are counted and scored in pure Python
+    np = None
+
+SimilarTopic = namedtuple("SimilarTopic", ["identifier", "score"])
+
+HUB_DEGREE = 1000  # Topics with more neighbours than this are hubs
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8  # Of MINHASH_PERMUTATIONS // LSH_BANDS rows each
+MAX_BUCKET_SIZE = 500  # Larger LSH buckets are too unspecific to yield useful candidates
+_PRIME = (1 << 31) - 1  # Keeps the min-hash arithmetic within 64-bit integers
+
+
+class SimilarityIndex:
+    # Structural similarity of topics: the overlap of their (distinct) neighbour sets in the association graph. Tags
+    # are categorization associations, so shared tags count as shared neighbours.
+    #
+    # Candidates for a topic are the topics two hops away. Expanding through a hub would make every topic a candidate
+    # of every other, so hubs are not expanded; instead, when a map has hubs, min-hash signatures of the neighbour sets
+    # are banded into locality-sensitive hash (LSH) buckets, and topics that share a bucket are candidates too. Scores
+    # are always exact.
+    def __init__(self, graph: TopicGraph, hub_degree: int = HUB_DEGREE) -> None:
+        self.graph = graph
+        self.hub_degree = hub_degree
+        # Distinct neighbours (a topic can take part in several associations with the same neighbour)
+        self.offsets = array("q", [0])
+        self.neighbours = array("i")
+        for node in range(graph.node_count):
+            self.neighbours.extend(sorted(set(graph.neighbours[graph.offsets[node] : graph.offsets[node + 1]])))
+            self.offsets.append(len(self.neighbours))
+        self.degrees = array("i", (self.offsets[node + 1] - self.offsets[node] for node in range(graph.node_count)))
+        self.hubs = {
+            node: set(self.__neighbours(node)) for node in range(graph.node_count) if self.degrees[node] > hub_degree
+        }
+        self.__buckets: dict[tuple[int, int], array] | None = None
+        self.__band_hashes: list[tuple[int, ...]] | None = None
+
+    def __neighbours(self, node: int) -> array:
+        return self.neighbours[self.offsets[node] : self.offsets[node + 1]]
+
+    def fingerprint(self, node: int) -> int:
+        # Signed 64-bit hash of the topic's neighbour set; node numbers change between loads, identifiers do not
+        identifiers = sorted(self.graph.identifier(neighbour) for neighbour in self.__neighbours(node))
+        digest = hashlib.blake2b("\x1f".join(identifiers).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big", signed=True)
+
+    def shared_neighbours(self, node: int) -> dict[int, int]:
+        # Candidate -> number of shared neighbours
+        result: dict[int, int] = {}
+        hubs = self.hubs
+        if np is not None:
+            neighbours = np.frombuffer(self.neighbours, np.int32)
+            offsets = self.offsets
+            slices = [
+                neighbours[offsets[neighbour] : offsets[neighbour + 1]]
+                for neighbour in self.__neighbours(node)
+                if neighbour not in hubs
+            ]
+            if slices:
+                candidates, counts = np.unique(np.concatenate(slices), return_counts=True)
+                result = dict(zip(candidates.tolist(), counts.tolist()))
+        else:
+            for neighbour in self.__neighbours(node):
+                if neighbour in hubs:
+                    continue
+                for candidate in self.__neighbours(neighbour):
+                    result[candidate] = result.get(candidate, 0) + 1
+        if hubs:
+            for candidate in self.__lsh_candidates(node):
+                result.setdefault(candidate, 0)
+            hub_neighbours = [hubs[neighbour] for neighbour in self.__neighbours(node) if neighbour in hubs]
+            if hub_neighbours:
+                for candidate in result:
+                    result[candidate] += sum(1 for hub_neighbour in hub_neighbours if candidate in hub_neighbour)
+        result.pop(node, None)
+        return result
+
+    def similar(
+        self, node: int, k: int = 10, measure: SimilarityMeasure = SimilarityMeasure.JACCARD
+    ) -> list[tuple[int, float]]:
+        # The k most similar topics, most similar first
+        shared = self.shared_neighbours(node)
+        degree = self.degrees[node]
+        degrees = self.degrees
+        if measure is SimilarityMeasure.JACCARD:
+            scores = (
+                (count / (degree + degrees[candidate] - count), candidate)
+                for candidate, count in shared.items()
+                if count
+            )
+        else:
+            scores = (
+                (count / math.sqrt(degree * degrees[candidate]), candidate)
+                for candidate, count in shared.items()
+                if count
+            )
+        # Ties are broken by node number so that results are stable
+        return [
+            (candidate, score) for score, candidate in heapq.nlargest(k, scores, key=lambda item: (item[0], -item[1]))
+        ]
+
+    def affected(self, nodes: Iterable[int]) -> set[int]:
+        # Topics whose most similar topics can change when the neighbour sets of the given topics change
+        result: set[int] = set()
+        for node in nodes:
+            result.add(node)
+            result.update(self.shared_neighbours(node))
+        return result
+
+    def __lsh_candidates(self, node: int) -> set[int]:
+        if self.__buckets is None:
+            self.__build_lsh()
+        result: set[int] = set()
+        for band, band_hash in enumerate(self.__band_hashes[node]):
+            bucket = self.__buckets[(band, band_hash)]
+            if len(bucket) <= MAX_BUCKET_SIZE:
+                result.update(bucket)
+        return result
+
+    def __build_lsh(self) -> None:
+        random_ = random.Random(0)
+        permutations = [
+            (random_.randrange(1, _PRIME), random_.randrange(0, _PRIME)) for _ in range(MINHASH_PERMUTATIONS)
+        ]
+        rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        node_count = self.graph.node_count
+        if np is not None:
+            neighbours = np.frombuffer(self.neighbours, np.int32).astype(np.int64)
+            starts = np.frombuffer(self.offsets, np.int64)[:-1]
+            signatures = np.empty((node_count, MINHASH_PERMUTATIONS), np.int64)
+            for column, (a, b) in enumerate(permutations):
+                signatures[:, column] = np.minimum.reduceat((a * neighbours + b) % _PRIME, starts)
+            band_hashes = np.empty((node_count, LSH_BANDS), np.int64)
+            for band in range(LSH_BANDS):
+                band_hash = np.zeros(node_count, np.int64)
+                for column in range(band * rows, (band + 1) * rows):
+                    band_hash = band_hash * 1_000_003 + signatures[:, column]  # Wraps around, which is fine for a hash
+                band_hashes[:, band] = band_hash
+            self.__band_hashes = [tuple(row) for row in band_hashes.tolist()]
+        else:
+            self.__band_hashes = []
+            for node in range(node_count):
+                neighbours = self.__neighbours(node)
+                signature = [min((a * neighbour + b) % _PRIME for neighbour in neighbours) for a, b in permutations]
+                self.__band_hashes.append(
+                    tuple(hash(tuple(signature[band * rows : (band + 1) * rows])) for band in range(LSH_BANDS))
+                )
+        self.__buckets = {}
+        for node, node_band_hashes in enumerate(self.__band_hashes):
+            for band, band_hash in enumerate(node_band_hashes):
+                self.__buckets.setdefault((band, band_hash), array("i")).append(node)
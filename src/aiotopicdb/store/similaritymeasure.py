@@ -0,0 +1,16 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from enum import Enum
+
+
+class SimilarityMeasure(Enum):
+    JACCARD = 1  # Shared neighbours / all neighbours of either topic
+    COSINE = 2  # Shared neighbours / geometric mean of the numbers of neighbours
+
+    def __str__(self):
+        return self.name
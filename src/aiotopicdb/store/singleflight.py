@@ -0,0 +1,85 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import copy
+import functools
+import inspect
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    # Coalesces concurrent identical calls: while a call for a key is in flight, callers with the same key wait for
+    # its result instead of starting their own. The first caller receives the result itself and the others receive
+    # deep copies, so nobody shares mutable objects. Errors reach every caller. A cancelled caller stops waiting; the
+    # shared call is only cancelled once every caller waiting for it has been cancelled.
+    def __init__(self) -> None:
+        self.__calls: dict[Hashable, tuple[asyncio.Task, list[int]]] = {}  # Key -> (call, [number of waiting callers])
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        call = self.__calls.get(key)
+        joined = call is not None
+        if call is None:
+            task = asyncio.ensure_future(function())
+            call = self.__calls[key] = (task, [0])
+            task.add_done_callback(lambda _: self.__remove(key, task))
+        task, waiting = call
+        waiting[0] += 1
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            waiting[0] -= 1
+            if waiting[0] == 0 and not task.done():
+                task.cancel()
+        return copy.deepcopy(result) if joined else result
+
+    def forget(self, map_identifier: int) -> None:
+        # Calls that are in flight for the map are not joined anymore (for instance, because the map was written to
+        # after they started); they still complete for the callers already waiting
+        for key in [key for key in self.__calls if key[0] == map_identifier]:  # type: ignore
+            del self.__calls[key]
+
+    def __remove(self, key: Hashable, task: asyncio.Task) -> None:
+        call = self.__calls.get(key)
+        if call is not None and call[0] is task:
+            del self.__calls[key]
+
+    def __len__(self) -> int:
+        return len(self.__calls)
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def coalesced(method: Callable) -> Callable:
+    # Coalesces concurrent calls of a TopicStore read method with the same (normalized) arguments. The method's first
+    # parameter has to be the map identifier.
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+        if not self.coalesce_reads:
+            return await method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple((name, _freeze(value)) for name, value in list(bound.arguments.items())[1:])
+        key = (arguments[0][1], method.__name__, arguments)
+        try:
+            hash(key)
+        except TypeError:
+            return await method(self, *args, **kwargs)
+        return await self.single_flight.do(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,16 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from enum import Enum
+
+
+class StorageLayout(Enum):
+    STANDARD = 1
+    COMPACT = 2  # Association members refer to identifiers interned as integer keys per map
+
+    def __str__(self):
+        return self.name
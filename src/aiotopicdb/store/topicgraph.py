@@ -0,0 +1,474 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import time
+from array import array
+from collections import deque, namedtuple
+from collections.abc import Iterable, Iterator
+
+from aiotopicdb.topicdberror import TopicDbError
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # NumPy is optional; it only speeds up building the adjacency arrays
+    np = None
+
+# An edge kind is an (association instance of, role of the node, role of the neighbour) triple
+EdgeKind = namedtuple("EdgeKind", ["instance_of", "role_spec", "neighbour_role_spec"])
+Neighbour = namedtuple("Neighbour", ["identifier", "instance_of", "role_spec", "neighbour_role_spec"])
+# One step of a path: from 'topic_identifier' (playing 'role_spec') to 'neighbour_identifier' (playing
+# 'neighbour_role_spec') through an association of type 'instance_of'
+Hop = namedtuple("Hop", ["topic_identifier", "instance_of", "role_spec", "neighbour_role_spec", "neighbour_identifier"])
+
+MEMORY_BUDGET = 512 * 1024 * 1024  # Bytes
+NODE_OVERHEAD = 120  # Approximate bytes per node for the identifier string and its dictionary entry
+BUILD_EDGE_SIZE = 12  # Bytes per association while loading: two int32 node indexes and two uint16 edge kinds
+EDGE_SIZE = 12  # Bytes per association once built: an int32 neighbour and a uint16 edge kind, in both directions
+
+
+class _SearchExhausted(Exception):
+    pass
+
+
+class _Search:
+    # Node-visit budget and deadline of a path search
+    def __init__(self, max_visits: int, timeout: float | None) -> None:
+        self.max_visits = max_visits
+        self.visits = 0
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+
+    @property
+    def remaining(self) -> int:
+        return max(self.max_visits - self.visits, 0)
+
+    def visit(self) -> None:
+        self.visits += 1
+        if self.visits > self.max_visits:
+            raise _SearchExhausted
+        if self.deadline is not None and self.visits % 1024 == 0 and time.monotonic() > self.deadline:
+            raise _SearchExhausted
+
+
+class TopicGraph:
+    # Association graph of a map in compressed sparse row (CSR) form. Topics are interned to integers 0..n-1; the
+    # neighbours of node i are neighbours[offsets[i]:offsets[i + 1]], each with the kind of the connecting edge.
+    # Every association is stored in both directions.
+    def __init__(
+        self,
+        identifiers: list[str],
+        indexes: dict[str, int],
+        kinds: list[EdgeKind],
+        offsets: array,
+        neighbours: array,
+        edge_kinds: array,
+    ) -> None:
+        self.__identifiers = identifiers
+        self.__indexes = indexes
+        self.__kinds = kinds
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.edge_kinds = edge_kinds
+        self.version = 0  # Version of the map the graph was loaded from
+
+    @property
+    def node_count(self) -> int:
+        return len(self.__identifiers)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.neighbours) // 2
+
+    @property
+    def kinds(self) -> list[EdgeKind]:
+        return self.__kinds
+
+    @property
+    def memory_usage(self) -> int:
+        return (
+            self.offsets.itemsize * len(self.offsets)
+            + self.neighbours.itemsize * len(self.neighbours)
+            + self.edge_kinds.itemsize * len(self.edge_kinds)
+            + NODE_OVERHEAD * len(self.__identifiers)
+        )
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self.__indexes
+
+    def index(self, identifier: str) -> int | None:
+        return self.__indexes.get(identifier)
+
+    def identifier(self, index: int) -> str:
+        return self.__identifiers[index]
+
+    def kind_filter(self, instance_ofs: Iterable[str] | None) -> set[int] | None:
+        # Edge kind indexes for the given association types (None means all of them)
+        if instance_ofs is None:
+            return None
+        instance_ofs = set(instance_ofs)
+        return {index for index, kind in enumerate(self.__kinds) if kind.instance_of in instance_ofs}
+
+    def adjacent(self, index: int, kind_filter: set[int] | None = None) -> Iterator[tuple[int, int]]:
+        # (neighbour index, edge kind index) pairs of a node
+        neighbours = self.neighbours
+        edge_kinds = self.edge_kinds
+        for position in range(self.offsets[index], self.offsets[index + 1]):
+            if kind_filter is None or edge_kinds[position] in kind_filter:
+                yield neighbours[position], edge_kinds[position]
+
+    def neighbours_of(self, identifier: str, instance_ofs: Iterable[str] | None = None) -> list[Neighbour]:
+        index = self.__indexes.get(identifier)
+        if index is None:
+            return []
+        result: list[Neighbour] = []
+        for neighbour, kind_index in self.adjacent(index, self.kind_filter(instance_ofs)):
+            kind = self.__kinds[kind_index]
+            result.append(
+                Neighbour(self.__identifiers[neighbour], kind.instance_of, kind.role_spec, kind.neighbour_role_spec)
+            )
+        return result
+
+    def degree(self, identifier: str, instance_ofs: Iterable[str] | None = None) -> int:
+        index = self.__indexes.get(identifier)
+        if index is None:
+            return 0
+        if instance_ofs is None:
+            return self.offsets[index + 1] - self.offsets[index]
+        return sum(1 for _ in self.adjacent(index, self.kind_filter(instance_ofs)))
+
+    def degrees(self) -> array:
+        # Degree of every node, by node index
+        offsets = self.offsets
+        return array("i", (offsets[index + 1] - offsets[index] for index in range(self.node_count)))
+
+    def traverse(
+        self,
+        identifier: str,
+        max_depth: int | None = None,
+        instance_ofs: Iterable[str] | None = None,
+    ) -> dict[str, int]:
+        # Breadth-first traversal: reachable topic -> depth (the start topic has depth 0)
+        start = self.__indexes.get(identifier)
+        if start is None:
+            return {}
+        kind_filter = self.kind_filter(instance_ofs)
+        depths = {start: 0}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            depth = depths[node]
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for neighbour, _ in self.adjacent(node, kind_filter):
+                if neighbour not in depths:
+                    depths[neighbour] = depth + 1
+                    queue.append(neighbour)
+        return {self.__identifiers[node]: depth for node, depth in depths.items()}
+
+    def is_reachable(
+        self,
+        source: str,
+        target: str,
+        max_depth: int | None = None,
+        instance_ofs: Iterable[str] | None = None,
+    ) -> bool:
+        return target in self.traverse(source, max_depth=max_depth, instance_ofs=instance_ofs)
+
+    def connected_components(self) -> array:
+        # Component number of every node (by node index); components are numbered 0.. in order of discovery
+        result = array("i", [-1]) * self.node_count
+        offsets = self.offsets
+        neighbours = self.neighbours
+        component = 0
+        for start in range(self.node_count):
+            if result[start] != -1:
+                continue
+            result[start] = component
+            stack = [start]
+            while stack:
+                node = stack.pop()
+                for position in range(offsets[node], offsets[node + 1]):
+                    neighbour = neighbours[position]
+                    if result[neighbour] == -1:
+                        result[neighbour] = component
+                        stack.append(neighbour)
+            component += 1
+        return result
+
+    def find_paths(
+        self,
+        source: str,
+        target: str,
+        max_depth: int = 4,
+        instance_ofs: Iterable[str] | None = None,
+        k: int = 3,
+        max_visits: int = 100_000,
+        timeout: float | None = None,
+    ) -> list[list[Hop]]:
+        # Up to k shortest simple paths from source to target (of at most 'max_depth' hops), shortest first. A
+        # bidirectional breadth-first search finds the shortest distance; the distances to the target it computed
+        # then prune a depth-first enumeration of the paths. The search stops once 'max_visits' nodes have been
+        # visited or 'timeout' seconds have passed, returning the paths found up to that point.
+        start = self.__indexes.get(source)
+        goal = self.__indexes.get(target)
+        if start is None or goal is None or k < 1:
+            return []
+        if start == goal:
+            return [[]]
+        search = _Search(max_visits, timeout)
+        kind_filter = self.kind_filter(instance_ofs)
+        paths: list[tuple[int, ...]] = []
+        try:
+            length, target_distances, radius = self.__meet(start, goal, max_depth, kind_filter, search)
+            if length is None:
+                return []
+            while length <= max_depth and len(paths) < k:
+                self.__enumerate(start, goal, length, kind_filter, target_distances, radius, k, paths, search)
+                length += 1
+        except _SearchExhausted:
+            pass
+        return [self.__to_hops(start, path) for path in paths]
+
+    def __meet(
+        self, start: int, goal: int, max_depth: int, kind_filter: set[int] | None, search: _Search
+    ) -> tuple[int | None, dict[int, int], int]:
+        # Bidirectional breadth-first search, always expanding the smaller frontier by one full level. Returns the
+        # shortest distance (None if there is no path within 'max_depth' hops), the distances to the target and the
+        # radius up to which those distances are complete.
+        forward = {start: 0}
+        backward = {goal: 0}
+        forward_frontier = [start]
+        backward_frontier = [goal]
+        forward_depth = backward_depth = 0
+        length = None
+        while length is None and forward_depth + backward_depth < max_depth and forward_frontier and backward_frontier:
+            expand_forward = len(forward_frontier) <= len(backward_frontier)
+            if expand_forward:
+                distances, other, frontier, depth = forward, backward, forward_frontier, forward_depth + 1
+            else:
+                distances, other, frontier, depth = backward, forward, backward_frontier, backward_depth + 1
+            next_frontier = []
+            for node in frontier:
+                for neighbour, _ in self.adjacent(node, kind_filter):
+                    if neighbour in distances:
+                        continue
+                    search.visit()
+                    distances[neighbour] = depth
+                    next_frontier.append(neighbour)
+                    if neighbour in other and (length is None or depth + other[neighbour] < length):
+                        length = depth + other[neighbour]
+            if expand_forward:
+                forward_frontier, forward_depth = next_frontier, depth
+            else:
+                backward_frontier, backward_depth = next_frontier, depth
+        if length is None:
+            return None, backward, backward_depth
+        # Grow the distances to the target with half of the remaining budget: the further they reach, the less the
+        # enumeration of longer paths has to explore
+        extension = _Search(search.remaining // 2, None)
+        extension.deadline = search.deadline
+        try:
+            while backward_frontier and backward_depth < max_depth - 1:
+                next_frontier = []
+                for node in backward_frontier:
+                    for neighbour, _ in self.adjacent(node, kind_filter):
+                        if neighbour not in backward:
+                            extension.visit()
+                            backward[neighbour] = backward_depth + 1
+                            next_frontier.append(neighbour)
+                backward_frontier = next_frontier
+                backward_depth += 1
+        except _SearchExhausted:
+            pass
+        search.visits += extension.visits
+        return length, backward, backward_depth
+
+    def __enumerate(
+        self,
+        start: int,
+        goal: int,
+        length: int,
+        kind_filter: set[int] | None,
+        target_distances: dict[int, int],
+        radius: int,
+        k: int,
+        paths: list[tuple[int, ...]],
+        search: _Search,
+    ) -> None:
+        # Depth-first enumeration of the simple paths of exactly 'length' hops. A path is recorded as a sequence of
+        # adjacency positions. Nodes beyond the radius are at least 'radius + 1' hops away from the target.
+        offsets = self.offsets
+        neighbours = self.neighbours
+        edge_kinds = self.edge_kinds
+        seen = {self.__path_key(path) for path in paths}
+        on_path = {start}
+        positions: list[int] = []
+
+        def walk(node: int) -> bool:
+            remaining = length - len(positions) - 1
+            for position in range(offsets[node], offsets[node + 1]):
+                if kind_filter is not None and edge_kinds[position] not in kind_filter:
+                    continue
+                neighbour = neighbours[position]
+                if neighbour in on_path or target_distances.get(neighbour, radius + 1) > remaining:
+                    continue
+                search.visit()
+                positions.append(position)
+                if neighbour == goal:
+                    if remaining == 0:
+                        key = self.__path_key(positions)
+                        if key not in seen:
+                            seen.add(key)
+                            paths.append(tuple(positions))
+                            if len(paths) >= k:
+                                return True
+                else:
+                    on_path.add(neighbour)
+                    if walk(neighbour):
+                        return True
+                    on_path.discard(neighbour)
+                positions.pop()
+            return False
+
+        walk(start)
+
+    def __path_key(self, positions: Iterable[int]) -> tuple[tuple[int, int], ...]:
+        # Parallel associations of the same type, with the same roles, make for the same path
+        return tuple((self.neighbours[position], self.edge_kinds[position]) for position in positions)
+
+    def __to_hops(self, start: int, positions: tuple[int, ...]) -> list[Hop]:
+        result: list[Hop] = []
+        node = start
+        for position in positions:
+            neighbour = self.neighbours[position]
+            kind = self.__kinds[self.edge_kinds[position]]
+            result.append(
+                Hop(
+                    self.__identifiers[node],
+                    kind.instance_of,
+                    kind.role_spec,
+                    kind.neighbour_role_spec,
+                    self.__identifiers[neighbour],
+                )
+            )
+            node = neighbour
+        return result
+
+
+class TopicGraphBuilder:
+    def __init__(self, memory_budget: int = MEMORY_BUDGET) -> None:
+        self.memory_budget = memory_budget
+        self.__indexes: dict[str, int] = {}
+        self.__identifiers: list[str] = []
+        self.__kind_indexes: dict[EdgeKind, int] = {}
+        self.__kinds: list[EdgeKind] = []
+        self.__edge_kinds: dict[tuple[str, str, str], tuple[int, int]] = {}  # Raw member row -> edge kinds
+        self.__sources = array("i")
+        self.__destinations = array("i")
+        self.__forward_kinds = array("H")
+        self.__reverse_kinds = array("H")
+
+    @staticmethod
+    def estimate(node_count: int, edge_count: int) -> int:
+        return NODE_OVERHEAD * node_count + (BUILD_EDGE_SIZE + EDGE_SIZE) * edge_count
+
+    def __intern_kinds(self, instance_of: str, src_role_spec: str, dest_role_spec: str) -> tuple[int, int]:
+        # (forward, reverse) edge kind indexes of an association type and its roles
+        result = []
+        for kind in (
+            EdgeKind(instance_of, src_role_spec, dest_role_spec),
+            EdgeKind(instance_of, dest_role_spec, src_role_spec),
+        ):
+            index = self.__kind_indexes.get(kind)
+            if index is None:
+                if len(self.__kinds) > 0xFFFF:
+                    raise TopicDbError("Too many distinct association types and roles")
+                index = self.__kind_indexes[kind] = len(self.__kinds)
+                self.__kinds.append(kind)
+            result.append(index)
+        return result[0], result[1]
+
+    def add(self, rows: Iterable[tuple[str, str, str, str, str]]) -> None:
+        # Rows of (source topic, source role, destination topic, destination role, association instance of)
+        indexes = self.__indexes
+        identifiers = self.__identifiers
+        edge_kinds = self.__edge_kinds
+        append_source = self.__sources.append
+        append_destination = self.__destinations.append
+        append_forward_kind = self.__forward_kinds.append
+        append_reverse_kind = self.__reverse_kinds.append
+        for src_topic_ref, src_role_spec, dest_topic_ref, dest_role_spec, instance_of in rows:
+            source = indexes.get(src_topic_ref)
+            if source is None:
+                source = indexes[src_topic_ref] = len(identifiers)
+                identifiers.append(src_topic_ref)
+            destination = indexes.get(dest_topic_ref)
+            if destination is None:
+                destination = indexes[dest_topic_ref] = len(identifiers)
+                identifiers.append(dest_topic_ref)
+            kinds = edge_kinds.get((instance_of, src_role_spec, dest_role_spec))
+            if kinds is None:
+                kinds = edge_kinds[(instance_of, src_role_spec, dest_role_spec)] = self.__intern_kinds(
+                    instance_of, src_role_spec, dest_role_spec
+                )
+            append_source(source)
+            append_destination(destination)
+            append_forward_kind(kinds[0])
+            append_reverse_kind(kinds[1])
+        if self.estimate(len(identifiers), len(self.__sources)) > self.memory_budget:
+            raise TopicDbError("The map's association graph exceeds the memory budget")
+
+    def build(self) -> TopicGraph:
+        node_count = len(self.__identifiers)
+        edge_count = len(self.__sources)
+        if np is not None:
+            heads = np.concatenate(
+                [np.frombuffer(self.__sources, np.int32), np.frombuffer(self.__destinations, np.int32)]
+            )
+            tails = np.concatenate(
+                [np.frombuffer(self.__destinations, np.int32), np.frombuffer(self.__sources, np.int32)]
+            )
+            kinds = np.concatenate(
+                [np.frombuffer(self.__forward_kinds, np.uint16), np.frombuffer(self.__reverse_kinds, np.uint16)]
+            )
+            order = np.argsort(heads, kind="stable")
+            counts = np.bincount(heads, minlength=node_count)
+            offsets = array("q", np.concatenate([[0], np.cumsum(counts)]).astype(np.int64).tobytes())
+            neighbours = array("i", tails[order].astype(np.int32).tobytes())
+            edge_kinds = array("H", kinds[order].astype(np.uint16).tobytes())
+        else:
+            # Counting sort by node
+            offsets = array("q", [0]) * (node_count + 1)
+            for node in self.__sources:
+                offsets[node + 1] += 1
+            for node in self.__destinations:
+                offsets[node + 1] += 1
+            for node in range(node_count):
+                offsets[node + 1] += offsets[node]
+            positions = array("q", offsets)
+            neighbours = array("i", [0]) * (2 * edge_count)
+            edge_kinds = array("H", [0]) * (2 * edge_count)
+            sources = self.__sources
+            destinations = self.__destinations
+            forward_kinds = self.__forward_kinds
+            reverse_kinds = self.__reverse_kinds
+            for edge in range(edge_count):
+                source = sources[edge]
+                destination = destinations[edge]
+                position = positions[source]
+                neighbours[position] = destination
+                edge_kinds[position] = forward_kinds[edge]
+                positions[source] = position + 1
+                position = positions[destination]
+                neighbours[position] = source
+                edge_kinds[position] = reverse_kinds[edge]
+                positions[destination] = position + 1
+        # The loading arrays are no longer needed
+        self.__sources = array("i")
+        self.__destinations = array("i")
+        self.__forward_kinds = array("H")
+        self.__reverse_kinds = array("H")
+        return TopicGraph(self.__identifiers, self.__indexes, self.__kinds, offsets, neighbours, edge_kinds)
@@ -0,0 +1,16 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+from enum import Enum
+
+
+class TopicOrdering(Enum):
+    IDENTIFIER = 1
+    NAME = 2  # Base name
+
+    def __str__(self):
+        return self.name
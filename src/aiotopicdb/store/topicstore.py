@@ -8,12 +8,33 @@ December 8, 2024
 # region Module and Class Imports
 from __future__ import annotations
 
-from collections import namedtuple
-from typing import Dict, Tuple
+import asyncio
+import copy
+import functools
+import logging
+import math
+import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import AsyncExitStack, asynccontextmanager
+from contextvars import ContextVar
+from datetime import date
+from typing import Self
 
 import aiosqlite
 
-from aiotopicdb.constants import DATABASE_PATH, UNIVERSAL_SCOPE
+from aiotopicdb.constants import (
+    ATTRIBUTE_TYPED_VALUE,
+    COMPACT_DDL,
+    COMPACT_MEMBER_DDL,
+    DATABASE_PATH,
+    DDL,
+    EARTH_RADIUS,
+    MEMBER_DDL,
+    UNIVERSAL_SCOPE,
+)
 from aiotopicdb.models.association import Association
 from aiotopicdb.models.attribute import Attribute
 from aiotopicdb.models.basename import BaseName
@@ -21,26 +42,156 @@ from aiotopicdb.models.collaborationmode import CollaborationMode
 from aiotopicdb.models.datatype import DataType
 from aiotopicdb.models.doublekeydict import DoubleKeyDict
 from aiotopicdb.models.language import Language
+from aiotopicdb.models.location import Location
 from aiotopicdb.models.map import Map
 from aiotopicdb.models.member import Member
 from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.models.temporal import Temporal
+from aiotopicdb.models.temporaltype import TemporalType
 from aiotopicdb.models.topic import Topic
 from aiotopicdb.topicdberror import TopicDbError
 
+from .attributeoperator import AttributeOperator
+from .batchloader import BatchLoader
+from .blobstore import BlobStore
+from .bloomfilter import BloomFilter
+from .codec import Codec, default_codecs
+from .connectionpool import ConnectionPool
+from .contentindex import CONTENT_INSTANCE_OFS, ContentIndex
+from .ontologymode import OntologyMode
+from .ontologyregistry import OntologyRegistry
+from .permissioncache import Permission, PermissionCache
+from .querylog import QueryLog
+from .ranking import TopicScore, topic_scores
+from .rankingmeasure import RankingMeasure
 from .retrievalmode import RetrievalMode
+from .similarity import SimilarityIndex, SimilarTopic
+from .similaritymeasure import SimilarityMeasure
+from .singleflight import SingleFlight, coalesced
+from .storagelayout import StorageLayout
+from .topicgraph import MEMORY_BUDGET, Hop, TopicGraph, TopicGraphBuilder
+from .topicordering import TopicOrdering
 
 # endregion
 
 # region Setup
+logger = logging.getLogger(__name__)
+
 TopicRefs = namedtuple("TopicRefs", ["instance_of", "role_spec", "topic_ref"])
+# Concurrency limit of the (fanned-out) request the current task is part of
+_request_semaphore: ContextVar[asyncio.Semaphore | None] = ContextVar("request_semaphore", default=None)
+
+MAX_BIND_VARIABLES = 500  # Bind variables per 'IN (...)' chunk
+MAX_NEAREST_CANDIDATES = 10_000  # Locations a step of a nearest-locations search loads at most
+# Existence filters: entity kind -> (table, key columns). Attribute keys are (entity identifier, name) pairs.
+EXISTENCE_KINDS = {
+    "topic": ("topic", ("identifier",)),
+    "occurrence": ("occurrence", ("identifier",)),
+    "attribute": ("attribute", ("entity_identifier", "name")),
+}
+RESOURCE_DATA_COLUMNS = ("resource_data", "resource_hash", "resource_codec")
+# Map content tables and their columns (other than 'map_identifier'). Every table has an 'identifier' column with an
+# index starting with (map_identifier, identifier), which is what chunked, map-wide operations page through.
+MAP_TABLES = {
+    "topic": ("identifier", "instance_of", "scope"),
+    "basename": ("identifier", "name", "topic_identifier", "scope", "language"),
+    "member": (
+        "identifier",
+        "association_identifier",
+        "src_topic_ref",
+        "src_role_spec",
+        "dest_topic_ref",
+        "dest_role_spec",
+    ),
+    "occurrence": (
+        "identifier",
+        "instance_of",
+        "scope",
+        "resource_ref",
+        "resource_data",
+        "topic_identifier",
+        "language",
+        "resource_hash",
+        "resource_codec",
+    ),
+    "attribute": ("identifier", "entity_identifier", "name", "value", "data_type", "scope", "language"),
+    "temporal": (
+        "identifier",
+        "topic_identifier",
+        "type",
+        "description",
+        "media_url",
+        "start_date",
+        "end_date",
+        "start_day",
+        "end_day",
+    ),
+    "location": ("identifier", "topic_identifier", "description", "latitude", "longitude"),
+    "topic_score": ("identifier", "degree", "pagerank"),
+    "similar_topic": ("identifier", "rank", "similar_identifier", "score"),
+    "similar_topic_fingerprint": ("identifier", "fingerprint"),
+}
 # endregion
 
 
 # region Class
 class TopicStore:
     # region Initialisation
-    def __init__(self, database_path: str = DATABASE_PATH) -> None:
+    def __init__(
+        self,
+        database_path: str = DATABASE_PATH,
+        blob_store: BlobStore | None = None,
+        codec: Codec | None = None,
+        codecs: list[Codec] | None = None,
+        uncompressed_instance_ofs: set[str] | None = None,
+        pool_size: int = 0,
+        max_concurrency: int = 8,
+        coalesce_reads: bool = True,
+        storage_layout: StorageLayout = StorageLayout.STANDARD,
+        shard_count: int = 0,
+        max_open_shards: int = 16,
+        query_log: QueryLog | None = None,
+    ) -> None:
         self.database_path = database_path
+        self.storage_layout = storage_layout  # Of databases created by 'create_database'
+        # Idle connections kept open for reuse (0 disables pooling; a pooled store has to be closed)
+        self.pool_size = pool_size
+        self.connection_pool = ConnectionPool(database_path, pool_size)
+        # Sharded storage: the content of map 'n' lives in shard 'n % shard_count', a database file of its own next to
+        # the catalog database ('database_path'), which keeps the maps, their users and collaborators. Writers in
+        # different shards don't block each other. 0 keeps everything in the one database.
+        self.shard_count = shard_count
+        self.max_open_shards = max_open_shards  # Shards with a connection pool; the least recently used is closed
+        self._shard_pools: OrderedDict[int, ConnectionPool] = OrderedDict()
+        self._shard_schemas: set[int] = set()  # Shards whose schema is up to date
+        self._shard_lock = asyncio.Lock()
+        self.query_log = query_log  # Optional log of slow statements (with their query plans)
+        self.max_concurrency = max_concurrency  # Connections a single (fanned-out) request uses at most
+        # Concurrent identical reads share one database fetch
+        self.coalesce_reads = coalesce_reads
+        self.single_flight = SingleFlight()
+        # Topics, associations, occurrences and attributes requested within the same event-loop tick are fetched with
+        # one query per kind
+        self._topic_loader = BatchLoader(self._load_topic_records, MAX_BIND_VARIABLES)
+        self._association_loader = BatchLoader(self._load_association_records, MAX_BIND_VARIABLES)
+        self._occurrence_loader = BatchLoader(self._load_occurrence_records, MAX_BIND_VARIABLES)
+        self._attribute_loader = BatchLoader(self._load_attribute_records, MAX_BIND_VARIABLES)
+        self.blob_store = blob_store  # Optional external store for large occurrence resource data
+        self.codec = codec  # Optional compression of occurrence resource data
+        # Codecs resource data is decoded with, by name: the built-in ones, those given (for data written by other
+        # stores) and the store's own. Kept per store, so stores with different codecs of the same name don't clash.
+        self.codecs = default_codecs()
+        explicit_codecs: dict[str, Codec] = {}
+        for codec_ in [*(codecs or []), *([codec] if codec else [])]:
+            if not codec_.name:
+                raise TopicDbError("A codec needs a name")
+            if explicit_codecs.setdefault(codec_.name, codec_) is not codec_:
+                raise TopicDbError(f"More than one codec named '{codec_.name}'")
+        self.codecs.update(explicit_codecs)
+        # Occurrence types whose resource data is (typically) compressed already
+        self.uncompressed_instance_ofs = (
+            uncompressed_instance_ofs if uncompressed_instance_ofs is not None else {"image", "video", "audio"}
+        )
 
         self.base_topics = {
             UNIVERSAL_SCOPE: "Universal",
@@ -88,6 +239,548 @@ class TopicStore:
             "temporal": "Temporal",
         }
 
+        self._facets_cache: dict[tuple, tuple[int, dict]] = {}  # (map identifier, scope, language) -> (version, facets)
+        self.ontology_registry = OntologyRegistry(self.base_topics)
+        self._purge_tasks: set[asyncio.Task] = set()
+        self.permission_cache = PermissionCache()
+        self.graph_memory_budget = MEMORY_BUDGET
+        self._graph_cache: dict[int, tuple[int, TopicGraph]] = {}  # Map identifier -> (version, graph)
+        self._graph_locks: dict[int, asyncio.Lock] = {}
+        self._content_indexes: dict[int, ContentIndex] = {}
+        self._content_locks: dict[int, asyncio.Lock] = {}
+        # Per-map Bloom filters over topic, occurrence and attribute keys; the memory budget is per map
+        self.existence_false_positive_rate = 0.01
+        self.existence_memory_budget = 64 * 1024 * 1024
+        # Seconds a filter is trusted without checking the map's version; only safe above 0 if this store is the map's
+        # only writer, as a filter that misses another writer's keys would report existing keys as absent
+        self.existence_check_interval = 0.0
+        self._existence_filters: dict[int, dict[str, BloomFilter]] = {}
+        self._existence_checked: dict[int, float] = {}  # Map identifier -> time of the last version check
+        self._existence_locks: dict[int, asyncio.Lock] = {}
+
+    async def close(self) -> None:
+        # Background purges are stopped first (they are resumable) so no pool is closed under one
+        purge_tasks = list(self._purge_tasks)
+        for task in purge_tasks:
+            task.cancel()
+        await asyncio.gather(*purge_tasks, return_exceptions=True)
+        await self.connection_pool.close()
+        while self._shard_pools:
+            await self._shard_pools.popitem()[1].close()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *exception_info: object) -> None:
+        await self.close()
+
+    def _get_shard(self, map_identifier: int | None) -> int | None:
+        # The shard holding the map's content; None is the catalog database (which holds all content if the store
+        # isn't sharded)
+        if map_identifier is None or not self.shard_count:
+            return None
+        return map_identifier % self.shard_count
+
+    def get_shard_path(self, shard: int | None) -> str:
+        if shard is None:
+            return self.database_path
+        root, extension = os.path.splitext(self.database_path)
+        return f"{root}.shard-{shard:03}{extension}"
+
+    def _get_shards(self) -> list[int | None]:
+        # The databases holding map content (shards that were never written to don't exist yet)
+        if not self.shard_count:
+            return [None]
+        return [shard for shard in range(self.shard_count) if os.path.exists(self.get_shard_path(shard))]
+
+    async def _get_pool(self, shard: int | None) -> ConnectionPool:
+        if shard is None:
+            return self.connection_pool
+        pool = self._shard_pools.get(shard)
+        if pool is not None and shard in self._shard_schemas:
+            self._shard_pools.move_to_end(shard)
+            return pool
+        async with self._shard_lock:
+            pool = self._shard_pools.get(shard)
+            if pool is None:
+                pool = self._shard_pools[shard] = ConnectionPool(self.get_shard_path(shard), self.pool_size)
+                while len(self._shard_pools) > self.max_open_shards:
+                    # Connections of the evicted pool that are in use are closed once they are released
+                    evicted_pool = self._shard_pools.popitem(last=False)[1]
+                    evicted_pool.size = 0
+                    await evicted_pool.close()
+            self._shard_pools.move_to_end(shard)
+            if shard not in self._shard_schemas:
+                # A shard is created (or brought up to date) on first use
+                try:
+                    async with pool.connection() as db:
+                        await self._create_schema(db)
+                except aiosqlite.Error as error:
+                    raise TopicDbError(f"Error creating shard {shard}: {error}")
+                self._shard_schemas.add(shard)
+        return pool
+
+    @asynccontextmanager
+    async def _connect(self, map_identifier: int | None = None) -> AsyncIterator[aiosqlite.Connection]:
+        # A connection to the database holding the map's content; without a map, to the catalog database
+        async with self._connect_shard(self._get_shard(map_identifier)) as db:
+            yield db
+
+    @asynccontextmanager
+    async def _connect_shard(self, shard: int | None) -> AsyncIterator[aiosqlite.Connection]:
+        # Inside a fanned-out request, every connection counts against the request's concurrency limit. Connections
+        # are never held while awaiting sub-fetches, so the limit cannot deadlock.
+        pool = await self._get_pool(shard)
+        semaphore = _request_semaphore.get()
+        if semaphore is None:
+            async with pool.connection() as db:
+                yield self.query_log.connection(db) if self.query_log is not None else db
+        else:
+            async with semaphore, pool.connection() as db:
+                yield self.query_log.connection(db) if self.query_log is not None else db
+
+    @asynccontextmanager
+    async def _attach(
+        self, db: aiosqlite.Connection, shard: int | None, other_shard: int | None, name: str
+    ) -> AsyncIterator[str]:
+        # Makes the database of 'other_shard' available to a connection to the database of 'shard'. Yields the schema
+        # name to qualify its tables with ('main' if both are the same database).
+        if self.get_shard_path(shard) == self.get_shard_path(other_shard):
+            yield "main"
+            return
+        await db.execute(f"ATTACH DATABASE ? AS {name}", (self.get_shard_path(other_shard),))
+        try:
+            yield name
+        finally:
+            if db.in_transaction:
+                await db.rollback()
+            await db.execute(f"DETACH DATABASE {name}")
+
+    async def _gather(self, *awaitables: Awaitable) -> list:
+        # Runs independent sub-fetches concurrently; results are in the order of the awaitables. The first error is
+        # raised once all of them have finished.
+        token = None
+        if _request_semaphore.get() is None:
+            token = _request_semaphore.set(asyncio.Semaphore(self.max_concurrency))
+        try:
+            result = await asyncio.gather(*awaitables, return_exceptions=True)
+        finally:
+            if token is not None:
+                _request_semaphore.reset(token)
+        for item in result:
+            if isinstance(item, BaseException):
+                raise item
+        return result
+
+    # endregion
+
+    # region Database
+    @staticmethod
+    async def _migrate_database(db: aiosqlite.Connection) -> None:
+        # Bring databases created by earlier versions up to date before the DDL is (re)applied
+        async with db.execute("PRAGMA table_xinfo(attribute)") as cursor:
+            attribute_columns = [record[1] async for record in cursor]
+        if attribute_columns and "typed_value" not in attribute_columns:
+            await db.execute(
+                f"ALTER TABLE attribute ADD COLUMN typed_value GENERATED ALWAYS AS ({ATTRIBUTE_TYPED_VALUE}) VIRTUAL"
+            )
+        async with db.execute("PRAGMA index_info(attribute_7_index)") as cursor:
+            attribute_index_columns = [record[2] async for record in cursor]
+        if attribute_index_columns and "entity_identifier" not in attribute_index_columns:
+            # Typed value queries page through the index in (typed value, entity identifier) order
+            await db.execute("DROP INDEX attribute_7_index")
+        async with db.execute("PRAGMA table_xinfo(map)") as cursor:
+            map_columns = [record[1] async for record in cursor]
+        if map_columns and "deleted" not in map_columns:
+            await db.execute("ALTER TABLE map ADD COLUMN deleted BOOLEAN DEFAULT FALSE NOT NULL")
+        async with db.execute("PRAGMA table_xinfo(occurrence)") as cursor:
+            occurrence_columns = [record[1] async for record in cursor]
+        if occurrence_columns and "resource_hash" not in occurrence_columns:
+            await db.execute("ALTER TABLE occurrence ADD COLUMN resource_hash TEXT")
+        if occurrence_columns and "resource_codec" not in occurrence_columns:
+            await db.execute("ALTER TABLE occurrence ADD COLUMN resource_codec TEXT")
+        # Map versions used to be bumped by a trigger per row written; the store now bumps them once per transaction
+        async with db.execute(
+            "SELECT name FROM sqlite_schema WHERE type = 'trigger' AND name GLOB '*_state_*_trigger'"
+        ) as cursor:
+            triggers = [record[0] async for record in cursor]
+        for trigger in triggers:
+            await db.execute(f"DROP TRIGGER {trigger}")
+
+    async def _create_schema(self, db: aiosqlite.Connection) -> None:
+        async with db.execute("SELECT COUNT(*) FROM sqlite_schema") as cursor:
+            record = await cursor.fetchone()
+        if record[0] == 0:  # type: ignore
+            # Only takes effect before the first table is created. Lets map purges hand freed pages back to the file
+            # system a bit at a time.
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            storage_layout = self.storage_layout
+        else:
+            storage_layout = await self._get_storage_layout(db)
+        await self._migrate_database(db)
+        await db.executescript(COMPACT_DDL if storage_layout is StorageLayout.COMPACT else DDL)
+        await db.executemany(
+            "INSERT OR REPLACE INTO base_topic (identifier, name) VALUES (?, ?)", self.base_topics.items()
+        )
+        await db.execute("DELETE FROM base_topic_template")
+        await db.executemany(
+            """INSERT INTO base_topic_template (identifier, instance_of, base_name_identifier, name, scope, language)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            self._get_base_topic_template(),
+        )
+        await db.commit()
+
+    def _get_base_topic_template(self) -> list[tuple]:
+        # (identifier, instance of, base name identifier, name, scope, language) rows of the base topics, slugified
+        # the way 'set_topics' would store them
+        result = []
+        for identifier, name in self.base_topics.items():
+            topic = Topic(identifier=identifier, name=name)
+            base_name = topic.first_base_name
+            result.append(
+                (
+                    topic.identifier,
+                    topic.instance_of,
+                    base_name.identifier,
+                    base_name.name,
+                    base_name.scope,
+                    base_name.language.name.lower(),
+                )
+            )
+        return result
+
+    async def create_database(self) -> None:
+        # Shards are created on first use
+        try:
+            async with self._connect() as db:
+                await self._create_schema(db)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error creating database: {error}")
+
+    @staticmethod
+    async def _get_storage_layout(db: aiosqlite.Connection, schema: str = "main") -> StorageLayout:
+        async with db.execute(f"SELECT type FROM {schema}.sqlite_schema WHERE name = 'member'") as cursor:
+            record = await cursor.fetchone()
+        return StorageLayout.COMPACT if record and record[0] == "view" else StorageLayout.STANDARD
+
+    async def get_storage_layout(self, map_identifier: int | None = None) -> StorageLayout:
+        # Of the database holding the map's content
+        try:
+            async with self._connect(map_identifier) as db:
+                return await self._get_storage_layout(db)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching storage layout: {error}")
+
+    async def migrate_storage_layout(self, storage_layout: StorageLayout) -> bool:
+        # Converts an existing database (and its shards) to the given storage layout, one transaction per database
+        # (which is locked for writing while it runs). Returns False if the databases have the layout already. Run
+        # VACUUM afterwards to hand the space that was freed back to the file system.
+        columns = ", ".join(("map_identifier", *MAP_TABLES["member"]))
+        result = False
+        try:
+            for shard in dict.fromkeys([None, *self._get_shards()]):
+                async with self._connect_shard(shard) as db:
+                    if await self._get_storage_layout(db) is storage_layout:
+                        continue
+                    if storage_layout is StorageLayout.COMPACT:
+                        interned = " UNION ".join(
+                            f"SELECT map_identifier, {column} FROM member_migration"
+                            for column in columns.split(", ")[1:]
+                        )
+                        script = f"""BEGIN IMMEDIATE;
+                        ALTER TABLE member RENAME TO member_migration;
+                        {COMPACT_MEMBER_DDL}
+                        INSERT INTO topic_key (map_identifier, identifier) {interned};
+                        INSERT INTO member_compact (
+                            member_key, association_key, src_topic_key, src_role_key, dest_topic_key, dest_role_key
+                        )
+                        SELECT member_.key, association.key, src_topic.key, src_role.key, dest_topic.key, dest_role.key
+                        FROM member_migration
+                        JOIN topic_key AS member_ ON member_.map_identifier = member_migration.map_identifier
+                            AND member_.identifier = member_migration.identifier
+                        JOIN topic_key AS association ON association.map_identifier = member_migration.map_identifier
+                            AND association.identifier = member_migration.association_identifier
+                        JOIN topic_key AS src_topic ON src_topic.map_identifier = member_migration.map_identifier
+                            AND src_topic.identifier = member_migration.src_topic_ref
+                        JOIN topic_key AS src_role ON src_role.map_identifier = member_migration.map_identifier
+                            AND src_role.identifier = member_migration.src_role_spec
+                        JOIN topic_key AS dest_topic ON dest_topic.map_identifier = member_migration.map_identifier
+                            AND dest_topic.identifier = member_migration.dest_topic_ref
+                        JOIN topic_key AS dest_role ON dest_role.map_identifier = member_migration.map_identifier
+                            AND dest_role.identifier = member_migration.dest_role_spec
+                        ORDER BY member_.key;
+                        DROP TABLE member_migration;
+                        COMMIT;"""
+                    else:
+                        script = f"""BEGIN IMMEDIATE;
+                        CREATE TABLE member_migration AS SELECT {columns} FROM member;
+                        DROP VIEW member;
+                        DROP TABLE member_compact;
+                        DROP TABLE topic_key;
+                        {MEMBER_DDL}
+                        INSERT INTO member ({columns}) SELECT {columns} FROM member_migration;
+                        DROP TABLE member_migration;
+                        COMMIT;"""
+                    try:
+                        await db.executescript(script)
+                    except BaseException:
+                        if db.in_transaction:
+                            await db.rollback()
+                        raise
+                result = True
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error migrating storage layout: {error}")
+        return result
+
+    # endregion
+
+    # region Ontology
+    async def _load_ontology(self, db: aiosqlite.Connection, map_identifier: int, version: int) -> None:
+        # Type topics: existing topics referred to as an instance of, role spec or scope anywhere in the map
+        sql = """SELECT identifier FROM topic WHERE map_identifier = ? AND identifier IN (
+            SELECT instance_of FROM topic WHERE map_identifier = ?
+            UNION SELECT scope FROM topic WHERE map_identifier = ? AND scope IS NOT NULL
+            UNION SELECT src_role_spec FROM member WHERE map_identifier = ?
+            UNION SELECT dest_role_spec FROM member WHERE map_identifier = ?
+            UNION SELECT instance_of FROM occurrence WHERE map_identifier = ?
+            UNION SELECT scope FROM occurrence WHERE map_identifier = ?)"""
+        async with db.execute(sql, (map_identifier,) * 7) as cursor:
+            identifiers = [record[0] async for record in cursor]
+        self.ontology_registry.load(map_identifier, identifiers, version)
+
+    async def _validate_ontology(
+        self, db: aiosqlite.Connection, map_identifier: int, references: set[str], defined: set[str]
+    ) -> None:
+        # Resolves the references against the registry's declared types only: the base topics, the topics the map
+        # already uses as types and the topics defined by this write. Other existing topics are not types.
+        version = await self._get_map_version(db, map_identifier)
+        if not self.ontology_registry.is_loaded(map_identifier, version):
+            await self._load_ontology(db, map_identifier, version)
+        missing = self.ontology_registry.missing(map_identifier, references)
+        resolved = missing & defined
+        missing -= defined
+        if missing:
+            raise TopicDbError(f"Undefined type topic(s): {', '.join(sorted(missing))}")
+        self.ontology_registry.add(map_identifier, resolved)
+
+    @staticmethod
+    def _attribute_row(map_identifier: int, attribute: Attribute) -> tuple:
+        return (
+            map_identifier,
+            attribute.identifier,
+            attribute.entity_identifier,
+            attribute.name,
+            str(attribute.value),
+            attribute.data_type.name.lower(),
+            attribute.scope,
+            attribute.language.name.lower(),
+        )
+
+    async def _set_entities(
+        self,
+        map_identifier: int,
+        topics: list[Topic] | None = None,
+        associations: list[Association] | None = None,
+        occurrences: list[Occurrence] | None = None,
+        attributes: list[Attribute] | None = None,
+        ontology_mode: OntologyMode = OntologyMode.LENIENT,
+    ) -> None:
+        topic_rows: list[tuple] = []
+        base_name_rows: list[tuple] = []
+        member_rows: list[tuple] = []
+        occurrence_rows: list[tuple] = []
+        attribute_rows: list[tuple] = []
+        references: set[str] = set()
+        defined: set[str] = set()
+
+        for topic in topics or []:
+            topic_rows.append((map_identifier, topic.identifier, topic.instance_of, None))
+            references.add(topic.instance_of)
+            defined.add(topic.identifier)
+            for base_name in topic.base_names:
+                base_name_rows.append(
+                    (
+                        map_identifier,
+                        base_name.identifier,
+                        base_name.name,
+                        topic.identifier,
+                        base_name.scope,
+                        base_name.language.name.lower(),
+                    )
+                )
+                references.add(base_name.scope)
+            attribute_rows.extend(self._attribute_row(map_identifier, attribute) for attribute in topic.attributes)
+        for association in associations or []:
+            if association.member.src_topic_ref == "" or association.member.dest_topic_ref == "":
+                raise TopicDbError(f"Association '{association.identifier}' has an incomplete member")
+            topic_rows.append((map_identifier, association.identifier, association.instance_of, association.scope))
+            member_rows.append(
+                (
+                    map_identifier,
+                    association.member.identifier,
+                    association.identifier,
+                    association.member.src_topic_ref,
+                    association.member.src_role_spec,
+                    association.member.dest_topic_ref,
+                    association.member.dest_role_spec,
+                )
+            )
+            references.update(
+                (
+                    association.instance_of,
+                    association.scope,
+                    association.member.src_role_spec,
+                    association.member.dest_role_spec,
+                )
+            )
+            for base_name in association.base_names:
+                base_name_rows.append(
+                    (
+                        map_identifier,
+                        base_name.identifier,
+                        base_name.name,
+                        association.identifier,
+                        base_name.scope,
+                        base_name.language.name.lower(),
+                    )
+                )
+                references.add(base_name.scope)
+            attribute_rows.extend(
+                self._attribute_row(map_identifier, attribute) for attribute in association.attributes
+            )
+        resource_data = await self._encode_resource_data(occurrences or [])
+        for occurrence, (data, hash_, codec) in zip(occurrences or [], resource_data):
+            occurrence_rows.append(
+                (
+                    map_identifier,
+                    occurrence.identifier,
+                    occurrence.instance_of,
+                    occurrence.scope,
+                    occurrence.resource_ref,
+                    data,
+                    occurrence.topic_identifier,
+                    occurrence.language.name.lower(),
+                    hash_,
+                    codec,
+                )
+            )
+            references.update((occurrence.instance_of, occurrence.scope))
+            attribute_rows.extend(self._attribute_row(map_identifier, attribute) for attribute in occurrence.attributes)
+        for attribute in attributes or []:
+            attribute_rows.append(self._attribute_row(map_identifier, attribute))
+        references.update(row[6] for row in attribute_rows)  # Attribute scopes
+        # A loaded content index is kept up to date with this write
+        content_index = self._content_indexes.get(map_identifier)
+        content_topics = {row[6] for row in occurrence_rows if row[2] in CONTENT_INSTANCE_OFS}
+        # So are loaded existence filters
+        existence_filters = self._existence_filters.get(map_identifier)
+        previous_version = None
+
+        try:
+            async with self._connect(map_identifier) as db:
+                await db.execute("BEGIN IMMEDIATE")
+                try:
+                    if ontology_mode is OntologyMode.STRICT:
+                        await self._validate_ontology(db, map_identifier, references, defined)
+                    if content_index is not None or existence_filters is not None:
+                        previous_version = await self._get_map_version(db, map_identifier)
+                    if content_index is not None:
+                        # Occurrences that move to another topic, or stop being text, change their previous topic's
+                        # document too
+                        identifiers = [row[1] for row in occurrence_rows]
+                        for index in range(0, len(identifiers), MAX_BIND_VARIABLES):
+                            chunk = identifiers[index : index + MAX_BIND_VARIABLES]
+                            async with db.execute(
+                                f"""SELECT topic_identifier FROM occurrence
+                                WHERE map_identifier = ? AND identifier IN ({", ".join("?" * len(chunk))})
+                                AND instance_of IN ({", ".join("?" * len(CONTENT_INSTANCE_OFS))})""",
+                                (map_identifier, *chunk, *CONTENT_INSTANCE_OFS),
+                            ) as cursor:
+                                content_topics.update(record[0] for record in await cursor.fetchall())
+                    if topic_rows:
+                        await db.executemany(
+                            """INSERT INTO topic (map_identifier, identifier, instance_of, scope) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (map_identifier, identifier) DO UPDATE SET
+                            instance_of = excluded.instance_of, scope = excluded.scope""",
+                            topic_rows,
+                        )
+                        await db.executemany(
+                            "DELETE FROM basename WHERE map_identifier = ? AND topic_identifier = ?",
+                            [(map_identifier, row[1]) for row in topic_rows],
+                        )
+                    if base_name_rows:
+                        await db.executemany(
+                            """INSERT INTO basename (map_identifier, identifier, name, topic_identifier, scope, language)
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                            base_name_rows,
+                        )
+                    if member_rows:
+                        await db.executemany(
+                            "DELETE FROM member WHERE map_identifier = ? AND association_identifier = ?",
+                            [(map_identifier, row[2]) for row in member_rows],
+                        )
+                        await db.executemany(
+                            """INSERT INTO member (map_identifier, identifier, association_identifier, src_topic_ref,
+                            src_role_spec, dest_topic_ref, dest_role_spec)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                            member_rows,
+                        )
+                    if occurrence_rows:
+                        await db.executemany(
+                            """INSERT INTO occurrence (map_identifier, identifier, instance_of, scope, resource_ref,
+                            resource_data, topic_identifier, language, resource_hash, resource_codec)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (map_identifier, identifier) DO UPDATE SET
+                            instance_of = excluded.instance_of,
+                            scope = excluded.scope,
+                            resource_ref = excluded.resource_ref,
+                            resource_data = excluded.resource_data,
+                            topic_identifier = excluded.topic_identifier,
+                            language = excluded.language,
+                            resource_hash = excluded.resource_hash,
+                            resource_codec = excluded.resource_codec""",
+                            occurrence_rows,
+                        )
+                    if attribute_rows:
+                        await db.executemany(
+                            """INSERT INTO attribute (map_identifier, identifier, entity_identifier, name, value,
+                            data_type, scope, language)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (map_identifier, entity_identifier, name, scope, language) DO UPDATE SET
+                            identifier = excluded.identifier,
+                            value = excluded.value,
+                            data_type = excluded.data_type""",
+                            attribute_rows,
+                        )
+                    version = await self._bump_map_version(db, map_identifier)
+                    await db.commit()
+                except BaseException:
+                    await db.rollback()
+                    raise
+        except aiosqlite.Error as error:
+            self.ontology_registry.invalidate(map_identifier)
+            raise TopicDbError(f"Error setting entities: {error}")
+        # Reads that started before this write must not be joined by reads that start after it
+        self.single_flight.forget(map_identifier)
+        if ontology_mode is OntologyMode.STRICT:
+            # The registry has seen every change made by this write; mark it as current
+            self.ontology_registry.add(map_identifier, (), version)
+        else:
+            self.ontology_registry.invalidate(map_identifier)
+        if existence_filters is not None:
+            self._update_existence_filters(
+                map_identifier,
+                {
+                    "topic": [row[1] for row in topic_rows],
+                    "occurrence": [row[1] for row in occurrence_rows],
+                    "attribute": [self._existence_key((row[2], row[3])) for row in attribute_rows],
+                },
+                previous_version,
+                version,
+            )
+        if content_index is not None:
+            await self._update_content_index(map_identifier, content_topics, previous_version, version)
+
     # endregion
 
     # region Topic
@@ -95,6 +788,7 @@ class TopicStore:
     def _normalize_topic_name(topic_identifier: str) -> str:
         return " ".join([word.capitalize() for word in topic_identifier.split("-")])
 
+    @coalesced
     async def get_topic(
         self,
         map_identifier: int,
@@ -104,31 +798,146 @@ class TopicStore:
         resolve_attributes: RetrievalMode = RetrievalMode.DONT_RESOLVE_ATTRIBUTES,
         resolve_occurrences: RetrievalMode = RetrievalMode.DONT_RESOLVE_OCCURRENCES,
     ) -> Topic | None:
-        result = None
+        topic_record = await self._topic_loader.get(map_identifier, identifier)
+        if topic_record is None:
+            return None
+        result = Topic(topic_record["identifier"], topic_record["instance_of"])
+        # Base names
+        result.clear_base_names()
+        # TODO: Add base names
+        # Attributes and occurrences are fetched concurrently
+        fetches = {}
+        if resolve_attributes and resolve_attributes is RetrievalMode.RESOLVE_ATTRIBUTES:
+            fetches["attributes"] = self.get_attributes(map_identifier, identifier, scope=scope)
+        if resolve_occurrences and resolve_occurrences is RetrievalMode.RESOLVE_OCCURRENCES:
+            fetches["occurrences"] = self.get_topic_occurrences(map_identifier, identifier, scope=scope)
+        resolved = dict(zip(fetches, await self._gather(*fetches.values())))
+        if "attributes" in resolved:
+            result.add_attributes(resolved["attributes"])
+        if "occurrences" in resolved:
+            result.add_occurrences(resolved["occurrences"])
+        return result
+
+    async def _load_topic_records(self, map_identifier: int, identifiers: list[str]) -> dict[str, aiosqlite.Row]:
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(
-                    "SELECT identifier, instance_of FROM topic WHERE map_identifier = ? AND identifier = ?",
-                    (map_identifier, identifier),
-                ) as topic_cursor:
-                    async for topic_record in topic_cursor:
-                        result = Topic(topic_record["identifier"], topic_record["instance_of"])
-                        # Base names
-                        result.clear_base_names()
-                        # TODO: Add base names
-                        # Attributes
-                        if resolve_attributes and resolve_attributes is RetrievalMode.RESOLVE_ATTRIBUTES:
-                            result.add_attributes(await self.get_attributes(map_identifier, identifier, scope=scope))
-                        # Occurrences
-                        if resolve_occurrences and resolve_occurrences is RetrievalMode.RESOLVE_OCCURRENCES:
-                            result.add_occurrences(
-                                await self.get_topic_occurrences(map_identifier, identifier, scope=scope)
+                    f"""SELECT identifier, instance_of FROM topic
+                    WHERE map_identifier = ? AND identifier IN ({", ".join("?" * len(identifiers))})""",
+                    (map_identifier, *identifiers),
+                ) as cursor:
+                    return {record["identifier"]: record for record in await cursor.fetchall()}
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching topics: {error}")
+
+    async def topic_exists(self, map_identifier: int, identifier: str) -> bool:
+        return bool(await self._existing(map_identifier, "topic", [identifier]))
+
+    async def topics_exist(self, map_identifier: int, identifiers: list[str]) -> set[str]:
+        # The given identifiers that exist
+        return await self._existing(map_identifier, "topic", identifiers)
+
+    async def set_topic(
+        self, map_identifier: int, topic: Topic, ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, topics=[topic], ontology_mode=ontology_mode)
+
+    async def set_topics(
+        self, map_identifier: int, topics: list[Topic], ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, topics=topics, ontology_mode=ontology_mode)
+
+    async def get_topics(
+        self,
+        map_identifier: int,
+        instance_of: str | None = None,
+        language: Language | None = None,
+        ordering: TopicOrdering = TopicOrdering.IDENTIFIER,
+        after: str | tuple[str, str] | None = None,
+        limit: int = 100,
+        filter_base_topics: RetrievalMode = RetrievalMode.FILTER_BASE_TOPICS,
+    ) -> list[Topic]:
+        # Keyset pagination: 'after' is the identifier of the last topic of the previous page or, when ordering by
+        # name, its (base name, identifier) pair. Topics come with their base names ('language' filters those base
+        # names); when ordering by name, they are listed once per matching base name.
+        result: list[Topic] = []
+        query_filter = ""
+        bind_variables: list = [map_identifier]
+        if instance_of:
+            query_filter += " AND topic.instance_of = ?"
+            bind_variables.append(instance_of)
+        if filter_base_topics is RetrievalMode.FILTER_BASE_TOPICS:
+            query_filter += " AND topic.identifier NOT IN (SELECT identifier FROM base_topic)"
+        language_filter = " AND basename.language = ?" if language else ""
+        if ordering is TopicOrdering.NAME:
+            query_filter += language_filter
+            if language:
+                bind_variables.append(language.name.lower())
+            if after:
+                if not isinstance(after, tuple):
+                    raise TopicDbError("Ordering by name requires a (name, identifier) 'after' parameter")
+                query_filter += " AND (basename.name, basename.topic_identifier) > (?, ?)"
+                bind_variables.extend(after)
+            sql = f"""SELECT topic.identifier AS identifier, topic.instance_of AS instance_of,
+                basename.identifier AS base_name_identifier, basename.name AS name, basename.scope AS scope,
+                basename.language AS language
+                FROM basename
+                INNER JOIN topic ON topic.map_identifier = basename.map_identifier
+                AND topic.identifier = basename.topic_identifier
+                WHERE basename.map_identifier = ? AND topic.scope IS NULL{query_filter}
+                ORDER BY basename.name, basename.topic_identifier
+                LIMIT ?"""
+        else:
+            if after:
+                if isinstance(after, tuple):
+                    raise TopicDbError("Ordering by identifier requires an identifier 'after' parameter")
+                query_filter += " AND topic.identifier > ?"
+                bind_variables.append(after)
+            # The page's base names are joined to it in the same query
+            sql = f"""SELECT page.identifier AS identifier, page.instance_of AS instance_of,
+                basename.identifier AS base_name_identifier, basename.name AS name, basename.scope AS scope,
+                basename.language AS language
+                FROM (
+                    SELECT topic.identifier, topic.instance_of FROM topic
+                    WHERE topic.map_identifier = ? AND topic.scope IS NULL{query_filter}
+                    ORDER BY topic.identifier
+                    LIMIT ?
+                ) AS page
+                LEFT JOIN basename ON basename.map_identifier = ? AND basename.topic_identifier = page.identifier
+                {language_filter}
+                ORDER BY page.identifier, basename.rowid"""
+        bind_variables.append(limit)
+        if ordering is not TopicOrdering.NAME:
+            bind_variables.append(map_identifier)
+            if language:
+                bind_variables.append(language.name.lower())
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute(sql, bind_variables) as cursor:
+                    topic = None
+                    async for record in cursor:
+                        # Ordered by name, every record is a topic of its own; ordered by identifier, a topic's base
+                        # names are consecutive records
+                        if ordering is TopicOrdering.NAME or topic is None or topic.identifier != record["identifier"]:
+                            topic = Topic(record["identifier"], record["instance_of"])
+                            topic.clear_base_names()
+                            result.append(topic)
+                        if record["name"] is not None:
+                            topic.add_base_name(
+                                BaseName(
+                                    record["name"],
+                                    record["scope"],
+                                    Language[record["language"].upper()],
+                                    record["base_name_identifier"],
+                                )
                             )
         except aiosqlite.Error as error:
-            raise TopicDbError(f"Error fetching topic: {error}")
+            raise TopicDbError(f"Error fetching topics: {error}")
         return result
 
+    @coalesced
     async def get_related_topics(
         self,
         map_identifier: int,
@@ -143,16 +952,18 @@ class TopicStore:
         )
         if associations:
             groups = await self.get_association_groups(map_identifier, identifier, associations=associations)
-            for instance_of in groups.dict:
-                for role in groups.dict[instance_of]:
-                    for topic_ref in groups[instance_of, role]:
-                        if topic_ref == identifier:
-                            continue
-                        topic = await self.get_topic(map_identifier, topic_ref)
-                        if topic:
-                            result.append(topic)
+            topic_refs = [
+                topic_ref
+                for instance_of in groups.dict
+                for role in groups.dict[instance_of]
+                for topic_ref in groups[instance_of, role]
+                if topic_ref != identifier
+            ]
+            topics = await self._gather(*(self.get_topic(map_identifier, topic_ref) for topic_ref in topic_refs))
+            result.extend(topic for topic in topics if topic)
         return result
 
+    @coalesced
     async def get_topic_associations(
         self,
         map_identifier: int,
@@ -167,8 +978,9 @@ class TopicStore:
 
         sql = """SELECT identifier FROM topic WHERE map_identifier = ? {0} AND
                 identifier IN
-                    (SELECT association_identifier FROM member
-                     WHERE map_identifier = ? AND (src_topic_ref = ? OR dest_topic_ref = ?))"""
+                    (SELECT association_identifier FROM member WHERE map_identifier = ? AND src_topic_ref = ?
+                     UNION
+                     SELECT association_identifier FROM member WHERE map_identifier = ? AND dest_topic_ref = ?)"""
         if instance_ofs:
             instance_of_in_condition = " AND instance_of IN ("
             for index, value in enumerate(instance_ofs):
@@ -179,11 +991,15 @@ class TopicStore:
             if scope:
                 query_filter = instance_of_in_condition + " AND scope = ? "
                 bind_variables = (
-                    (map_identifier,) + tuple(instance_ofs) + (scope, map_identifier, identifier, identifier)
+                    (map_identifier,)
+                    + tuple(instance_ofs)
+                    + (scope, map_identifier, identifier, map_identifier, identifier)
                 )
             else:
                 query_filter = instance_of_in_condition
-                bind_variables = (map_identifier,) + tuple(instance_ofs) + (map_identifier, identifier, identifier)
+                bind_variables = (
+                    (map_identifier,) + tuple(instance_ofs) + (map_identifier, identifier, map_identifier, identifier)
+                )
         else:
             if scope:
                 query_filter = " AND scope = ?"
@@ -192,6 +1008,7 @@ class TopicStore:
                     scope,
                     map_identifier,
                     identifier,
+                    map_identifier,
                     identifier,
                 )
             else:
@@ -200,27 +1017,34 @@ class TopicStore:
                     map_identifier,
                     map_identifier,
                     identifier,
+                    map_identifier,
                     identifier,
                 )
         try:
-            async with aiosqlite.connect(self.database_path) as db:
-                db.row_factory = aiosqlite.Row
-                async with db.execute(sql.format(query_filter), bind_variables) as cursor:
-                    async for record in cursor:
-                        association = await self.get_association(
-                            map_identifier,
-                            record["identifier"],
-                            language=language,
-                            resolve_attributes=resolve_attributes,
-                            resolve_occurrences=resolve_occurrences,
-                        )
-                        if association:
-                            result.append(association)
+            async with (
+                self._connect(map_identifier) as db,
+                db.execute(sql.format(query_filter), bind_variables) as cursor,
+            ):
+                association_identifiers = [record[0] for record in await cursor.fetchall()]
         except aiosqlite.Error as error:
             raise TopicDbError(f"Error fetching associations: {error}")
+        associations = await self._gather(
+            *(
+                self.get_association(
+                    map_identifier,
+                    association_identifier,
+                    language=language,
+                    resolve_attributes=resolve_attributes,
+                    resolve_occurrences=resolve_occurrences,
+                )
+                for association_identifier in association_identifiers
+            )
+        )
+        result.extend(association for association in associations if association)
 
         return result
 
+    @coalesced
     async def get_topic_occurrences(
         self,
         map_identifier: int,
@@ -286,27 +1110,40 @@ class TopicStore:
                     query_filter = ""
                     bind_variables = (map_identifier, identifier)  # type: ignore
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(sql.format(query_filter), bind_variables) as cursor:
-                    async for record in cursor:
-                        resource_data = None
-                        if inline_resource_data and inline_resource_data is RetrievalMode.INLINE_RESOURCE_DATA:
-                            resource_data = await self.get_occurrence_data(map_identifier, record["identifier"])
-                        occurrence = Occurrence(
-                            record["identifier"],
-                            record["instance_of"],
-                            record["topic_identifier"],
-                            record["scope"],
-                            record["resource_ref"],
-                            resource_data,  # Type: bytes
-                            Language[record["language"].upper()],
-                        )
-                        if resolve_attributes and resolve_attributes is RetrievalMode.RESOLVE_ATTRIBUTES:
-                            occurrence.add_attributes(await self.get_attributes(map_identifier, occurrence.identifier))
-                        result.append(occurrence)
+                    records = await cursor.fetchall()
         except aiosqlite.Error as error:
             raise TopicDbError(f"Error fetching occurrences: {error}")
+        for record in records:
+            result.append(
+                Occurrence(
+                    record["identifier"],
+                    record["instance_of"],
+                    record["topic_identifier"],
+                    record["scope"],
+                    record["resource_ref"],
+                    None,
+                    Language[record["language"].upper()],
+                )
+            )
+        # Resource data and attributes are fetched concurrently, after the connection has been released
+        inline = inline_resource_data and inline_resource_data is RetrievalMode.INLINE_RESOURCE_DATA
+        resolve = resolve_attributes and resolve_attributes is RetrievalMode.RESOLVE_ATTRIBUTES
+        fetches = []
+        if inline:
+            fetches.extend(self.get_occurrence_data(map_identifier, occurrence.identifier) for occurrence in result)
+        if resolve:
+            fetches.extend(self.get_attributes(map_identifier, occurrence.identifier) for occurrence in result)
+        resolved = await self._gather(*fetches)
+        if inline:
+            for occurrence, resource_data in zip(result, resolved):
+                if resource_data is not None:
+                    occurrence.resource_data = resource_data  # Type: bytes
+        if resolve:
+            for occurrence, attributes in zip(result, resolved[len(result) if inline else 0 :]):
+                occurrence.add_attributes(attributes)
         return result
 
     # endregion
@@ -316,6 +1153,7 @@ class TopicStore:
         result: list[BaseName] = []
         # TODO: Implement
         return result
+
     # endregion
 
     # region Association
@@ -336,72 +1174,85 @@ class TopicStore:
 
         return result
 
+    @coalesced
     async def get_association(
         self,
         map_identifier: int,
         identifier: str,
         scope: str | None = None,
         language: Language | None = None,
-        resolve_attributes: (
-            RetrievalMode | None
-        ) = RetrievalMode.DONT_RESOLVE_ATTRIBUTES,
-        resolve_occurrences: (
-            RetrievalMode | None
-        ) = RetrievalMode.DONT_RESOLVE_OCCURRENCES,
+        resolve_attributes: (RetrievalMode | None) = RetrievalMode.DONT_RESOLVE_ATTRIBUTES,
+        resolve_occurrences: (RetrievalMode | None) = RetrievalMode.DONT_RESOLVE_OCCURRENCES,
     ) -> Association | None:
-        result = None
+        records = await self._association_loader.get(map_identifier, identifier)
+        if records is None:
+            return None
+        association_record, member_records = records
+        result = Association(
+            identifier=association_record["identifier"],
+            instance_of=association_record["instance_of"],
+            scope=association_record["scope"],
+        )
+        # Base names
+        result.clear_base_names()
+        # TODO: Add base names
+        for member_record in member_records:
+            result.member = Member(
+                src_topic_ref=member_record["src_topic_ref"],
+                src_role_spec=member_record["src_role_spec"],
+                dest_topic_ref=member_record["dest_topic_ref"],
+                dest_role_spec=member_record["dest_role_spec"],
+                identifier=member_record["identifier"],
+            )
+        # Attributes and occurrences are fetched concurrently
+        fetches = {}
+        if resolve_attributes and resolve_attributes is RetrievalMode.RESOLVE_ATTRIBUTES:
+            fetches["attributes"] = self.get_attributes(map_identifier, identifier)
+        if resolve_occurrences and resolve_occurrences is RetrievalMode.RESOLVE_OCCURRENCES:
+            fetches["occurrences"] = self.get_topic_occurrences(map_identifier, identifier)
+        resolved = dict(zip(fetches, await self._gather(*fetches.values())))
+        if "attributes" in resolved:
+            result.add_attributes(resolved["attributes"])
+        if "occurrences" in resolved:
+            result.add_occurrences(resolved["occurrences"])
+        return result
+
+    async def _load_association_records(
+        self, map_identifier: int, identifiers: list[str]
+    ) -> dict[str, tuple[aiosqlite.Row, tuple[aiosqlite.Row, ...]]]:
+        # Association identifier -> (association record, member records)
+        placeholders = ", ".join("?" * len(identifiers))
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
-
-                # Association record
                 async with db.execute(
-                    "SELECT identifier, instance_of, scope FROM topic WHERE map_identifier = ? AND identifier = ? AND scope IS NOT NULL",
-                    (map_identifier, identifier),
-                ) as association_cursor:
-                    async for association_record in association_cursor:
-                        result = Association(
-                            identifier=association_record["identifier"],
-                            instance_of=association_record["instance_of"],
-                            scope=association_record["scope"],
-                        )
-                        # Base names
-                        result.clear_base_names()
-                        # TODO: Add base names
-                        # Member record
-                        async with db.execute(
-                            "SELECT * FROM member WHERE map_identifier = ? AND association_identifier = ?",
-                            (map_identifier, identifier),
-                        ) as member_cursor:
-                            async for member_record in member_cursor:
-                                member = Member(
-                                    src_topic_ref=member_record["src_topic_ref"],
-                                    src_role_spec=member_record["src_role_spec"],
-                                    dest_topic_ref=member_record["dest_topic_ref"],
-                                    dest_role_spec=member_record["dest_role_spec"],
-                                    identifier=member_record["identifier"],
-                                )
-                                result.member = member
-                        if (
-                            resolve_attributes
-                            and resolve_attributes is RetrievalMode.RESOLVE_ATTRIBUTES
-                        ):
-                            result.add_attributes(
-                                await self.get_attributes(map_identifier, identifier)
-                            )
-                        if (
-                            resolve_occurrences
-                            and resolve_occurrences is RetrievalMode.RESOLVE_OCCURRENCES
-                        ):
-                            result.add_occurrences(
-                                await self.get_topic_occurrences(
-                                    map_identifier, identifier
-                                )
-                            )
+                    f"""SELECT identifier, instance_of, scope FROM topic
+                    WHERE map_identifier = ? AND identifier IN ({placeholders}) AND scope IS NOT NULL""",
+                    (map_identifier, *identifiers),
+                ) as cursor:
+                    result = {record["identifier"]: (record, []) for record in await cursor.fetchall()}
+                if not result:
+                    return result
+                async with db.execute(
+                    f"SELECT * FROM member WHERE map_identifier = ? AND association_identifier IN ({placeholders})",
+                    (map_identifier, *identifiers),
+                ) as cursor:
+                    async for record in cursor:
+                        if record["association_identifier"] in result:
+                            result[record["association_identifier"]][1].append(record)
         except aiosqlite.Error as error:
-            raise TopicDbError(f"Error fetching association: {error}")
+            raise TopicDbError(f"Error fetching associations: {error}")
+        return {identifier: (record, tuple(members)) for identifier, (record, members) in result.items()}
 
-        return result
+    async def set_association(
+        self, map_identifier: int, association: Association, ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, associations=[association], ontology_mode=ontology_mode)
+
+    async def set_associations(
+        self, map_identifier: int, associations: list[Association], ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, associations=associations, ontology_mode=ontology_mode)
 
     async def get_association_groups(
         self,
@@ -412,9 +1263,7 @@ class TopicStore:
         scope: str | None = None,
     ) -> DoubleKeyDict:
         if identifier == "" and associations is None:
-            raise TopicDbError(
-                "At least one of following parameters is required: 'identifier' or 'associations'"
-            )
+            raise TopicDbError("At least one of following parameters is required: 'identifier' or 'associations'")
 
         result = DoubleKeyDict()
         if not associations:
@@ -440,6 +1289,7 @@ class TopicStore:
     # endregion
 
     # region Occurrence
+    @coalesced
     async def get_occurrence(
         self,
         map_identifier: int,
@@ -447,69 +1297,263 @@ class TopicStore:
         inline_resource_data: RetrievalMode = RetrievalMode.DONT_INLINE_RESOURCE_DATA,
         resolve_attributes: RetrievalMode = RetrievalMode.DONT_RESOLVE_ATTRIBUTES,
     ) -> Occurrence | None:
-        result = None
+        record = await self._occurrence_loader.get(map_identifier, identifier)
+        if record is None:
+            return None
+        result = Occurrence(
+            record["identifier"],
+            record["instance_of"],
+            record["topic_identifier"],
+            record["scope"],
+            record["resource_ref"],
+            None,
+            Language[record["language"].upper()],
+        )
+        # Resource data and attributes are fetched concurrently
+        fetches = {}
+        if inline_resource_data and inline_resource_data.value is RetrievalMode.INLINE_RESOURCE_DATA.value:
+            fetches["resource_data"] = self.get_occurrence_data(map_identifier, identifier)
+        if resolve_attributes and resolve_attributes.value is RetrievalMode.RESOLVE_ATTRIBUTES.value:
+            fetches["attributes"] = self.get_attributes(map_identifier, identifier)
+        resolved = dict(zip(fetches, await self._gather(*fetches.values())))
+        if resolved.get("resource_data") is not None:
+            result.resource_data = resolved["resource_data"]  # Type: bytes
+        if "attributes" in resolved:
+            result.add_attributes(resolved["attributes"])
+        return result
+
+    async def _load_occurrence_records(self, map_identifier: int, identifiers: list[str]) -> dict[str, aiosqlite.Row]:
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(
-                    "SELECT identifier, instance_of, scope, resource_ref, topic_identifier, language FROM occurrence WHERE map_identifier = ? AND identifier = ?",
-                    (map_identifier, identifier),
+                    f"""SELECT identifier, instance_of, scope, resource_ref, topic_identifier, language FROM occurrence
+                    WHERE map_identifier = ? AND identifier IN ({", ".join("?" * len(identifiers))})""",
+                    (map_identifier, *identifiers),
                 ) as cursor:
-                    async for record in cursor:
-                        resource_data = None
-                        if (
-                            inline_resource_data
-                            and inline_resource_data.value is RetrievalMode.INLINE_RESOURCE_DATA.value
-                        ):
-                            resource_data = await self.get_occurrence_data(map_identifier, identifier)
-                        result = Occurrence(
-                            record["identifier"],
-                            record["instance_of"],
-                            record["topic_identifier"],
-                            record["scope"],
-                            record["resource_ref"],
-                            resource_data,  # Type: bytes
-                            Language[record["language"].upper()],
-                        )
-                        if resolve_attributes and resolve_attributes.value is RetrievalMode.RESOLVE_ATTRIBUTES.value:
-                            result.add_attributes(await self.get_attributes(map_identifier, identifier))
+                    return {record["identifier"]: record for record in await cursor.fetchall()}
         except aiosqlite.Error as error:
-            raise TopicDbError(f"Error fetching occurrence: {error}")
-        return result
+            raise TopicDbError(f"Error fetching occurrences: {error}")
+
+    async def occurrence_exists(self, map_identifier: int, identifier: str) -> bool:
+        return bool(await self._existing(map_identifier, "occurrence", [identifier]))
+
+    async def occurrences_exist(self, map_identifier: int, identifiers: list[str]) -> set[str]:
+        # The given identifiers that exist
+        return await self._existing(map_identifier, "occurrence", identifiers)
+
+    async def set_occurrence(
+        self, map_identifier: int, occurrence: Occurrence, ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, occurrences=[occurrence], ontology_mode=ontology_mode)
 
+    async def set_occurrences(
+        self, map_identifier: int, occurrences: list[Occurrence], ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, occurrences=occurrences, ontology_mode=ontology_mode)
+
+    @coalesced
     async def get_occurrence_data(self, map_identifier: int, identifier: str) -> bytes | None:
         result = None
+        hash_ = None
+        codec = None
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(
-                    "SELECT resource_data FROM occurrence WHERE map_identifier = ? AND identifier = ?",
+                    """SELECT resource_data, resource_hash, resource_codec FROM occurrence
+                    WHERE map_identifier = ? AND identifier = ?""",
                     (map_identifier, identifier),
                 ) as cursor:
                     async for record in cursor:
                         if record["resource_data"] is not None:
                             result = record["resource_data"]  # Type: bytes
+                        hash_ = record["resource_hash"]
+                        codec = record["resource_codec"]
         except aiosqlite.Error as error:
             raise TopicDbError(f"Error fetching occurrence data: {error}")
+        if hash_ is None and codec is None:
+            return result
+        if hash_ is not None and self.blob_store is None:
+            raise TopicDbError(f"Occurrence data of '{identifier}' is in a blob store that is not configured")
+        # Reading (memory-mapped) files and decompressing are blocking; keep both off the event loop
+        return await asyncio.to_thread(self._decode_resource_data, result, hash_, codec)
+
+    def _decode_resource_data(self, data: bytes | None, hash_: str | None, codec: str | None) -> bytes | None:
+        # Blocking: reads from the blob store and decompresses
+        if hash_ is not None:
+            if self.blob_store is None:
+                raise TopicDbError("Occurrence data is in a blob store that is not configured")
+            data = self.blob_store.read(hash_)
+        if codec is not None and data is not None:
+            data = self._get_codec(codec).decompress(data)
+        return data
+
+    def _get_codec(self, name: str) -> Codec:
+        try:
+            return self.codecs[name]
+        except KeyError:
+            raise TopicDbError(f"Unknown codec: {name}")
+
+    async def _encode_resource_data(
+        self, occurrences: list[Occurrence]
+    ) -> list[tuple[bytes | None, str | None, str | None]]:
+        # (resource data, blob hash, codec) triples. Data is compressed if a codec is configured (and the result is
+        # actually smaller); data at or above the blob store's threshold is then written to the store and replaced
+        # by its hash. Both steps run in a worker thread.
+        blob_store = self.blob_store
+        codec = self._get_codec(self.codec.name) if self.codec else None
+        if blob_store is None and codec is None:
+            return [(occurrence.resource_data, None, None) for occurrence in occurrences]  # type: ignore
+
+        def encode() -> list[tuple[bytes | None, str | None, str | None]]:
+            result: list[tuple[bytes | None, str | None, str | None]] = []
+            for occurrence in occurrences:
+                data: bytes | None = occurrence.resource_data  # type: ignore
+                codec_name = None
+                if data and codec and occurrence.instance_of not in self.uncompressed_instance_ofs:
+                    compressed_data = codec.compress(data)
+                    if len(compressed_data) < len(data):
+                        data = compressed_data
+                        codec_name = codec.name
+                if data and blob_store and len(data) >= blob_store.threshold:
+                    result.append((None, blob_store.write(data), codec_name))
+                else:
+                    result.append((data, None, codec_name))
+            return result
+
+        return await asyncio.to_thread(encode)
+
+    async def migrate_resource_data(
+        self,
+        map_identifier: int | None = None,
+        batch_size: int = 100,
+        progress: Callable[[int], None] | None = None,
+    ) -> int:
+        # Moves existing resource data at or above the threshold out of the 'occurrence' table and into the blob
+        # store, one batch (transaction) at a time. Returns the number of occurrences migrated.
+        if self.blob_store is None:
+            raise TopicDbError("No blob store has been configured")
+        result = 0
+        map_filter = "AND map_identifier = ?" if map_identifier is not None else ""
+        bind_variables: tuple = (self.blob_store.threshold,)
+        if map_identifier is not None:
+            bind_variables += (map_identifier,)
+        shards = self._get_shards() if map_identifier is None else [self._get_shard(map_identifier)]
+        try:
+            for shard in shards:
+                async with self._connect_shard(shard) as db:
+                    while True:
+                        async with db.execute(
+                            f"""SELECT rowid, resource_data FROM occurrence
+                            WHERE resource_hash IS NULL AND length(resource_data) >= ? {map_filter}
+                            LIMIT {int(batch_size)}""",
+                            bind_variables,
+                        ) as cursor:
+                            records = await cursor.fetchall()
+                        if not records:
+                            break
+                        hashes = await asyncio.to_thread(
+                            lambda batch: [self.blob_store.write(record[1]) for record in batch],  # type: ignore
+                            records,
+                        )
+                        await db.executemany(
+                            "UPDATE occurrence SET resource_data = NULL, resource_hash = ? WHERE rowid = ?",
+                            [(hash_, record[0]) for hash_, record in zip(hashes, records)],
+                        )
+                        await db.commit()
+                        result += len(records)
+                        if progress:
+                            progress(result)
+                        await asyncio.sleep(0)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error migrating resource data: {error}")
+        return result
+
+    async def collect_blobs(self, grace_period: float = 3600.0) -> int:
+        # Deletes the blobs no longer referred to by any occurrence. Files younger than the grace period are left
+        # alone as they may belong to a write that has not been committed yet. Returns the number of blobs deleted.
+        if self.blob_store is None:
+            return 0
+        blob_store = self.blob_store
+        # Blobs may be shared by occurrences in different shards
+        shards = self._get_shards()
+        referenced: set[str] = set()
+        result = 0
+        try:
+            for shard in shards:
+                async with (
+                    self._connect_shard(shard) as db,
+                    db.execute("SELECT hash FROM blob WHERE reference_count > 0") as cursor,
+                ):
+                    referenced.update([record[0] async for record in cursor])
+            candidates = [
+                hash_ for hash_ in await asyncio.to_thread(blob_store.hashes, grace_period) if hash_ not in referenced
+            ]
+            for index in range(0, len(candidates), MAX_BIND_VARIABLES):
+                result += await self._collect_blob_chunk(
+                    shards, candidates[index : index + MAX_BIND_VARIABLES], grace_period
+                )
+            for shard in shards:
+                async with self._connect_shard(shard) as db:
+                    await db.execute("DELETE FROM blob WHERE reference_count <= 0")
+                    await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error collecting blobs: {error}")
         return result
 
+    async def _collect_blob_chunk(self, shards: list[int | None], hashes: list[str], grace_period: float) -> int:
+        # Writers may have referred to the candidates since they were listed. Their reference counts are checked
+        # again, and the blobs deleted, while every shard is locked for writing, so no new reference is committed in
+        # between; a write that has stored a blob but not committed yet is caught by the blob's age, checked again
+        # by 'BlobStore.collect'.
+        blob_store = self.blob_store
+        async with AsyncExitStack() as stack:
+            connections = [await stack.enter_async_context(self._connect_shard(shard)) for shard in shards]
+            for db in connections:
+                await db.execute("BEGIN IMMEDIATE")
+            referenced: set[str] = set()
+            for db in connections:
+                async with db.execute(
+                    f"""SELECT hash FROM blob WHERE reference_count > 0
+                    AND hash IN ({", ".join("?" * len(hashes))})""",
+                    hashes,
+                ) as cursor:
+                    referenced.update([record[0] async for record in cursor])
+            unreferenced = [hash_ for hash_ in hashes if hash_ not in referenced]
+            collected = await asyncio.to_thread(
+                lambda: [blob_store.collect(hash_, grace_period) for hash_ in unreferenced]  # type: ignore
+            )
+            for db in connections:
+                await db.commit()
+        return sum(collected)
+
     # endregion
 
     # region Attribute
-    async def attribute_exists(
-        self, map_identifier: int, entity_identifier: str, name: str
-    ) -> bool:
-        result = False
-        # TODO: Implement
-        return result
+    async def attribute_exists(self, map_identifier: int, entity_identifier: str, name: str) -> bool:
+        return bool(await self._existing(map_identifier, "attribute", [self._existence_key((entity_identifier, name))]))
+
+    async def attributes_exist(self, map_identifier: int, keys: list[tuple[str, str]]) -> set[tuple[str, str]]:
+        # The given (entity identifier, name) pairs that exist
+        existing = await self._existing(map_identifier, "attribute", [self._existence_key(key) for key in keys])
+        return {key for key in keys if self._existence_key(key) in existing}
 
-    async def get_attribute(
-        self, map_identifier: int, identifier: str
-    ) -> Attribute | None:
+    async def set_attribute(
+        self, map_identifier: int, attribute: Attribute, ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, attributes=[attribute], ontology_mode=ontology_mode)
+
+    async def set_attributes(
+        self, map_identifier: int, attributes: list[Attribute], ontology_mode: OntologyMode = OntologyMode.LENIENT
+    ) -> None:
+        await self._set_entities(map_identifier, attributes=attributes, ontology_mode=ontology_mode)
+
+    async def get_attribute(self, map_identifier: int, identifier: str) -> Attribute | None:
         result = None
         try:
             # Context managers automatically close the connection and the cursor
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(
                     "SELECT * FROM attribute WHERE map_identifier = ? AND identifier = ?",
@@ -529,6 +1573,7 @@ class TopicStore:
             raise TopicDbError(f"Error fetching attribute: {error}")
         return result
 
+    @coalesced
     async def get_attributes(
         self,
         map_identifier: int,
@@ -536,77 +1581,628 @@ class TopicStore:
         scope: str | None = None,
         language: Language | None = None,
     ) -> list[Attribute]:
-        result: list[Attribute] = []
-        if scope:
-            if language:
-                sql = """SELECT * FROM attribute
-                    WHERE map_identifier = ? AND
-                    entity_identifier = ? AND
-                    scope = ? AND
-                    language = ?"""
-                bind_variables = (
-                    map_identifier,
-                    entity_identifier,
-                    scope,
-                    language.name.lower(),
-                )
-            else:
-                sql = """SELECT * FROM attribute
-                    WHERE map_identifier = ? AND
-                    entity_identifier = ? AND
-                    scope = ?"""
-                bind_variables = (map_identifier, entity_identifier, scope)  # type: ignore
-        else:
-            if language:
-                sql = """SELECT * FROM attribute
-                    WHERE map_identifier = ? AND
-                    entity_identifier = ? AND
-                    language = ?"""
-                bind_variables = (
-                    map_identifier,
-                    entity_identifier,
-                    language.name.lower(),
-                )  # type: ignore
-            else:
-                sql = """SELECT * FROM attribute
-                    WHERE map_identifier = ? AND
-                    entity_identifier = ?"""
-                bind_variables = (map_identifier, entity_identifier)  # type: ignore
+        records = await self._attribute_loader.get(
+            (map_identifier, scope or None, language.name.lower() if language else None), entity_identifier
+        )
+        return [
+            Attribute(
+                record["name"],
+                record["value"],
+                record["entity_identifier"],
+                record["identifier"],
+                DataType[record["data_type"].upper()],
+                record["scope"],
+                Language[record["language"].upper()],
+            )
+            for record in records or ()
+        ]
 
+    async def _load_attribute_records(
+        self, group: tuple[int, str | None, str | None], entity_identifiers: list[str]
+    ) -> dict[str, tuple[aiosqlite.Row, ...]]:
+        # Entity identifier -> attribute records, for a (map identifier, scope, language) group
+        map_identifier, scope, language = group
+        query_filter = ""
+        bind_variables: tuple = (map_identifier, *entity_identifiers)
+        if scope:
+            query_filter += " AND scope = ?"
+            bind_variables += (scope,)
+        if language:
+            query_filter += " AND language = ?"
+            bind_variables += (language,)
+        result: dict[str, list[aiosqlite.Row]] = {}
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
-                async with db.execute(sql, bind_variables) as cursor:
+                async with db.execute(
+                    f"""SELECT * FROM attribute
+                    WHERE map_identifier = ? AND
+                    entity_identifier IN ({", ".join("?" * len(entity_identifiers))}){query_filter}""",
+                    bind_variables,
+                ) as cursor:
                     async for record in cursor:
-                        attribute = Attribute(
-                            record["name"],
-                            record["value"],
-                            record["entity_identifier"],
-                            record["identifier"],
-                            DataType[record["data_type"].upper()],
-                            record["scope"],
-                            Language[record["language"].upper()],
-                        )
-                        result.append(attribute)
+                        result.setdefault(record["entity_identifier"], []).append(record)
         except aiosqlite.Error as error:
             raise TopicDbError(f"Error fetching attributes: {error}")
-        return result
+        return {entity_identifier: tuple(records) for entity_identifier, records in result.items()}
 
-    # endregion
+    @staticmethod
+    def _to_typed_value(value: str | float | bool, data_type: DataType) -> str | float | int:
+        # Mirrors the 'typed_value' generated column (timestamps are converted by SQLite's 'julianday' function)
+        match data_type:
+            case DataType.NUMBER:
+                try:
+                    return float(value)
+                except (TypeError, ValueError):
+                    raise TopicDbError(f"Invalid number: {value}")
+            case DataType.BOOLEAN:
+                return 1 if str(value).lower() in ("true", "1", "yes") else 0
+            case _:
+                return str(value)
 
-    # region Tag
-    async def get_tags(self, map_identifier: int, identifier: str) -> list[str]:
-        result: list[str] = []
+    @staticmethod
+    def _get_prefix_upper_bound(prefix: str) -> str | None:
+        # The least string greater than every string starting with the prefix (strings compare by code point), or
+        # None if there is none. Surrogates can't be stored, so the bound skips over them.
+        prefix = prefix.rstrip(chr(sys.maxunicode))
+        if prefix == "":
+            return None
+        code_point = ord(prefix[-1]) + 1
+        if 0xD800 <= code_point <= 0xDFFF:
+            code_point = 0xE000
+        return prefix[:-1] + chr(code_point)
 
-        associations = await self.get_topic_associations(map_identifier, identifier)
-        if associations:
-            groups = await self.get_association_groups(
-                map_identifier, identifier, associations=associations
-            )
-            for instance_of in groups.dict:
-                for role in groups.dict[instance_of]:
-                    for topic_ref in groups[instance_of, role]:
-                        if topic_ref == identifier:
+    def _get_attribute_query(
+        self,
+        map_identifier: int,
+        name: str,
+        operator: AttributeOperator,
+        value: str | float | bool | tuple | list,
+        data_type: DataType,
+        scope: str | None,
+        language: Language | None,
+    ) -> tuple[str, list]:
+        # SQL (and its bind variables) selecting the distinct identifiers of the entities having an attribute that
+        # satisfies the predicate, ordered by attribute value. An entity is listed at its least matching value: its
+        # other matching attributes (in other scopes or languages) are ruled out with an index lookup each.
+        placeholder = "julianday(?)" if data_type is DataType.TIMESTAMP else "?"
+        match operator:
+            case AttributeOperator.EQUAL:
+                condition = f"{{0}}.typed_value = {placeholder}"
+                values = [value]
+            case AttributeOperator.LESS_THAN:
+                condition = f"{{0}}.typed_value < {placeholder}"
+                values = [value]
+            case AttributeOperator.LESS_THAN_OR_EQUAL:
+                condition = f"{{0}}.typed_value <= {placeholder}"
+                values = [value]
+            case AttributeOperator.GREATER_THAN:
+                condition = f"{{0}}.typed_value > {placeholder}"
+                values = [value]
+            case AttributeOperator.GREATER_THAN_OR_EQUAL:
+                condition = f"{{0}}.typed_value >= {placeholder}"
+                values = [value]
+            case AttributeOperator.BETWEEN:
+                if not isinstance(value, (tuple, list)) or len(value) != 2:
+                    raise TopicDbError("The BETWEEN operator requires a (low, high) value")
+                condition = f"{{0}}.typed_value BETWEEN {placeholder} AND {placeholder}"
+                values = list(value)
+            case AttributeOperator.PREFIX:
+                if data_type is not DataType.STRING:
+                    raise TopicDbError("The PREFIX operator only applies to string attributes")
+                # Expressed as a range so that the index is used (LIKE and GLOB are not index-friendly here). An empty
+                # prefix matches every value.
+                prefix = str(value)
+                upper_bound = self._get_prefix_upper_bound(prefix)
+                if upper_bound is None:
+                    condition = "{0}.typed_value >= ?"
+                    values = [prefix]
+                else:
+                    condition = "{0}.typed_value >= ? AND {0}.typed_value < ?"
+                    values = [prefix, upper_bound]
+            case AttributeOperator.IN:
+                if not isinstance(value, (tuple, list, set)) or not value:
+                    raise TopicDbError("The IN operator requires a non-empty collection of values")
+                condition = f"{{0}}.typed_value IN ({', '.join([placeholder] * len(value))})"
+                values = list(value)
+        if data_type is DataType.TIMESTAMP:
+            typed_values = [str(item) for item in values]
+        else:
+            typed_values = [self._to_typed_value(item, data_type) for item in values]
+        query_filter = ""
+        filter_bind_variables: list = []
+        if scope:
+            query_filter += " AND {0}.scope = ?"
+            filter_bind_variables.append(scope)
+        if language:
+            query_filter += " AND {0}.language = ?"
+            filter_bind_variables.append(language.name.lower())
+
+        sql = f"""SELECT attribute.entity_identifier FROM attribute
+            WHERE attribute.map_identifier = ? AND attribute.name = ? AND attribute.data_type = ?
+            AND {condition.format("attribute")}{query_filter.format("attribute")}
+            AND NOT EXISTS (
+                SELECT 1 FROM attribute AS earlier
+                WHERE earlier.map_identifier = attribute.map_identifier
+                AND earlier.entity_identifier = attribute.entity_identifier
+                -- The unary '+' keeps the typed value index from being used here: the primary key finds the
+                -- entity's other attributes directly
+                AND earlier.name = attribute.name AND +earlier.data_type = attribute.data_type
+                AND (earlier.typed_value, earlier.scope, earlier.language)
+                    < (attribute.typed_value, attribute.scope, attribute.language)
+                AND {condition.format("earlier")}{query_filter.format("earlier")}
+            )
+            ORDER BY attribute.typed_value, attribute.entity_identifier"""
+        bind_variables = [
+            map_identifier,
+            name,
+            str(data_type).lower(),
+            *typed_values,
+            *filter_bind_variables,
+            *typed_values,
+            *filter_bind_variables,
+        ]
+        return sql, bind_variables
+
+    async def iterate_attribute_entity_identifiers(
+        self,
+        map_identifier: int,
+        name: str,
+        operator: AttributeOperator,
+        value: str | float | bool | tuple | list,
+        data_type: DataType = DataType.STRING,
+        scope: str | None = None,
+        language: Language | None = None,
+    ) -> AsyncIterator[str]:
+        # Streams the (distinct) identifiers of the entities having an attribute satisfying the predicate, ordered by
+        # attribute value. The 'value' parameter is a (low, high) tuple for BETWEEN and a list of values for IN.
+        sql, bind_variables = self._get_attribute_query(
+            map_identifier, name, operator, value, data_type, scope, language
+        )
+        try:
+            async with self._connect(map_identifier) as db, db.execute(sql, bind_variables) as cursor:
+                async for record in cursor:
+                    yield record[0]
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching attribute entity identifiers: {error}")
+
+    async def get_attribute_entity_identifiers(
+        self,
+        map_identifier: int,
+        name: str,
+        operator: AttributeOperator,
+        value: str | float | bool | tuple | list,
+        data_type: DataType = DataType.STRING,
+        scope: str | None = None,
+        language: Language | None = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> list[str]:
+        # A page of 'iterate_attribute_entity_identifiers'
+        sql, bind_variables = self._get_attribute_query(
+            map_identifier, name, operator, value, data_type, scope, language
+        )
+        try:
+            async with (
+                self._connect(map_identifier) as db,
+                db.execute(f"{sql} LIMIT ? OFFSET ?", (*bind_variables, limit, offset)) as cursor,
+            ):
+                return [record[0] async for record in cursor]
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching attribute entity identifiers: {error}")
+
+    # endregion
+
+    # region Temporal
+    @staticmethod
+    def _to_day_number(value: str) -> int:
+        try:
+            return date.fromisoformat(value).toordinal()
+        except ValueError:
+            raise TopicDbError(f"Invalid date: {value}")
+
+    @staticmethod
+    def _to_temporal(record: aiosqlite.Row) -> Temporal:
+        result = Temporal(
+            record["identifier"],
+            TemporalType[record["type"].upper()],
+            description=record["description"],
+            topic_identifier=record["topic_identifier"],
+        )
+        result.media_url = record["media_url"]
+        result.start_date = record["start_date"]
+        if record["end_date"]:
+            result.end_date = record["end_date"]
+        return result
+
+    async def set_temporal(self, map_identifier: int, temporal: Temporal) -> None:
+        if temporal.topic_identifier == "":
+            raise TopicDbError("Temporal is not attached to a topic")
+        if temporal.start_date == "":
+            raise TopicDbError("Temporal has no start date")
+        start_day = self._to_day_number(temporal.start_date)
+        end_day = self._to_day_number(temporal.end_date) if temporal.end_date else start_day
+        try:
+            async with self._connect(map_identifier) as db:
+                await db.execute(
+                    """INSERT INTO temporal (map_identifier, identifier, topic_identifier, type, description, media_url,
+                    start_date, end_date, start_day, end_day)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (map_identifier, identifier) DO UPDATE SET
+                    topic_identifier = excluded.topic_identifier,
+                    type = excluded.type,
+                    description = excluded.description,
+                    media_url = excluded.media_url,
+                    start_date = excluded.start_date,
+                    end_date = excluded.end_date,
+                    start_day = excluded.start_day,
+                    end_day = excluded.end_day""",
+                    (
+                        map_identifier,
+                        temporal.identifier,
+                        temporal.topic_identifier,
+                        str(temporal.type_),
+                        temporal.description,
+                        temporal.media_url,
+                        temporal.start_date,
+                        temporal.end_date,
+                        start_day,
+                        end_day,
+                    ),
+                )
+                await self._bump_map_version(db, map_identifier)
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error setting temporal: {error}")
+
+    async def delete_temporal(self, map_identifier: int, identifier: str) -> None:
+        try:
+            async with self._connect(map_identifier) as db:
+                async with db.execute(
+                    "DELETE FROM temporal WHERE map_identifier = ? AND identifier = ?",
+                    (map_identifier, identifier),
+                ) as cursor:
+                    deleted = cursor.rowcount > 0
+                if deleted:
+                    await self._bump_map_version(db, map_identifier)
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error deleting temporal: {error}")
+
+    async def get_temporal(self, map_identifier: int, identifier: str) -> Temporal | None:
+        result = None
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute(
+                    "SELECT * FROM temporal WHERE map_identifier = ? AND identifier = ?",
+                    (map_identifier, identifier),
+                ) as cursor:
+                    async for record in cursor:
+                        result = self._to_temporal(record)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching temporal: {error}")
+        return result
+
+    async def get_topic_temporals(self, map_identifier: int, identifier: str) -> list[Temporal]:
+        result: list[Temporal] = []
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute(
+                    "SELECT * FROM temporal WHERE map_identifier = ? AND topic_identifier = ? ORDER BY start_day",
+                    (map_identifier, identifier),
+                ) as cursor:
+                    async for record in cursor:
+                        result.append(self._to_temporal(record))
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching temporals: {error}")
+        return result
+
+    async def get_temporals(
+        self,
+        map_identifier: int,
+        start_date: str,
+        end_date: str,
+        type_: TemporalType | None = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> list[Temporal]:
+        # All events and eras overlapping the [start_date, end_date] interval, resolved through the R*Tree
+        result: list[Temporal] = []
+
+        start_day = self._to_day_number(start_date)
+        end_day = self._to_day_number(end_date)
+        if end_day < start_day:
+            raise TopicDbError("End date cannot be earlier than the start date")
+        sql = """SELECT temporal.* FROM temporal_index
+            INNER JOIN temporal ON temporal.rowid = temporal_index.id
+            WHERE temporal_index.min_map_identifier <= ? AND temporal_index.max_map_identifier >= ?
+            AND temporal_index.start_day <= ? AND temporal_index.end_day >= ?
+            AND temporal.map_identifier = ? {0}
+            ORDER BY temporal.start_day, temporal.identifier
+            LIMIT ? OFFSET ?"""
+        query_filter = ""
+        bind_variables: list = [map_identifier, map_identifier, end_day, start_day, map_identifier]
+        if type_:
+            query_filter = "AND temporal.type = ?"
+            bind_variables.append(str(type_))
+        bind_variables.extend((limit, offset))
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute(sql.format(query_filter), bind_variables) as cursor:
+                    async for record in cursor:
+                        result.append(self._to_temporal(record))
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching temporals: {error}")
+        return result
+
+    async def get_timeline(
+        self,
+        map_identifier: int,
+        date_: str,
+        before: int = 10,
+        after: int = 10,
+    ) -> list[Temporal]:
+        # The 'before' temporals starting prior to the date and the 'after' temporals starting on or after it, both
+        # resolved as range scans over the (map_identifier, start_day) index
+        day = self._to_day_number(date_)
+        previous: list[Temporal] = []
+        following: list[Temporal] = []
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute(
+                    """SELECT * FROM temporal WHERE map_identifier = ? AND start_day < ?
+                    ORDER BY start_day DESC LIMIT ?""",
+                    (map_identifier, day, before),
+                ) as cursor:
+                    async for record in cursor:
+                        previous.append(self._to_temporal(record))
+                async with db.execute(
+                    """SELECT * FROM temporal WHERE map_identifier = ? AND start_day >= ?
+                    ORDER BY start_day LIMIT ?""",
+                    (map_identifier, day, after),
+                ) as cursor:
+                    async for record in cursor:
+                        following.append(self._to_temporal(record))
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching timeline: {error}")
+        return [*reversed(previous), *following]
+
+    # endregion
+
+    # region Location
+    @staticmethod
+    def _to_location(record: aiosqlite.Row) -> Location:
+        result = Location(
+            record["identifier"],
+            description=record["description"],
+            topic_identifier=record["topic_identifier"],
+        )
+        result.set_position(record["latitude"], record["longitude"])
+        return result
+
+    @staticmethod
+    def _distance(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+        # Haversine great-circle distance in kilometres
+        phi1 = math.radians(latitude1)
+        phi2 = math.radians(latitude2)
+        delta_phi = phi2 - phi1
+        delta_lambda = math.radians(longitude2 - longitude1)
+        a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+        return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+    async def set_location(self, map_identifier: int, location: Location) -> None:
+        if location.topic_identifier == "":
+            raise TopicDbError("Location is not attached to a topic")
+        if location.latitude is None or location.longitude is None:
+            raise TopicDbError("Location has no coordinates")
+        try:
+            async with self._connect(map_identifier) as db:
+                await db.execute(
+                    """INSERT INTO location (map_identifier, identifier, topic_identifier, description, latitude, longitude)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (map_identifier, identifier) DO UPDATE SET
+                    topic_identifier = excluded.topic_identifier,
+                    description = excluded.description,
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude""",
+                    (
+                        map_identifier,
+                        location.identifier,
+                        location.topic_identifier,
+                        location.description,
+                        location.latitude,
+                        location.longitude,
+                    ),
+                )
+                await self._bump_map_version(db, map_identifier)
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error setting location: {error}")
+
+    async def delete_location(self, map_identifier: int, identifier: str) -> None:
+        try:
+            async with self._connect(map_identifier) as db:
+                async with db.execute(
+                    "DELETE FROM location WHERE map_identifier = ? AND identifier = ?",
+                    (map_identifier, identifier),
+                ) as cursor:
+                    deleted = cursor.rowcount > 0
+                if deleted:
+                    await self._bump_map_version(db, map_identifier)
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error deleting location: {error}")
+
+    async def get_location(self, map_identifier: int, identifier: str) -> Location | None:
+        result = None
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute(
+                    "SELECT * FROM location WHERE map_identifier = ? AND identifier = ?",
+                    (map_identifier, identifier),
+                ) as cursor:
+                    async for record in cursor:
+                        result = self._to_location(record)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching location: {error}")
+        return result
+
+    async def get_topic_locations(self, map_identifier: int, identifier: str) -> list[Location]:
+        result: list[Location] = []
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                async with db.execute(
+                    "SELECT * FROM location WHERE map_identifier = ? AND topic_identifier = ?",
+                    (map_identifier, identifier),
+                ) as cursor:
+                    async for record in cursor:
+                        result.append(self._to_location(record))
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching locations: {error}")
+        return result
+
+    async def get_locations(
+        self,
+        map_identifier: int,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+        limit: int = 1000,
+    ) -> list[Location]:
+        # Bounding box query. A box whose minimum longitude is greater than its maximum longitude crosses the
+        # antimeridian and is split in two.
+        if min_longitude > max_longitude:
+            boxes = [(min_longitude, 180.0), (-180.0, max_longitude)]
+        else:
+            boxes = [(min_longitude, max_longitude)]
+        result: list[Location] = []
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                for box_min_longitude, box_max_longitude in boxes:
+                    async with db.execute(
+                        """SELECT location.* FROM location_index
+                        INNER JOIN location ON location.rowid = location_index.id
+                        WHERE location_index.min_map_identifier <= ? AND location_index.max_map_identifier >= ?
+                        AND location_index.max_latitude >= ? AND location_index.min_latitude <= ?
+                        AND location_index.max_longitude >= ? AND location_index.min_longitude <= ?
+                        AND location.map_identifier = ?
+                        AND location.latitude BETWEEN ? AND ?
+                        AND location.longitude BETWEEN ? AND ?
+                        LIMIT ?""",
+                        (
+                            map_identifier,
+                            map_identifier,
+                            min_latitude,
+                            max_latitude,
+                            box_min_longitude,
+                            box_max_longitude,
+                            map_identifier,
+                            min_latitude,
+                            max_latitude,
+                            box_min_longitude,
+                            box_max_longitude,
+                            limit - len(result) if limit >= 0 else -1,  # A negative limit means no limit
+                        ),
+                    ) as cursor:
+                        async for record in cursor:
+                            result.append(self._to_location(record))
+                    if 0 <= limit <= len(result):
+                        break
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching locations: {error}")
+        return result
+
+    @staticmethod
+    def _get_search_box(latitude: float, longitude: float, radius: float) -> tuple[float, float, float, float]:
+        # (min latitude, min longitude, max latitude, max longitude) of a box holding the circle of the given radius
+        # (in kilometres) around the point; the box crosses the antimeridian if its minimum longitude is the greater
+        delta_latitude = math.degrees(radius / EARTH_RADIUS)
+        min_latitude = max(-90.0, latitude - delta_latitude)
+        max_latitude = min(90.0, latitude + delta_latitude)
+        cos_latitude = min(math.cos(math.radians(min_latitude)), math.cos(math.radians(max_latitude)))
+        if min_latitude == -90.0 or max_latitude == 90.0 or cos_latitude <= 0.0:
+            return min_latitude, -180.0, max_latitude, 180.0
+        delta_longitude = min(180.0, delta_latitude / cos_latitude)
+        if delta_longitude >= 180.0:
+            return min_latitude, -180.0, max_latitude, 180.0
+        min_longitude = longitude - delta_longitude
+        max_longitude = longitude + delta_longitude
+        if min_longitude < -180.0:
+            min_longitude += 360.0
+        if max_longitude > 180.0:
+            max_longitude -= 360.0
+        return min_latitude, min_longitude, max_latitude, max_longitude
+
+    async def get_nearest_locations(
+        self,
+        map_identifier: int,
+        latitude: float,
+        longitude: float,
+        limit: int = 10,
+        radius: float | None = None,
+    ) -> list[tuple[Location, float]]:
+        # Nearest locations (and their distance in kilometres) ordered by distance. Without a radius, the search box
+        # grows geometrically until it holds enough candidates; each step is a single R*Tree lookup. A step loads at
+        # most MAX_NEAREST_CANDIDATES candidates: a box holding more is shrunk again, by bisection. Once that is down
+        # to a metre (the box's corners hold more candidates than that), boxes are loaded whole so that the result
+        # stays exact.
+        max_candidates = max(MAX_NEAREST_CANDIDATES, limit)
+        search_radius = radius if radius is not None else 1.0
+        max_radius = radius if radius is not None else math.pi * EARTH_RADIUS
+        lower_radius = 0.0  # Largest radius known to hold too few locations
+        upper_radius: float | None = None  # Smallest radius known to hold too many candidates
+        capped = True
+        while True:
+            candidates = await self.get_locations(
+                map_identifier,
+                *self._get_search_box(latitude, longitude, search_radius),
+                limit=max_candidates + 1 if capped else -1,
+            )
+            if capped and len(candidates) > max_candidates:
+                upper_radius = search_radius
+                if search_radius - lower_radius > 0.001:
+                    search_radius = (lower_radius + search_radius) / 2
+                else:
+                    capped = False
+                continue
+            result = sorted(
+                (
+                    (location, self._distance(latitude, longitude, location.latitude, location.longitude))  # type: ignore
+                    for location in candidates
+                ),
+                key=lambda item: item[1],
+            )
+            # Only candidates inside the search circle are guaranteed to be nearer than anything outside the box
+            result = [item for item in result if item[1] <= search_radius]
+            if len(result) >= limit or search_radius >= max_radius:
+                return result[:limit]
+            lower_radius = search_radius
+            if upper_radius is None or not capped:
+                search_radius = min(search_radius * 4, max_radius)
+            else:
+                search_radius = (search_radius + upper_radius) / 2
+
+    # endregion
+
+    # region Tag
+    async def get_tags(self, map_identifier: int, identifier: str) -> list[str]:
+        result: list[str] = []
+
+        associations = await self.get_topic_associations(map_identifier, identifier)
+        if associations:
+            groups = await self.get_association_groups(map_identifier, identifier, associations=associations)
+            for instance_of in groups.dict:
+                for role in groups.dict[instance_of]:
+                    for topic_ref in groups[instance_of, role]:
+                        if topic_ref == identifier:
                             continue
                         if instance_of == "categorization":
                             result.append(topic_ref)
@@ -615,9 +2211,7 @@ class TopicStore:
     # endregion
 
     # region Topic Map
-    async def get_map(
-        self, map_identifier: int, user_identifier: int | None = None
-    ) -> Map | None:
+    async def get_map(self, map_identifier: int, user_identifier: int | None = None) -> Map | None:
         result = None
         if user_identifier:
             sql = """SELECT
@@ -635,26 +2229,21 @@ class TopicStore:
                 INNER JOIN user_map ON map.identifier = user_map.map_identifier
                 WHERE user_map.user_identifier = ?
                 AND map.identifier = ?
+                AND map.deleted = 0
                 ORDER BY map_identifier"""
             bind_variables = (user_identifier, map_identifier)
         else:
-            sql = "SELECT * FROM map WHERE identifier = ?"
+            sql = "SELECT * FROM map WHERE identifier = ? AND deleted = 0"
             bind_variables = (map_identifier,)  # type: ignore
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect() as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(sql, bind_variables) as cursor:
                     async for record in cursor:
                         result = Map(
-                            (
-                                record["map_identifier"]
-                                if user_identifier
-                                else record["identifier"]
-                            ),
+                            (record["map_identifier"] if user_identifier else record["identifier"]),
                             record["name"],
-                            user_identifier=(
-                                record["user_identifier"] if user_identifier else None
-                            ),
+                            user_identifier=(record["user_identifier"] if user_identifier else None),
                             description=record["description"],
                             image_path=record["image_path"],
                             initialised=record["initialised"],
@@ -662,9 +2251,7 @@ class TopicStore:
                             promoted=record["promoted"],
                             owner=record["owner"] if user_identifier else None,
                             collaboration_mode=(
-                                CollaborationMode[record["collaboration_mode"].upper()]
-                                if user_identifier
-                                else None
+                                CollaborationMode[record["collaboration_mode"].upper()] if user_identifier else None
                             ),
                         )
         except aiosqlite.Error as error:
@@ -693,9 +2280,10 @@ class TopicStore:
             FROM map
             INNER JOIN user_map ON map.identifier = user_map.map_identifier
             WHERE user_map.user_identifier = ?
+            AND map.deleted = 0
             ORDER BY map_identifier"""
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect() as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(
                     sql,
@@ -712,48 +2300,575 @@ class TopicStore:
                             published=record["published"],
                             promoted=record["promoted"],
                             owner=record["owner"],
-                            collaboration_mode=CollaborationMode[
-                                record["collaboration_mode"].upper()
-                            ],
+                            collaboration_mode=CollaborationMode[record["collaboration_mode"].upper()],
                         )
                         result.append(map)
         except aiosqlite.Error as error:
             raise TopicDbError(f"Error fetching map: {error}")
         return result
 
-    async def is_map_owner(self, map_identifier: int, user_identifier: int) -> bool:
-        result = False
+    async def create_map(
+        self,
+        user_identifier: int,
+        name: str,
+        description: str = "",
+        image_path: str = "",
+        initialised: bool = False,
+        published: bool = False,
+        promoted: bool = False,
+    ) -> int:
         try:
-            async with aiosqlite.connect(self.database_path) as db:
-                db.row_factory = aiosqlite.Row
+            async with self._connect() as db:
                 async with db.execute(
-                    "SELECT * FROM user_map WHERE user_identifier = ? AND map_identifier = ? AND owner = 1",
-                    (user_identifier, map_identifier),
-                ) as cursor:  # 1 = True
-                    async for record in cursor:
-                        result = True
+                    """INSERT INTO map (name, description, image_path, initialised, published, promoted)
+                    VALUES (?, ?, ?, ?, ?, ?)""",
+                    (name, description, image_path, initialised, published, promoted),
+                ) as cursor:
+                    result = cursor.lastrowid
+                await db.execute(
+                    """INSERT INTO user_map (user_identifier, map_identifier, owner, collaboration_mode)
+                    VALUES (?, ?, 1, ?)""",
+                    (user_identifier, result, CollaborationMode.EDIT.name.lower()),
+                )
+                await db.commit()
         except aiosqlite.Error as error:
-            raise TopicDbError(f"Error fetching map: {error}")
+            raise TopicDbError(f"Error creating map: {error}")
+        self.permission_cache.invalidate(result, user_identifier)  # type: ignore
+        return result  # type: ignore
+
+    async def initialise_map(self, map_identifier: int) -> bool:
+        # Creates the base topics (with their base names) in the map from the prebuilt template and marks the map as
+        # initialised, in one transaction. Returns False if the map had been initialised already.
+        existence_filters = self._existence_filters.get(map_identifier)
+        content_index = self._content_indexes.get(map_identifier)
+        shard = self._get_shard(map_identifier)
+        try:
+            async with self._connect_shard(shard) as db, self._attach(db, shard, None, "catalog") as catalog_schema:
+                await db.execute("BEGIN IMMEDIATE")
+                try:
+                    async with db.execute(
+                        f"SELECT initialised FROM {catalog_schema}.map WHERE identifier = ? AND deleted = 0",
+                        (map_identifier,),
+                    ) as cursor:
+                        record = await cursor.fetchone()
+                    if record is None:
+                        raise TopicDbError(f"Map {map_identifier} does not exist")
+                    if record[0]:
+                        await db.rollback()
+                        return False
+                    previous_version = await self._get_map_version(db, map_identifier)
+                    await db.execute(
+                        """INSERT INTO topic (map_identifier, identifier, instance_of, scope)
+                        SELECT ?, identifier, instance_of, NULL FROM base_topic_template WHERE TRUE
+                        ON CONFLICT (map_identifier, identifier) DO NOTHING""",
+                        (map_identifier,),
+                    )
+                    # Base topics the map has already (with their own names) are left as they are
+                    await db.execute(
+                        """INSERT INTO basename (map_identifier, identifier, name, topic_identifier, scope, language)
+                        SELECT ?, base_name_identifier, name, identifier, scope, language FROM base_topic_template
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM basename WHERE basename.map_identifier = ?
+                            AND basename.topic_identifier = base_topic_template.identifier
+                        )
+                        ON CONFLICT (map_identifier, identifier) DO NOTHING""",
+                        (map_identifier, map_identifier),
+                    )
+                    await db.execute(
+                        f"UPDATE {catalog_schema}.map SET initialised = 1 WHERE identifier = ?", (map_identifier,)
+                    )
+                    version = await self._bump_map_version(db, map_identifier)
+                    await db.commit()
+                except BaseException:
+                    await db.rollback()
+                    raise
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error initialising map: {error}")
+        self.single_flight.forget(map_identifier)
+        self.ontology_registry.invalidate(map_identifier)
+        if existence_filters is not None:
+            self._update_existence_filters(
+                map_identifier,
+                {"topic": [row[0] for row in self._get_base_topic_template()]},
+                previous_version,
+                version,
+            )
+        if content_index is not None:
+            await self._update_content_index(map_identifier, set(), previous_version, version)
+        return True
+
+    async def _copy_map_table(
+        self,
+        db: aiosqlite.Connection,
+        table: str,
+        source_map_identifier: int,
+        target_map_identifier: int,
+        include_resource_data: bool,
+        chunk_size: int,
+        progress: Callable[[str, int], None] | None,
+        source_schema: str = "main",
+    ) -> None:
+        columns = MAP_TABLES[table]
+        selected_columns = [
+            "NULL" if column in RESOURCE_DATA_COLUMNS and not include_resource_data else column for column in columns
+        ]
+        sql = f"""INSERT INTO {table} (map_identifier, {", ".join(columns)})
+            SELECT ?, {", ".join(selected_columns)} FROM {source_schema}.{table}
+            WHERE map_identifier = ? AND identifier > ? {{0}}"""
+        lower_bound = ""
+        copied = 0
+        while True:
+            # The chunk's upper bound is found with an index-only lookup; the rows are then copied without ever being
+            # materialised in Python
+            async with db.execute(
+                f"""SELECT identifier FROM {source_schema}.{table} WHERE map_identifier = ? AND identifier > ?
+                ORDER BY identifier LIMIT 1 OFFSET ?""",
+                (source_map_identifier, lower_bound, chunk_size - 1),
+            ) as cursor:
+                record = await cursor.fetchone()
+            if record:
+                async with db.execute(
+                    sql.format("AND identifier <= ?"),
+                    (target_map_identifier, source_map_identifier, lower_bound, record[0]),
+                ) as cursor:
+                    copied += cursor.rowcount
+            else:
+                async with db.execute(
+                    sql.format(""), (target_map_identifier, source_map_identifier, lower_bound)
+                ) as cursor:
+                    copied += cursor.rowcount
+            await db.commit()  # Each chunk is a transaction of its own so the write lock is released in between
+            if progress:
+                progress(table, copied)
+            if not record:
+                break
+            lower_bound = record[0]
+            await asyncio.sleep(0)
+
+    @staticmethod
+    async def _copy_compact_members(
+        db: aiosqlite.Connection,
+        source_map_identifier: int,
+        target_map_identifier: int,
+        progress: Callable[[str, int], None] | None,
+        source_schema: str = "main",
+    ) -> None:
+        # Compact member rows are a handful of integers; they are copied in one statement, with their keys translated
+        # to the keys of the same identifiers in the target map
+        await db.execute(
+            f"""INSERT OR IGNORE INTO main.topic_key (map_identifier, identifier)
+            SELECT ?, identifier FROM {source_schema}.topic_key WHERE map_identifier = ?""",
+            (target_map_identifier, source_map_identifier),
+        )
+        await db.execute(
+            """CREATE TEMP TABLE IF NOT EXISTS topic_key_map (
+                source_key INTEGER PRIMARY KEY, target_key INTEGER NOT NULL
+            )"""
+        )
+        await db.execute(
+            f"""INSERT INTO topic_key_map (source_key, target_key)
+            SELECT source.key, target.key FROM {source_schema}.topic_key AS source
+            JOIN main.topic_key AS target ON target.map_identifier = ? AND target.identifier = source.identifier
+            WHERE source.map_identifier = ?""",
+            (target_map_identifier, source_map_identifier),
+        )
+        async with db.execute(
+            f"""INSERT INTO main.member_compact (
+                member_key, association_key, src_topic_key, src_role_key, dest_topic_key, dest_role_key
+            )
+            SELECT member_.target_key, association.target_key, src_topic.target_key, src_role.target_key,
+                dest_topic.target_key, dest_role.target_key
+            FROM {source_schema}.topic_key AS source
+            JOIN {source_schema}.member_compact AS member_compact ON member_compact.association_key = source.key
+            JOIN topic_key_map AS member_ ON member_.source_key = member_compact.member_key
+            JOIN topic_key_map AS association ON association.source_key = member_compact.association_key
+            JOIN topic_key_map AS src_topic ON src_topic.source_key = member_compact.src_topic_key
+            JOIN topic_key_map AS src_role ON src_role.source_key = member_compact.src_role_key
+            JOIN topic_key_map AS dest_topic ON dest_topic.source_key = member_compact.dest_topic_key
+            JOIN topic_key_map AS dest_role ON dest_role.source_key = member_compact.dest_role_key
+            WHERE source.map_identifier = ?
+            ORDER BY member_.target_key""",
+            (source_map_identifier,),
+        ) as cursor:
+            copied = cursor.rowcount
+        await db.execute("DELETE FROM topic_key_map")
+        await db.commit()
+        if progress:
+            progress("member", copied)
+
+    async def clone_map(
+        self,
+        map_identifier: int,
+        user_identifier: int,
+        name: str | None = None,
+        include_resource_data: bool = True,
+        chunk_size: int = 5000,
+        progress: Callable[[str, int], None] | None = None,
+    ) -> int:
+        # Copies a map (all of its content rows) into a new map owned by the user. The new map only becomes visible
+        # to the user once all of its content has been copied.
+        source_map = await self.get_map(map_identifier)
+        if source_map is None:
+            raise TopicDbError(f"Map {map_identifier} does not exist")
+        try:
+            async with self._connect() as db:
+                async with db.execute(
+                    """INSERT INTO map (name, description, image_path, initialised, published, promoted)
+                    VALUES (?, ?, ?, ?, 0, 0)""",
+                    (
+                        name if name else source_map.name,
+                        source_map.description,
+                        source_map.image_path,
+                        source_map.initialised,
+                    ),
+                ) as cursor:
+                    result = cursor.lastrowid
+                await db.commit()
+            shard = self._get_shard(result)
+            try:
+                # The source map may be in another shard
+                async with (
+                    self._connect_shard(shard) as db,
+                    self._attach(db, shard, self._get_shard(map_identifier), "source") as source_schema,
+                ):
+                    compact = (
+                        await self._get_storage_layout(db) is StorageLayout.COMPACT
+                        and await self._get_storage_layout(db, source_schema) is StorageLayout.COMPACT
+                    )
+                    for table in MAP_TABLES:
+                        if table == "member" and compact:
+                            await self._copy_compact_members(
+                                db,
+                                map_identifier,
+                                result,  # type: ignore
+                                progress,
+                                source_schema,
+                            )
+                            continue
+                        await self._copy_map_table(
+                            db,
+                            table,
+                            map_identifier,
+                            result,  # type: ignore
+                            include_resource_data,
+                            chunk_size,
+                            progress,
+                            source_schema,
+                        )
+                    # Once for the whole copy rather than once per chunk
+                    await self._bump_map_version(db, result)  # type: ignore
+                    await db.commit()
+                async with self._connect() as db:
+                    await db.execute(
+                        """INSERT INTO user_map (user_identifier, map_identifier, owner, collaboration_mode)
+                        VALUES (?, ?, 1, ?)""",
+                        (user_identifier, result, CollaborationMode.EDIT.name.lower()),
+                    )
+                    await db.commit()
+            except BaseException:
+                async with self._connect_shard(shard) as db:
+                    for table in MAP_TABLES:
+                        await db.execute(f"DELETE FROM {table} WHERE map_identifier = ?", (result,))
+                    if await self._get_storage_layout(db) is StorageLayout.COMPACT:
+                        await db.execute("DELETE FROM topic_key WHERE map_identifier = ?", (result,))
+                    await db.execute("DELETE FROM map_state WHERE map_identifier = ?", (result,))
+                    await db.commit()
+                async with self._connect() as db:
+                    await db.execute("DELETE FROM map WHERE identifier = ?", (result,))
+                    await db.commit()
+                raise
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error cloning map: {error}")
+        self.permission_cache.invalidate(result, user_identifier)  # type: ignore
+        return result  # type: ignore
+
+    async def delete_map(self, map_identifier: int, purge: bool = True) -> asyncio.Task | None:
+        # Tombstones the map: it disappears (together with its user and collaborator rows) in one short transaction.
+        # Its content is then removed by 'purge_map', by default in a background task.
+        try:
+            async with self._connect() as db:
+                await db.execute("BEGIN IMMEDIATE")
+                async with db.execute(
+                    "UPDATE map SET deleted = 1 WHERE identifier = ? AND deleted = 0", (map_identifier,)
+                ) as cursor:
+                    deleted = cursor.rowcount > 0
+                if not deleted:
+                    await db.rollback()
+                    raise TopicDbError(f"Map {map_identifier} does not exist")
+                await db.execute("DELETE FROM user_map WHERE map_identifier = ?", (map_identifier,))
+                await db.execute(
+                    "INSERT INTO map_purge (map_identifier) VALUES (?) ON CONFLICT (map_identifier) DO NOTHING",
+                    (map_identifier,),
+                )
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error deleting map: {error}")
+        self._facets_cache = {key: value for key, value in self._facets_cache.items() if key[0] != map_identifier}
+        self.ontology_registry.invalidate(map_identifier)
+        self.permission_cache.invalidate(map_identifier)
+        self.single_flight.forget(map_identifier)
+        self._graph_cache.pop(map_identifier, None)
+        self._content_indexes.pop(map_identifier, None)
+        self._existence_filters.pop(map_identifier, None)
+        if not purge:
+            return None
+        task = asyncio.create_task(self.purge_map(map_identifier))
+        self._purge_tasks.add(task)
+        task.add_done_callback(functools.partial(self._purge_done, map_identifier))
+        return task
+
+    def _purge_done(self, map_identifier: int, task: asyncio.Task) -> None:
+        # Nobody may be awaiting a background purge, so its failure is logged here. An interrupted purge is completed
+        # by 'resume_map_purges'.
+        self._purge_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error purging map %d", map_identifier, exc_info=task.exception())
+
+    @staticmethod
+    async def _purge_text(
+        db: aiosqlite.Connection, map_identifier: int, identifiers: list[str], catalog_schema: str = "main"
+    ) -> None:
+        # Full-text rows are keyed by occurrence identifier only; cloned maps share occurrence identifiers, so rows
+        # still referred to by another map are kept
+        placeholders = ", ".join("?" * len(identifiers))
+        async with db.execute(
+            f"""SELECT identifier FROM occurrence
+            WHERE map_identifier IN (SELECT identifier FROM {catalog_schema}.map WHERE identifier != ?)
+            AND identifier IN ({placeholders})""",
+            (map_identifier, *identifiers),
+        ) as cursor:
+            shared = {record[0] async for record in cursor}
+        identifiers = [identifier for identifier in identifiers if identifier not in shared]
+        if identifiers:
+            # Identifiers are bound rather than written into a full-text query, whose syntax they could break out of
+            await db.execute(
+                f"DELETE FROM text WHERE occurrence_identifier IN ({', '.join('?' * len(identifiers))})", identifiers
+            )
+
+    async def purge_map(
+        self,
+        map_identifier: int,
+        batch_size: int = 1000,
+        pause: float = 0.0,
+        progress: Callable[[str, int], None] | None = None,
+    ) -> None:
+        # Deletes a tombstoned map's rows in bounded batches, each batch being a transaction of its own. Progress is
+        # recorded in the 'map_purge' table (in the batch's transaction) so an interrupted purge can be resumed.
+        shard = self._get_shard(map_identifier)
+        try:
+            async with self._connect_shard(shard) as db, self._attach(db, shard, None, "catalog") as catalog_schema:
+                async with db.execute(
+                    f"""SELECT map_purge.table_name, map_purge.purged_rows FROM {catalog_schema}.map_purge
+                    INNER JOIN {catalog_schema}.map ON map.identifier = map_purge.map_identifier
+                    WHERE map_purge.map_identifier = ? AND map.deleted = 1""",
+                    (map_identifier,),
+                ) as cursor:
+                    record = await cursor.fetchone()
+                if record is None:
+                    raise TopicDbError(f"Map {map_identifier} has not been deleted")
+                tables = list(MAP_TABLES)
+                if await self._get_storage_layout(db) is StorageLayout.COMPACT:
+                    tables.append("topic_key")  # Last: the 'member' view resolves keys through it
+                resume_table, purged_rows = record
+                if resume_table in tables:
+                    tables = tables[tables.index(resume_table) :]
+                else:
+                    purged_rows = 0
+                for table in tables:
+                    while True:
+                        await db.execute("BEGIN IMMEDIATE")
+                        async with db.execute(
+                            f"SELECT rowid, identifier FROM {table} WHERE map_identifier = ? LIMIT ?",
+                            (map_identifier, batch_size),
+                        ) as cursor:
+                            records = await cursor.fetchall()
+                        if records:
+                            if table == "occurrence":
+                                await self._purge_text(
+                                    db, map_identifier, [record[1] for record in records], catalog_schema
+                                )
+                            await db.execute(
+                                f"DELETE FROM {table} WHERE rowid IN ({', '.join('?' * len(records))})",
+                                [record[0] for record in records],
+                            )
+                            await self._bump_map_version(db, map_identifier)
+                            purged_rows += len(records)
+                        await db.execute(
+                            f"""UPDATE {catalog_schema}.map_purge SET table_name = ?, purged_rows = ?
+                            WHERE map_identifier = ?""",
+                            (table, purged_rows, map_identifier),
+                        )
+                        await db.commit()
+                        if progress:
+                            progress(table, purged_rows)
+                        if len(records) < batch_size:
+                            break
+                        await asyncio.sleep(pause)  # Lets other writers in between batches
+                await db.execute("BEGIN IMMEDIATE")
+                await db.execute("DELETE FROM map_state WHERE map_identifier = ?", (map_identifier,))
+                await db.execute("DELETE FROM topic_score_state WHERE map_identifier = ?", (map_identifier,))
+                await db.execute("DELETE FROM similar_topic_state WHERE map_identifier = ?", (map_identifier,))
+                await db.execute(f"DELETE FROM {catalog_schema}.map WHERE identifier = ?", (map_identifier,))
+                await db.execute(f"DELETE FROM {catalog_schema}.map_purge WHERE map_identifier = ?", (map_identifier,))
+                await db.commit()
+                # Hand the freed pages back in small steps (a no-op unless the database uses incremental auto-vacuum)
+                while True:
+                    async with db.execute("PRAGMA freelist_count") as cursor:
+                        record = await cursor.fetchone()
+                    if not record or record[0] == 0:
+                        break
+                    async with db.execute(f"PRAGMA incremental_vacuum({batch_size})") as cursor:
+                        await cursor.fetchall()
+                    await db.commit()
+                    async with db.execute("PRAGMA freelist_count") as cursor:
+                        remaining = await cursor.fetchone()
+                    if remaining and remaining[0] == record[0]:
+                        break
+                    await asyncio.sleep(pause)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error purging map: {error}")
+        await self.collect_blobs()
+
+    async def resume_map_purges(self, batch_size: int = 1000, pause: float = 0.0) -> list[int]:
+        # Completes the purges interrupted by a restart (to be called on start-up)
+        try:
+            async with (
+                self._connect() as db,
+                db.execute(
+                    """SELECT map_purge.map_identifier FROM map_purge
+                    INNER JOIN map ON map.identifier = map_purge.map_identifier
+                    WHERE map.deleted = 1
+                    ORDER BY map_purge.map_identifier"""
+                ) as cursor,
+            ):
+                result = [record[0] async for record in cursor]
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching map purges: {error}")
+        for map_identifier in result:
+            await self.purge_map(map_identifier, batch_size=batch_size, pause=pause)
         return result
 
+    @staticmethod
+    async def _bump_map_version(db: aiosqlite.Connection, map_identifier: int) -> int:
+        # Called once by every transaction that changes a map's content, just before it commits
+        async with db.execute(
+            """INSERT INTO map_state (map_identifier, version) VALUES (?, 1)
+            ON CONFLICT (map_identifier) DO UPDATE SET version = version + 1
+            RETURNING version""",
+            (map_identifier,),
+        ) as cursor:
+            record = await cursor.fetchone()
+        return record[0]  # type: ignore
+
+    @staticmethod
+    async def _get_map_version(db: aiosqlite.Connection, map_identifier: int) -> int:
+        async with db.execute("SELECT version FROM map_state WHERE map_identifier = ?", (map_identifier,)) as cursor:
+            record = await cursor.fetchone()
+        return record[0] if record else 0
+
+    async def get_map_version(self, map_identifier: int) -> int:
+        try:
+            async with self._connect(map_identifier) as db:
+                return await self._get_map_version(db, map_identifier)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching map version: {error}")
+
+    async def is_map_owner(self, map_identifier: int, user_identifier: int) -> bool:
+        permission = await self.get_permission(map_identifier, user_identifier)
+        return bool(permission and permission.owner)
+
     # endregion
 
     # region Collaboration
-    async def get_collaboration_mode(self, map_identifier: int, user_identifier: int) -> CollaborationMode | None:
-        result = None
+    async def get_permission(self, map_identifier: int, user_identifier: int) -> Permission | None:
+        # Owner flag and collaboration mode in one (cached) lookup; None means the user has no access to the map
+        hit, result = self.permission_cache.get(user_identifier, map_identifier)
+        if not hit:
+            result = (await self.get_permissions(user_identifier, [map_identifier])).get(map_identifier)
+        return result
+
+    async def get_permissions(self, user_identifier: int, map_identifiers: list[int]) -> dict[int, Permission]:
+        # Permissions of a user for many maps at once; maps the user has no access to are left out
+        result: dict[int, Permission] = {}
+        uncached: list[int] = []
+        for map_identifier in dict.fromkeys(map_identifiers):
+            hit, permission = self.permission_cache.get(user_identifier, map_identifier)
+            if not hit:
+                uncached.append(map_identifier)
+            elif permission:
+                result[map_identifier] = permission
+        if not uncached:
+            return result
+        generation = self.permission_cache.generation
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect() as db:
                 db.row_factory = aiosqlite.Row
-                async with db.execute(
-                    "SELECT collaboration_mode FROM user_map WHERE user_identifier = ? AND map_identifier = ?",
-                    (user_identifier, map_identifier),
-                ) as cursor:
-                    async for record in cursor:
-                        result = CollaborationMode[record["collaboration_mode"].upper()]
+                for index in range(0, len(uncached), MAX_BIND_VARIABLES):
+                    chunk = uncached[index : index + MAX_BIND_VARIABLES]
+                    async with db.execute(
+                        f"""SELECT map_identifier, owner, collaboration_mode FROM user_map
+                        WHERE user_identifier = ? AND map_identifier IN ({", ".join("?" * len(chunk))})""",
+                        (user_identifier, *chunk),
+                    ) as cursor:
+                        async for record in cursor:
+                            result[record["map_identifier"]] = Permission(
+                                bool(record["owner"]), CollaborationMode[record["collaboration_mode"].upper()]
+                            )
         except aiosqlite.Error as error:
-            raise TopicDbError(f"Error fetching collaboration mode: {error}")
+            raise TopicDbError(f"Error fetching permissions: {error}")
+        for map_identifier in uncached:
+            self.permission_cache.set(user_identifier, map_identifier, result.get(map_identifier), generation)
         return result
 
+    async def get_collaboration_mode(self, map_identifier: int, user_identifier: int) -> CollaborationMode | None:
+        permission = await self.get_permission(map_identifier, user_identifier)
+        return permission.collaboration_mode if permission else None
+
+    async def create_collaboration(
+        self, map_identifier: int, user_identifier: int, collaboration_mode: CollaborationMode
+    ) -> None:
+        try:
+            async with self._connect() as db:
+                await db.execute(
+                    """INSERT INTO user_map (user_identifier, map_identifier, owner, collaboration_mode)
+                    VALUES (?, ?, 0, ?)""",
+                    (user_identifier, map_identifier, collaboration_mode.name.lower()),
+                )
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error creating collaboration: {error}")
+        finally:
+            self.permission_cache.invalidate(map_identifier, user_identifier)
+
+    async def update_collaboration_mode(
+        self, map_identifier: int, user_identifier: int, collaboration_mode: CollaborationMode
+    ) -> None:
+        try:
+            async with self._connect() as db:
+                await db.execute(
+                    """UPDATE user_map SET collaboration_mode = ?
+                    WHERE user_identifier = ? AND map_identifier = ? AND owner = 0""",
+                    (collaboration_mode.name.lower(), user_identifier, map_identifier),
+                )
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error updating collaboration mode: {error}")
+        finally:
+            self.permission_cache.invalidate(map_identifier, user_identifier)
+
+    async def delete_collaboration(self, map_identifier: int, user_identifier: int) -> None:
+        try:
+            async with self._connect() as db:
+                await db.execute(
+                    "DELETE FROM user_map WHERE user_identifier = ? AND map_identifier = ? AND owner = 0",
+                    (user_identifier, map_identifier),
+                )
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error deleting collaboration: {error}")
+        finally:
+            self.permission_cache.invalidate(map_identifier, user_identifier)
+
     async def get_collaborators(self, map_identifier: int) -> None:
         pass
 
@@ -761,10 +2876,499 @@ class TopicStore:
         pass
 
     # endregion
+    # region Graph
+    async def get_topic_graph(self, map_identifier: int) -> TopicGraph:
+        # The map's association graph, loaded into memory with one bulk read and cached until the map's version
+        # changes. Concurrent callers share a single load.
+        lock = self._graph_locks.setdefault(map_identifier, asyncio.Lock())
+        async with lock:
+            try:
+                async with self._connect(map_identifier) as db:
+                    version = await self._get_map_version(db, map_identifier)
+                    cached = self._graph_cache.get(map_identifier)
+                    if cached and cached[0] == version:
+                        return cached[1]
+                    # Refuse to load a graph that is obviously over budget before reading any of it
+                    async with db.execute(
+                        """SELECT (SELECT COUNT(*) FROM topic WHERE map_identifier = ? AND scope IS NULL),
+                        (SELECT COUNT(*) FROM member WHERE map_identifier = ?)""",
+                        (map_identifier, map_identifier),
+                    ) as cursor:
+                        node_count, edge_count = await cursor.fetchone()
+                    if TopicGraphBuilder.estimate(node_count, edge_count) > self.graph_memory_budget:
+                        raise TopicDbError("The map's association graph exceeds the memory budget")
+                    builder = TopicGraphBuilder(self.graph_memory_budget)
+                    async with db.execute(
+                        """SELECT member.src_topic_ref, member.src_role_spec, member.dest_topic_ref,
+                        member.dest_role_spec, topic.instance_of
+                        FROM member
+                        JOIN topic ON topic.map_identifier = member.map_identifier
+                        AND topic.identifier = member.association_identifier
+                        WHERE member.map_identifier = ?""",
+                        (map_identifier,),
+                    ) as cursor:
+                        while records := await cursor.fetchmany(50_000):
+                            await asyncio.to_thread(builder.add, records)
+            except aiosqlite.Error as error:
+                raise TopicDbError(f"Error loading topic graph: {error}")
+            result = await asyncio.to_thread(builder.build)
+            result.version = version
+            self._graph_cache[map_identifier] = (version, result)
+        return result
+
+    async def find_paths(
+        self,
+        map_identifier: int,
+        source: str,
+        target: str,
+        max_depth: int = 4,
+        instance_ofs: list[str] | None = None,
+        k: int = 3,
+        max_visits: int = 100_000,
+        timeout: float | None = 2.0,
+    ) -> list[list[Hop]]:
+        # How are two topics connected? Up to k shortest paths, each a list of hops with the association type and
+        # roles. The visit budget and timeout bound the search (not the initial loading of the map's graph).
+        graph = await self.get_topic_graph(map_identifier)
+        return await asyncio.to_thread(
+            graph.find_paths, source, target, max_depth, instance_ofs, k, max_visits, timeout
+        )
+
+    # endregion
+
+    # region Ranking
+    async def update_topic_scores(self, map_identifier: int, force: bool = False) -> bool:
+        # (Re)computes the degree and PageRank of the map's topics, unless the map has not changed since the scores
+        # were last computed. The previous scores warm-start the PageRank iteration, so recomputing after a few edits
+        # takes only a few iterations. Returns whether the scores were recomputed.
+        try:
+            async with self._connect(map_identifier) as db:
+                version = await self._get_map_version(db, map_identifier)
+                async with db.execute(
+                    "SELECT version FROM topic_score_state WHERE map_identifier = ?", (map_identifier,)
+                ) as cursor:
+                    record = await cursor.fetchone()
+                if not force and record is not None and record[0] == version:
+                    return False
+                async with db.execute(
+                    "SELECT identifier, pagerank FROM topic_score WHERE map_identifier = ?", (map_identifier,)
+                ) as cursor:
+                    previous_scores = {identifier: pagerank for identifier, pagerank in await cursor.fetchall()}
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error retrieving topic scores: {error}")
+        graph = await self.get_topic_graph(map_identifier)
+        scores = await asyncio.to_thread(topic_scores, graph, previous_scores)
+        try:
+            async with self._connect(map_identifier) as db:
+                await db.execute("BEGIN IMMEDIATE")
+                await db.execute("DELETE FROM topic_score WHERE map_identifier = ?", (map_identifier,))
+                await db.executemany(
+                    "INSERT INTO topic_score (map_identifier, identifier, degree, pagerank) VALUES (?, ?, ?, ?)",
+                    ((map_identifier, *score) for score in scores),
+                )
+                await db.execute(
+                    """INSERT INTO topic_score_state (map_identifier, version, updated_at)
+                    VALUES (?, ?, datetime('now'))
+                    ON CONFLICT (map_identifier) DO UPDATE SET
+                    version = excluded.version,
+                    updated_at = excluded.updated_at""",
+                    (map_identifier, graph.version),
+                )
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error updating topic scores: {error}")
+        return True
+
+    async def update_all_topic_scores(self) -> list[int]:
+        # Recomputes the scores of every map that changed since its scores were last computed; meant to be run on a
+        # schedule. Returns the identifiers of the updated maps.
+        map_identifiers: list[int] = []
+        try:
+            for shard in self._get_shards():
+                async with (
+                    self._connect_shard(shard) as db,
+                    self._attach(db, shard, None, "catalog") as catalog_schema,
+                    db.execute(
+                        f"""SELECT map_state.map_identifier FROM map_state
+                        INNER JOIN {catalog_schema}.map ON map.identifier = map_state.map_identifier
+                        LEFT JOIN topic_score_state ON topic_score_state.map_identifier = map_state.map_identifier
+                        WHERE map.deleted = 0 AND topic_score_state.version IS NOT map_state.version
+                        ORDER BY map_state.map_identifier"""
+                    ) as cursor,
+                ):
+                    map_identifiers.extend(record[0] for record in await cursor.fetchall())
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error retrieving maps: {error}")
+        result = []
+        for map_identifier in sorted(map_identifiers):
+            if await self.update_topic_scores(map_identifier):
+                result.append(map_identifier)
+        return result
+
+    async def update_similar_topics(
+        self,
+        map_identifier: int,
+        k: int = 10,
+        measure: SimilarityMeasure = SimilarityMeasure.JACCARD,
+        force: bool = False,
+    ) -> int:
+        # Refreshes the k most similar topics of the map's topics. Only topics whose neighbour sets changed since the
+        # last refresh (going by their fingerprints), the topics they are candidates of and the topics that list them
+        # are recomputed, unless the refresh is forced or 'k' or the measure changed. Returns the number of topics
+        # that were recomputed.
+        try:
+            async with self._connect(map_identifier) as db:
+                version = await self._get_map_version(db, map_identifier)
+                async with db.execute(
+                    "SELECT version, measure, k FROM similar_topic_state WHERE map_identifier = ?", (map_identifier,)
+                ) as cursor:
+                    state = await cursor.fetchone()
+                full = force or state is None or state[1] != measure.name.lower() or state[2] != k
+                if not full and state[0] == version:
+                    return 0
+                async with db.execute(
+                    "SELECT identifier, fingerprint FROM similar_topic_fingerprint WHERE map_identifier = ?",
+                    (map_identifier,),
+                ) as cursor:
+                    stored_fingerprints = dict(await cursor.fetchall())
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error retrieving similar topics: {error}")
+        graph = await self.get_topic_graph(map_identifier)
+        index = await asyncio.to_thread(SimilarityIndex, graph)
+        fingerprints = await asyncio.to_thread(lambda: [index.fingerprint(node) for node in range(graph.node_count)])
+        changed = [
+            node
+            for node in range(graph.node_count)
+            if full or stored_fingerprints.get(graph.identifier(node)) != fingerprints[node]
+        ]
+        removed = [identifier for identifier in stored_fingerprints if identifier not in graph]
+        if full:
+            targets = set(range(graph.node_count))
+        else:
+            targets = await asyncio.to_thread(index.affected, changed)
+            # Topics that list a changed or removed topic as similar
+            identifiers = [graph.identifier(node) for node in changed] + removed
+            try:
+                async with self._connect(map_identifier) as db:
+                    for offset in range(0, len(identifiers), MAX_BIND_VARIABLES):
+                        chunk = identifiers[offset : offset + MAX_BIND_VARIABLES]
+                        async with db.execute(
+                            f"""SELECT DISTINCT identifier FROM similar_topic
+                            WHERE map_identifier = ? AND similar_identifier IN ({", ".join("?" * len(chunk))})""",
+                            (map_identifier, *chunk),
+                        ) as cursor:
+                            async for record in cursor:
+                                node = graph.index(record[0])
+                                if node is not None:
+                                    targets.add(node)
+            except aiosqlite.Error as error:
+                raise TopicDbError(f"Error retrieving similar topics: {error}")
+        similar = await asyncio.to_thread(lambda: {node: index.similar(node, k, measure) for node in targets})
+        try:
+            async with self._connect(map_identifier) as db:
+                await db.execute("BEGIN IMMEDIATE")
+                if full:
+                    await db.execute("DELETE FROM similar_topic WHERE map_identifier = ?", (map_identifier,))
+                    await db.execute(
+                        "DELETE FROM similar_topic_fingerprint WHERE map_identifier = ?", (map_identifier,)
+                    )
+                else:
+                    identifiers = [graph.identifier(node) for node in targets] + removed
+                    for offset in range(0, len(identifiers), MAX_BIND_VARIABLES):
+                        chunk = identifiers[offset : offset + MAX_BIND_VARIABLES]
+                        placeholders = ", ".join("?" * len(chunk))
+                        await db.execute(
+                            f"DELETE FROM similar_topic WHERE map_identifier = ? AND identifier IN ({placeholders})",
+                            (map_identifier, *chunk),
+                        )
+                    for offset in range(0, len(removed), MAX_BIND_VARIABLES):
+                        chunk = removed[offset : offset + MAX_BIND_VARIABLES]
+                        placeholders = ", ".join("?" * len(chunk))
+                        await db.execute(
+                            f"""DELETE FROM similar_topic_fingerprint
+                            WHERE map_identifier = ? AND identifier IN ({placeholders})""",
+                            (map_identifier, *chunk),
+                        )
+                await db.executemany(
+                    """INSERT INTO similar_topic (map_identifier, identifier, rank, similar_identifier, score)
+                    VALUES (?, ?, ?, ?, ?)""",
+                    (
+                        (map_identifier, graph.identifier(node), rank, graph.identifier(similar_node), score)
+                        for node, similar_nodes in similar.items()
+                        for rank, (similar_node, score) in enumerate(similar_nodes)
+                    ),
+                )
+                await db.executemany(
+                    """INSERT INTO similar_topic_fingerprint (map_identifier, identifier, fingerprint) VALUES (?, ?, ?)
+                    ON CONFLICT (map_identifier, identifier) DO UPDATE SET fingerprint = excluded.fingerprint""",
+                    ((map_identifier, graph.identifier(node), fingerprints[node]) for node in changed),
+                )
+                await db.execute(
+                    """INSERT INTO similar_topic_state (map_identifier, version, measure, k, updated_at)
+                    VALUES (?, ?, ?, ?, datetime('now'))
+                    ON CONFLICT (map_identifier) DO UPDATE SET
+                    version = excluded.version,
+                    measure = excluded.measure,
+                    k = excluded.k,
+                    updated_at = excluded.updated_at""",
+                    (map_identifier, graph.version, measure.name.lower(), k),
+                )
+                await db.commit()
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error updating similar topics: {error}")
+        return len(targets)
+
+    async def get_similar_topics(
+        self, map_identifier: int, identifier: str, limit: int | None = None
+    ) -> list[SimilarTopic]:
+        # Topics like this one, most similar first, as of the last 'update_similar_topics'
+        try:
+            async with (
+                self._connect(map_identifier) as db,
+                db.execute(
+                    """SELECT similar_identifier, score FROM similar_topic
+                    WHERE map_identifier = ? AND identifier = ?
+                    ORDER BY rank LIMIT ?""",
+                    (map_identifier, identifier, -1 if limit is None else limit),
+                ) as cursor,
+            ):
+                return [SimilarTopic(*record) for record in await cursor.fetchall()]
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error retrieving similar topics: {error}")
+
+    async def get_top_topics(
+        self, map_identifier: int, limit: int = 10, measure: RankingMeasure = RankingMeasure.PAGERANK
+    ) -> list[TopicScore]:
+        if measure is RankingMeasure.PAGERANK:
+            sql = """SELECT identifier, degree, pagerank FROM topic_score
+                WHERE map_identifier = ? ORDER BY pagerank DESC LIMIT ?"""
+        else:
+            sql = """SELECT identifier, degree, pagerank FROM topic_score
+                WHERE map_identifier = ? ORDER BY degree DESC LIMIT ?"""
+        try:
+            async with (
+                self._connect(map_identifier) as db,
+                db.execute(sql, (map_identifier, limit)) as cursor,
+            ):
+                return [TopicScore(*record) for record in await cursor.fetchall()]
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error retrieving top topics: {error}")
+
+    async def get_topic_scores(self, map_identifier: int, identifiers: list[str]) -> dict[str, TopicScore]:
+        # Scores of the given topics (topics without associations have none), for ordering search results and lists
+        result: dict[str, TopicScore] = {}
+        identifiers = list(dict.fromkeys(identifiers))
+        try:
+            async with self._connect(map_identifier) as db:
+                for index in range(0, len(identifiers), MAX_BIND_VARIABLES):
+                    chunk = identifiers[index : index + MAX_BIND_VARIABLES]
+                    async with db.execute(
+                        f"""SELECT identifier, degree, pagerank FROM topic_score
+                        WHERE map_identifier = ? AND identifier IN ({", ".join("?" * len(chunk))})""",
+                        (map_identifier, *chunk),
+                    ) as cursor:
+                        async for record in cursor:
+                            result[record[0]] = TopicScore(*record)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error retrieving topic scores: {error}")
+        return result
+
+    # endregion
+
+    # region Content
+    async def _get_topic_texts(self, map_identifier: int, topic_identifiers: list[str] | None = None) -> dict[str, str]:
+        # Topic identifier -> the text of its text and note occurrences (of all topics if none are given)
+        content_filter = f"instance_of IN ({', '.join('?' * len(CONTENT_INSTANCE_OFS))})"
+        records: list = []
+        try:
+            async with self._connect(map_identifier) as db:
+                if topic_identifiers is None:
+                    async with db.execute(
+                        f"""SELECT topic_identifier, resource_data, resource_hash, resource_codec FROM occurrence
+                        WHERE map_identifier = ? AND {content_filter}""",
+                        (map_identifier, *CONTENT_INSTANCE_OFS),
+                    ) as cursor:
+                        records = list(await cursor.fetchall())
+                else:
+                    for index in range(0, len(topic_identifiers), MAX_BIND_VARIABLES):
+                        chunk = topic_identifiers[index : index + MAX_BIND_VARIABLES]
+                        async with db.execute(
+                            f"""SELECT topic_identifier, resource_data, resource_hash, resource_codec FROM occurrence
+                            WHERE map_identifier = ? AND topic_identifier IN ({", ".join("?" * len(chunk))})
+                            AND {content_filter}""",
+                            (map_identifier, *chunk, *CONTENT_INSTANCE_OFS),
+                        ) as cursor:
+                            records.extend(await cursor.fetchall())
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error fetching occurrence data: {error}")
+
+        def decode() -> dict[str, str]:
+            texts: dict[str, list[str]] = {}
+            for topic_identifier, data, hash_, codec in records:
+                data = self._decode_resource_data(data, hash_, codec)
+                if data:
+                    texts.setdefault(topic_identifier, []).append(data.decode("utf-8", errors="replace"))
+            return {topic_identifier: "\n".join(parts) for topic_identifier, parts in texts.items()}
+
+        return await asyncio.to_thread(decode)
+
+    async def get_content_index(self, map_identifier: int) -> ContentIndex:
+        # The map's TF-IDF content index. It is built on first use and then kept up to date by the store's own
+        # occurrence writes; any other change to the map makes the next call rebuild it.
+        lock = self._content_locks.setdefault(map_identifier, asyncio.Lock())
+        async with lock:
+            version = await self.get_map_version(map_identifier)
+            index = self._content_indexes.get(map_identifier)
+            if index is not None and index.version == version:
+                return index
+            texts = await self._get_topic_texts(map_identifier)
+            index = await asyncio.to_thread(ContentIndex, texts.items())
+            index.version = version
+            self._content_indexes[map_identifier] = index
+        return index
+
+    async def _update_content_index(
+        self, map_identifier: int, topic_identifiers: set[str], previous_version: int | None, version: int
+    ) -> None:
+        index = self._content_indexes.get(map_identifier)
+        if index is None or index.version != previous_version:
+            return  # The index missed other changes; it will be rebuilt
+        texts = await self._get_topic_texts(map_identifier, list(topic_identifiers)) if topic_identifiers else {}
+        if index.version != previous_version or self._content_indexes.get(map_identifier) is not index:
+            return
+        for topic_identifier in topic_identifiers:
+            if topic_identifier in texts:
+                index.set_document(topic_identifier, texts[topic_identifier])
+            else:
+                index.remove_document(topic_identifier)
+        index.version = version
+
+    async def similar_by_content(self, map_identifier: int, topic_identifier: str, k: int = 10) -> list[SimilarTopic]:
+        # "More like this": the topics whose text and note occurrences are most similar to the given topic's
+        index = await self.get_content_index(map_identifier)
+        return [SimilarTopic(*item) for item in index.similar(topic_identifier, k)]
+
+    # endregion
+
+    # region Existence
+    @staticmethod
+    def _existence_key(columns: tuple) -> str:
+        return "\x1f".join(columns)
+
+    async def _get_existence_filters(self, map_identifier: int) -> dict[str, BloomFilter]:
+        # The map's existence filters. They are built on first use and then extended by the store's own writes. Other
+        # changes to the map (for instance, by another store or process) are noticed by checking the map's version
+        # (unless 'existence_check_interval' says otherwise), and make the filters be rebuilt.
+        filters = self._existence_filters.get(map_identifier)
+        if filters is not None:
+            if time.monotonic() - self._existence_checked.get(map_identifier, 0.0) < self.existence_check_interval:
+                return filters
+            try:
+                async with self._connect(map_identifier) as db:
+                    version = await self._get_map_version(db, map_identifier)
+            except aiosqlite.Error as error:
+                raise TopicDbError(f"Error loading existence filters: {error}")
+            if all(filter_.version == version and not filter_.saturated for filter_ in filters.values()):
+                self._existence_checked[map_identifier] = time.monotonic()
+                return filters
+        lock = self._existence_locks.setdefault(map_identifier, asyncio.Lock())
+        async with lock:
+            try:
+                async with self._connect(map_identifier) as db:
+                    version = await self._get_map_version(db, map_identifier)
+                    filters = self._existence_filters.get(map_identifier)
+                    if filters is not None and all(
+                        filter_.version == version and not filter_.saturated for filter_ in filters.values()
+                    ):
+                        self._existence_checked[map_identifier] = time.monotonic()
+                        return filters
+                    counts = {}
+                    for kind, (table, _) in EXISTENCE_KINDS.items():
+                        async with db.execute(
+                            f"SELECT COUNT(*) FROM {table} WHERE map_identifier = ?", (map_identifier,)
+                        ) as cursor:
+                            counts[kind] = (await cursor.fetchone())[0]
+                    # Room to grow before the filters saturate; the memory budget is shared in proportion
+                    capacities = {kind: count + count // 4 + 1024 for kind, count in counts.items()}
+                    total = sum(capacities.values())
+                    filters = {
+                        kind: BloomFilter(
+                            capacity,
+                            self.existence_false_positive_rate,
+                            self.existence_memory_budget * capacity // total,
+                        )
+                        for kind, capacity in capacities.items()
+                    }
+                    for kind, (table, columns) in EXISTENCE_KINDS.items():
+                        async with db.execute(
+                            f"SELECT {', '.join(columns)} FROM {table} WHERE map_identifier = ?", (map_identifier,)
+                        ) as cursor:
+                            while records := await cursor.fetchmany(50_000):
+                                keys = [self._existence_key(record) for record in records]
+                                await asyncio.to_thread(filters[kind].update, keys)
+                    # Keep the filters only if the map did not change while they were being built
+                    current = await self._get_map_version(db, map_identifier) == version
+            except aiosqlite.Error as error:
+                raise TopicDbError(f"Error loading existence filters: {error}")
+            for filter_ in filters.values():
+                filter_.version = version
+            if current:
+                self._existence_filters[map_identifier] = filters
+                self._existence_checked[map_identifier] = time.monotonic()
+            else:
+                self._existence_filters.pop(map_identifier, None)
+        return filters
+
+    def _update_existence_filters(
+        self, map_identifier: int, keys: dict[str, list[str]], previous_version: int | None, version: int
+    ) -> None:
+        filters = self._existence_filters.get(map_identifier)
+        if filters is None:
+            return
+        if any(filter_.version != previous_version for filter_ in filters.values()):
+            # The filters missed other changes; they will be rebuilt
+            self._existence_filters.pop(map_identifier, None)
+            return
+        for kind, filter_ in filters.items():
+            filter_.update(keys.get(kind, ()))
+            filter_.version = version
+
+    async def _existing(self, map_identifier: int, kind: str, keys: list[str]) -> set[str]:
+        # Keys the filter rules out are absent without a query; the others are looked up in the index
+        filter_ = (await self._get_existence_filters(map_identifier))[kind]
+        candidates = [key for key in dict.fromkeys(keys) if key in filter_]
+        result: set[str] = set()
+        if not candidates:
+            return result
+        table, columns = EXISTENCE_KINDS[kind]
+        # Attributes are looked up by entity identifier, and their names are matched here
+        lookup_keys = (
+            candidates if len(columns) == 1 else list(dict.fromkeys(key.split("\x1f", 1)[0] for key in candidates))
+        )
+        wanted = set(candidates)
+        try:
+            async with self._connect(map_identifier) as db:
+                for index in range(0, len(lookup_keys), MAX_BIND_VARIABLES):
+                    chunk = lookup_keys[index : index + MAX_BIND_VARIABLES]
+                    async with db.execute(
+                        f"""SELECT {", ".join(columns)} FROM {table}
+                        WHERE map_identifier = ? AND {columns[0]} IN ({", ".join("?" * len(chunk))})""",
+                        (map_identifier, *chunk),
+                    ) as cursor:
+                        async for record in cursor:
+                            key = self._existence_key(record)
+                            if key in wanted:
+                                result.add(key)
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error checking existence: {error}")
+        return result
+
+    # endregion
+
     # region Statistics
     async def get_topic_occurrences_statistics(
         self, map_identifier: int, identifier: str, scope: str | None = None
-    ) -> Dict:
+    ) -> dict:
         result = {
             "image": 0,
             "3d-scene": 0,
@@ -782,7 +3386,7 @@ class TopicStore:
             sql = "SELECT instance_of, COUNT(identifier) AS count FROM occurrence GROUP BY map_identifier, topic_identifier, instance_of HAVING map_identifier = ? AND topic_identifier = ?"
             bind_variables = (map_identifier, identifier)  # type: ignore
         try:
-            async with aiosqlite.connect(self.database_path) as db:
+            async with self._connect(map_identifier) as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(sql, bind_variables) as cursor:
                     async for record in cursor:
@@ -791,6 +3395,60 @@ class TopicStore:
             raise TopicDbError(f"Error compiling statistics: {error}")
         return result
 
+    async def get_map_facets(
+        self, map_identifier: int, scope: str | None = None, language: Language | None = None
+    ) -> dict:
+        # Map-wide breakdowns: topics and associations per type, and occurrences per type, scope and language. The
+        # 'scope' filter applies to associations and occurrences (topics are unscoped), 'language' to occurrences.
+        # Results are cached until the map's version changes.
+        cache_key = (map_identifier, scope, language)
+        result: dict = {
+            "topics": {},
+            "associations": {},
+            "occurrences": {"instance_of": {}, "scope": {}, "language": {}},
+        }
+        if scope:
+            topic_sql = """SELECT instance_of, scope IS NULL AS is_topic, COUNT(*) AS count FROM topic
+                WHERE map_identifier = ? AND (scope IS NULL OR scope = ?)
+                GROUP BY instance_of, scope"""
+            topic_bind_variables = (map_identifier, scope)
+        else:
+            topic_sql = """SELECT instance_of, scope IS NULL AS is_topic, COUNT(*) AS count FROM topic
+                WHERE map_identifier = ?
+                GROUP BY instance_of, scope"""
+            topic_bind_variables = (map_identifier,)  # type: ignore
+        occurrence_sql = """SELECT instance_of, scope, language, COUNT(*) AS count FROM occurrence
+            WHERE map_identifier = ? {0}
+            GROUP BY instance_of, scope, language"""
+        occurrence_filter = ""
+        occurrence_bind_variables: list = [map_identifier]
+        if scope:
+            occurrence_filter += " AND scope = ?"
+            occurrence_bind_variables.append(scope)
+        if language:
+            occurrence_filter += " AND language = ?"
+            occurrence_bind_variables.append(language.name.lower())
+        try:
+            async with self._connect(map_identifier) as db:
+                db.row_factory = aiosqlite.Row
+                version = await self._get_map_version(db, map_identifier)
+                cached = self._facets_cache.get(cache_key)
+                if cached and cached[0] == version:
+                    return copy.deepcopy(cached[1])
+                async with db.execute(topic_sql, topic_bind_variables) as cursor:
+                    async for record in cursor:
+                        facet = result["topics"] if record["is_topic"] else result["associations"]
+                        facet[record["instance_of"]] = facet.get(record["instance_of"], 0) + record["count"]
+                async with db.execute(occurrence_sql.format(occurrence_filter), occurrence_bind_variables) as cursor:
+                    async for record in cursor:
+                        for key in ("instance_of", "scope", "language"):
+                            facet = result["occurrences"][key]
+                            facet[record[key]] = facet.get(record[key], 0) + record["count"]
+        except aiosqlite.Error as error:
+            raise TopicDbError(f"Error compiling facets: {error}")
+        self._facets_cache[cache_key] = (version, result)
+        return copy.deepcopy(result)
+
     # endregion
 
 
@@ -0,0 +1,15 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def database_path(tmp_path) -> str:
+    return os.path.join(tmp_path, "topicdb.sqlite3")
@@ -0,0 +1,75 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import sqlite3
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.retrievalmode import RetrievalMode
+from aiotopicdb.store.topicstore import TopicStore
+
+USER_IDENTIFIER = 1
+NOTE = b"Oslo is the capital of Norway"
+# Rows 'populate' writes (an association is stored as a topic too, with a base name of its own)
+ROW_COUNTS = {"topic": 3, "basename": 3, "member": 1, "occurrence": 1}
+
+
+async def populate(store: TopicStore, map_identifier: int) -> None:
+    # Two named topics, an association between them and a text occurrence
+    await store.set_topics(
+        map_identifier,
+        [Topic(identifier="oslo", name="Oslo"), Topic(identifier="norway", name="Norway")],
+        ontology_mode=OntologyMode.LENIENT,
+    )
+    await store.set_association(
+        map_identifier,
+        Association(
+            identifier="oslo-norway",
+            instance_of="capital",
+            src_topic_ref="oslo",
+            src_role_spec="city",
+            dest_topic_ref="norway",
+            dest_role_spec="country",
+        ),
+        ontology_mode=OntologyMode.LENIENT,
+    )
+    await store.set_occurrence(
+        map_identifier,
+        Occurrence(identifier="oslo-note", instance_of="note", topic_identifier="oslo", resource_data=NOTE),
+        ontology_mode=OntologyMode.LENIENT,
+    )
+
+
+async def assert_populated(store: TopicStore, map_identifier: int) -> None:
+    topic = await store.get_topic(map_identifier, "oslo")
+    assert topic is not None
+    assert topic.instance_of == "topic"
+    assert await store.get_topic(map_identifier, "bergen") is None
+
+    associations = await store.get_topic_associations(map_identifier, "norway")
+    assert [association.identifier for association in associations] == ["oslo-norway"]
+    member = associations[0].member
+    assert (member.src_topic_ref, member.src_role_spec) == ("oslo", "city")
+    assert (member.dest_topic_ref, member.dest_role_spec) == ("norway", "country")
+
+    occurrences = await store.get_topic_occurrences(
+        map_identifier, "oslo", inline_resource_data=RetrievalMode.INLINE_RESOURCE_DATA
+    )
+    assert [occurrence.identifier for occurrence in occurrences] == ["oslo-note"]
+    assert await store.get_occurrence_data(map_identifier, "oslo-note") == NOTE
+
+
+def count_rows(database_path: str, table: str, map_identifier: int) -> int:
+    connection = sqlite3.connect(database_path)
+    try:
+        return connection.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE map_identifier = ?", (map_identifier,)
+        ).fetchone()[0]
+    finally:
+        connection.close()
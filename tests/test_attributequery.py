@@ -0,0 +1,212 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import sqlite3
+import sys
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.attribute import Attribute
+from aiotopicdb.models.datatype import DataType
+from aiotopicdb.models.language import Language
+from aiotopicdb.store.attributeoperator import AttributeOperator
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+POPULATIONS = {"oslo": 709_037, "bergen": 291_189, "stavanger": 148_577, "trondheim": 214_565, "tromso": 78_745}
+NAMES = {"oslo": "Oslo", "bergen": "Bergen", "stavanger": "Stavanger", "trondheim": "Trondheim", "tromso": "Tromsø"}
+
+
+async def add_attributes(store: TopicStore, map_identifier: int) -> None:
+    attributes = []
+    for identifier, population in POPULATIONS.items():
+        attributes.append(Attribute("population", str(population), identifier, data_type=DataType.NUMBER))
+        attributes.append(Attribute("name", NAMES[identifier], identifier))
+        attributes.append(Attribute("capital", str(identifier == "oslo"), identifier, data_type=DataType.BOOLEAN))
+    attributes.append(Attribute("founded", "1040-01-01", "oslo", data_type=DataType.TIMESTAMP))
+    attributes.append(Attribute("founded", "1070-01-01", "bergen", data_type=DataType.TIMESTAMP))
+    attributes.append(Attribute("founded", "0997-01-01", "trondheim", data_type=DataType.TIMESTAMP))
+    await store.set_attributes(map_identifier, attributes, ontology_mode=OntologyMode.LENIENT)
+
+
+def test_typed_predicates(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await add_attributes(store, map_identifier)
+
+            async def query(name: str, operator: AttributeOperator, value, data_type=DataType.STRING) -> list[str]:
+                return await store.get_attribute_entity_identifiers(
+                    map_identifier, name, operator, value, data_type=data_type
+                )
+
+            # Numbers compare as numbers (as text, "78745" would be greater than "709037"), ordered by value
+            assert await query("population", AttributeOperator.GREATER_THAN, 200_000, DataType.NUMBER) == [
+                "trondheim",
+                "bergen",
+                "oslo",
+            ]
+            assert await query("population", AttributeOperator.LESS_THAN, "150000", DataType.NUMBER) == [
+                "tromso",
+                "stavanger",
+            ]
+            assert await query("population", AttributeOperator.BETWEEN, (148_577, 214_565), DataType.NUMBER) == [
+                "stavanger",
+                "trondheim",
+            ]
+            assert await query("population", AttributeOperator.EQUAL, 291_189, DataType.NUMBER) == ["bergen"]
+            assert await query("population", AttributeOperator.IN, [78_745, 709_037], DataType.NUMBER) == [
+                "tromso",
+                "oslo",
+            ]
+            # Timestamps compare as points in time, booleans as truth values
+            assert await query(
+                "founded", AttributeOperator.GREATER_THAN_OR_EQUAL, "1040-01-01", DataType.TIMESTAMP
+            ) == [
+                "oslo",
+                "bergen",
+            ]
+            assert await query("founded", AttributeOperator.LESS_THAN_OR_EQUAL, "1000-01-01", DataType.TIMESTAMP) == [
+                "trondheim"
+            ]
+            assert await query("capital", AttributeOperator.EQUAL, True, DataType.BOOLEAN) == ["oslo"]
+            # Prefixes
+            assert await query("name", AttributeOperator.PREFIX, "Tr") == ["tromso", "trondheim"]
+            assert await query("name", AttributeOperator.PREFIX, "Troms") == ["tromso"]
+            assert await query("name", AttributeOperator.PREFIX, "") == sorted(NAMES, key=NAMES.__getitem__)
+            with pytest.raises(TopicDbError):
+                await query("population", AttributeOperator.PREFIX, "7", DataType.NUMBER)
+            with pytest.raises(TopicDbError):
+                await query("population", AttributeOperator.BETWEEN, 1, DataType.NUMBER)
+
+    asyncio.run(scenario())
+
+
+def test_prefix_upper_bound() -> None:
+    assert TopicStore._get_prefix_upper_bound("abc") == "abd"
+    assert TopicStore._get_prefix_upper_bound("") is None
+    assert TopicStore._get_prefix_upper_bound(chr(sys.maxunicode)) is None
+    assert TopicStore._get_prefix_upper_bound("a" + chr(sys.maxunicode)) == "b"
+    assert TopicStore._get_prefix_upper_bound("퟿") == ""  # Surrogates are skipped
+
+
+def test_prefix_ending_in_the_last_code_point(database_path: str) -> None:
+    value = "x" + chr(sys.maxunicode)
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_attributes(
+                map_identifier,
+                [
+                    Attribute("code", value, "first"),
+                    Attribute("code", value + "z", "second"),
+                    Attribute("code", "y", "third"),
+                ],
+                ontology_mode=OntologyMode.LENIENT,
+            )
+            identifiers = await store.get_attribute_entity_identifiers(
+                map_identifier, "code", AttributeOperator.PREFIX, value
+            )
+            assert identifiers == ["first", "second"]
+
+    asyncio.run(scenario())
+
+
+def test_invalid_number_raises_topic_db_error(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            with pytest.raises(TopicDbError):
+                await store.get_attribute_entity_identifiers(
+                    map_identifier, "population", AttributeOperator.GREATER_THAN, "many", data_type=DataType.NUMBER
+                )
+
+    asyncio.run(scenario())
+
+
+def test_entities_are_listed_once_and_paged_in_sql(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            attributes = []
+            for index in range(50):
+                entity_identifier = f"entity-{index:02}"
+                # Every entity has the attribute in two languages; it is listed (once) at its least value
+                attributes.append(Attribute("rank", str(index), entity_identifier, data_type=DataType.NUMBER))
+                attributes.append(
+                    Attribute(
+                        "rank", str(100 - index), entity_identifier, data_type=DataType.NUMBER, language=Language.NLD
+                    )
+                )
+            await store.set_attributes(map_identifier, attributes, ontology_mode=OntologyMode.LENIENT)
+
+            expected = sorted(
+                (f"entity-{index:02}" for index in range(50)),
+                key=lambda identifier: min(int(identifier[-2:]), 100 - int(identifier[-2:])),
+            )
+            streamed = [
+                identifier
+                async for identifier in store.iterate_attribute_entity_identifiers(
+                    map_identifier, "rank", AttributeOperator.GREATER_THAN_OR_EQUAL, 0, data_type=DataType.NUMBER
+                )
+            ]
+            assert streamed == expected
+            pages = []
+            for offset in range(0, 50, 7):
+                pages.extend(
+                    await store.get_attribute_entity_identifiers(
+                        map_identifier,
+                        "rank",
+                        AttributeOperator.GREATER_THAN_OR_EQUAL,
+                        0,
+                        data_type=DataType.NUMBER,
+                        offset=offset,
+                        limit=7,
+                    )
+                )
+            assert pages == expected
+            # Filtered by language, every entity has the one value
+            identifiers = await store.get_attribute_entity_identifiers(
+                map_identifier,
+                "rank",
+                AttributeOperator.LESS_THAN,
+                55,
+                data_type=DataType.NUMBER,
+                language=Language.NLD,
+            )
+            assert identifiers == [f"entity-{index:02}" for index in range(49, 45, -1)]
+
+    asyncio.run(scenario())
+
+
+def test_typed_value_index_is_migrated(database_path: str) -> None:
+    async def create() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+
+    asyncio.run(create())
+    # The index as databases created before it covered the entity identifier have it
+    connection = sqlite3.connect(database_path)
+    connection.execute("DROP INDEX attribute_7_index")
+    connection.execute("CREATE INDEX attribute_7_index ON attribute (map_identifier, name, data_type, typed_value)")
+    connection.commit()
+    connection.close()
+    asyncio.run(create())
+    connection = sqlite3.connect(database_path)
+    try:
+        columns = [record[2] for record in connection.execute("PRAGMA index_info(attribute_7_index)")]
+    finally:
+        connection.close()
+    assert columns == ["map_identifier", "name", "data_type", "typed_value", "entity_identifier"]
@@ -0,0 +1,117 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+from collections.abc import Hashable
+from typing import Any
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.batchloader import BatchLoader
+from aiotopicdb.store.topicstore import TopicStore
+
+
+class Failed(Exception):
+    pass
+
+
+def test_keys_of_a_tick_are_loaded_together() -> None:
+    async def scenario() -> None:
+        loads: list[tuple[Hashable, list[Hashable]]] = []
+
+        async def load(group: Hashable, keys: list[Hashable]) -> dict[Hashable, Any]:
+            loads.append((group, keys))
+            await asyncio.sleep(0)
+            return {key: key.upper() for key in keys if key != "missing"}  # type: ignore
+
+        loader = BatchLoader(load, batch_size=2)
+        results = await asyncio.gather(
+            loader.get(1, "oslo"),
+            loader.get(1, "bergen"),
+            loader.get(1, "oslo"),
+            loader.get(1, "missing"),
+            loader.get(2, "oslo"),
+        )
+        assert results == ["OSLO", "BERGEN", "OSLO", None, "OSLO"]
+        # One load per group and batch; a key requested twice is loaded once
+        assert loads == [(1, ["oslo", "bergen"]), (1, ["missing"]), (2, ["oslo"])]
+
+        loads.clear()
+        assert await loader.get(1, "oslo") == "OSLO"
+        assert await loader.get(1, "bergen") == "BERGEN"
+        assert loads == [(1, ["oslo"]), (1, ["bergen"])]
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_the_batch() -> None:
+    async def scenario() -> None:
+        async def load(group: Hashable, keys: list[Hashable]) -> dict[Hashable, Any]:
+            if group == 1:
+                raise Failed
+            return {key: key for key in keys}
+
+        loader = BatchLoader(load)
+        results = await asyncio.gather(
+            loader.get(1, "oslo"), loader.get(1, "bergen"), loader.get(2, "oslo"), return_exceptions=True
+        )
+        assert isinstance(results[0], Failed)
+        assert isinstance(results[1], Failed)
+        assert results[2] == "oslo"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_callers() -> None:
+    async def scenario() -> None:
+        release = asyncio.Event()
+
+        async def load(group: Hashable, keys: list[Hashable]) -> dict[Hashable, Any]:
+            await release.wait()
+            return {key: key for key in keys}
+
+        loader = BatchLoader(load)
+        cancelled = asyncio.create_task(loader.get(1, "oslo"))
+        waiting = asyncio.create_task(loader.get(1, "oslo"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        release.set()
+        assert await waiting == "oslo"
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+    asyncio.run(scenario())
+
+
+def test_topics_are_batch_loaded(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_topics(map_identifier, [Topic(identifier=f"topic-{index}") for index in range(5)])
+
+            load = store._topic_loader.load
+            loads = []
+
+            async def counting_load(group: Hashable, keys: list[Hashable]) -> dict[Hashable, Any]:
+                loads.append(sorted(keys))  # type: ignore
+                return await load(group, keys)
+
+            store._topic_loader.load = counting_load
+            topics = await asyncio.gather(
+                *(store.get_topic(map_identifier, f"topic-{index}") for index in range(5)),
+                store.get_topic(map_identifier, "unknown"),
+            )
+            assert [topic.identifier if topic else None for topic in topics] == [
+                *(f"topic-{index}" for index in range(5)),
+                None,
+            ]
+            assert loads == [[*(f"topic-{index}" for index in range(5)), "unknown"]]
+
+    asyncio.run(scenario())
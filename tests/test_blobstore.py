@@ -0,0 +1,175 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+
+import pytest
+from helpers import USER_IDENTIFIER, assert_populated, populate
+
+from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.store.blobstore import BlobStore
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.storagelayout import StorageLayout
+from aiotopicdb.store.topicstore import TopicStore
+
+CONFIGURATIONS = [(storage_layout, shard_count) for storage_layout in StorageLayout for shard_count in (0, 3)]
+IMAGE = random.Random(42).randbytes(16 * 1024)
+
+
+def blob_references(database_path: str) -> dict[str, int]:
+    connection = sqlite3.connect(database_path)
+    try:
+        return dict(connection.execute("SELECT hash, reference_count FROM blob").fetchall())
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize(("storage_layout", "shard_count"), CONFIGURATIONS)
+def test_clone_keeps_blobs_of_purged_map(
+    tmp_path, database_path: str, storage_layout: StorageLayout, shard_count: int
+) -> None:
+    blob_store = BlobStore(os.path.join(tmp_path, "blobs"), threshold=1024)
+    image_hash = BlobStore.hash(IMAGE)
+
+    async def scenario() -> None:
+        async with TopicStore(
+            database_path, blob_store=blob_store, storage_layout=storage_layout, shard_count=shard_count
+        ) as store:
+            await store.create_database()
+            source = await store.create_map(USER_IDENTIFIER, "Source")
+            await populate(store, source)
+            await store.set_occurrence(
+                source,
+                Occurrence(
+                    identifier="norway-image", instance_of="image", topic_identifier="norway", resource_data=IMAGE
+                ),
+                ontology_mode=OntologyMode.LENIENT,
+            )
+            # Large data goes to the blob store, small data stays inline
+            assert blob_store.hashes() == [image_hash]
+            source_path = store.get_shard_path(store._get_shard(source))
+            assert blob_references(source_path) == {image_hash: 1}
+
+            clone = await store.clone_map(source, USER_IDENTIFIER, "Clone")
+            clone_path = store.get_shard_path(store._get_shard(clone))
+            assert clone_path != source_path or not shard_count  # The clone's blob reference is in another shard
+            assert blob_references(clone_path)[image_hash] == (1 if clone_path != source_path else 2)
+
+            # Purging the source, and collecting blobs without a grace period, leaves the clone's blob alone
+            await (await store.delete_map(source))
+            assert await store.collect_blobs(grace_period=0) == 0
+            assert blob_store.hashes() == [image_hash]
+            assert await store.get_occurrence_data(clone, "norway-image") == IMAGE
+            await assert_populated(store, clone)
+
+            # Once the last map referring to it is gone, the blob is collected
+            await (await store.delete_map(clone))
+            assert await store.collect_blobs(grace_period=0) == 1
+            assert blob_store.hashes() == []
+            for shard in store._get_shards():
+                assert blob_references(store.get_shard_path(shard)) == {}
+
+    asyncio.run(scenario())
+
+
+def test_blobs_are_shared_by_identical_data(tmp_path, database_path: str) -> None:
+    blob_store = BlobStore(os.path.join(tmp_path, "blobs"), threshold=1024)
+
+    async def scenario() -> None:
+        async with TopicStore(database_path, blob_store=blob_store) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_occurrences(
+                map_identifier,
+                [
+                    Occurrence(identifier=f"image-{index}", instance_of="image", resource_data=IMAGE)
+                    for index in range(3)
+                ],
+                ontology_mode=OntologyMode.LENIENT,
+            )
+            assert blob_references(database_path) == {BlobStore.hash(IMAGE): 3}
+            assert len(blob_store.hashes()) == 1
+            for index in range(3):
+                assert await store.get_occurrence_data(map_identifier, f"image-{index}") == IMAGE
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("committed", [True, False])
+def test_write_during_collection_keeps_blob(tmp_path, database_path: str, committed: bool) -> None:
+    # A writer refers to an unreferenced, expired blob again after the collector has listed it as a candidate: the
+    # blob is refreshed, and the new reference either committed or not yet, by the time it would be deleted
+    blob_store = BlobStore(os.path.join(tmp_path, "blobs"), threshold=1024)
+    image_hash = BlobStore.hash(IMAGE)
+    list_hashes = blob_store.hashes
+
+    def refer_after_listing(min_age: float = 0.0) -> list[str]:
+        result = list_hashes(min_age)
+        assert result == [image_hash]
+        blob_store.write(IMAGE)
+        if committed:
+            connection = sqlite3.connect(database_path)
+            try:
+                connection.execute(
+                    """INSERT INTO occurrence (map_identifier, identifier, instance_of, scope, resource_ref,
+                    topic_identifier, language, resource_hash) VALUES (1, 'image-2', 'image', '*', '', '', 'eng', ?)""",
+                    (image_hash,),
+                )
+                connection.commit()
+            finally:
+                connection.close()
+        return result
+
+    async def scenario() -> None:
+        async with TopicStore(database_path, blob_store=blob_store) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            occurrence = Occurrence(identifier="image-1", instance_of="image", resource_data=IMAGE)
+            await store.set_occurrence(map_identifier, occurrence)
+            occurrence.resource_data = b"Replaced"
+            await store.set_occurrence(map_identifier, occurrence)
+            assert blob_references(database_path) == {image_hash: 0}
+            os.utime(blob_store.path(image_hash), (0, 0))  # Long expired
+
+            blob_store.hashes = refer_after_listing  # type: ignore
+            assert await store.collect_blobs(grace_period=60) == 0
+            assert blob_store.read(image_hash) == IMAGE
+            if not committed:
+                await store.set_occurrence(
+                    map_identifier, Occurrence(identifier="image-2", instance_of="image", resource_data=IMAGE)
+                )
+            assert await store.get_occurrence_data(map_identifier, "image-2") == IMAGE
+
+            # Without a new reference, the blob is collected
+            del blob_store.hashes
+            await store.set_occurrence(
+                map_identifier, Occurrence(identifier="image-2", instance_of="image", resource_data=b"Replaced")
+            )
+            os.utime(blob_store.path(image_hash), (0, 0))
+            assert await store.collect_blobs(grace_period=60) == 1
+            assert blob_store.hashes() == []
+
+    asyncio.run(scenario())
+
+
+def test_collect_keeps_refreshed_blobs(tmp_path) -> None:
+    blob_store = BlobStore(os.path.join(tmp_path, "blobs"), threshold=1024)
+    image_hash = blob_store.write(IMAGE)
+    os.utime(blob_store.path(image_hash), (0, 0))
+    blob_store.write(IMAGE)  # Refreshed since it was listed
+    assert not blob_store.collect(image_hash, min_age=60)
+    assert blob_store.read(image_hash) == IMAGE
+    os.utime(blob_store.path(image_hash), (0, 0))
+    assert blob_store.collect(image_hash, min_age=60)
+    assert not blob_store.collect(image_hash, min_age=60)
+    # A later write stores it anew
+    assert blob_store.write(IMAGE) == image_hash
+    assert blob_store.read(image_hash) == IMAGE
+    assert os.listdir(os.path.dirname(blob_store.path(image_hash))) == [image_hash]
@@ -0,0 +1,87 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import pytest
+from helpers import ROW_COUNTS, USER_IDENTIFIER, assert_populated, count_rows, populate
+
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.storagelayout import StorageLayout
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize("storage_layout", list(StorageLayout))
+def test_clone_is_copied_in_chunks(database_path: str, storage_layout: StorageLayout) -> None:
+    copied: dict[str, list[int]] = {}
+
+    def progress(table: str, rows: int) -> None:
+        copied.setdefault(table, []).append(rows)
+
+    async def scenario() -> None:
+        async with TopicStore(database_path, storage_layout=storage_layout) as store:
+            await store.create_database()
+            source = await store.create_map(USER_IDENTIFIER, "Source", description="Norway")
+            await populate(store, source)
+            await store.set_topics(source, [Topic(identifier=f"topic-{index}") for index in range(25)])
+            clone = await store.clone_map(source, USER_IDENTIFIER, "Clone", chunk_size=10, progress=progress)
+
+            await assert_populated(store, clone)
+            await assert_populated(store, source)
+            assert copied["topic"] == [10, 20, 28]
+            assert count_rows(database_path, "topic", clone) == count_rows(database_path, "topic", source)
+            clone_map = await store.get_map(clone, USER_IDENTIFIER)
+            assert clone_map is not None
+            assert (clone_map.name, clone_map.description, clone_map.owner) == ("Clone", "Norway", True)
+
+    asyncio.run(scenario())
+
+
+def test_clone_without_resource_data(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            source = await store.create_map(USER_IDENTIFIER, "Source")
+            await populate(store, source)
+            clone = await store.clone_map(source, USER_IDENTIFIER, include_resource_data=False)
+
+            assert count_rows(database_path, "occurrence", clone) == ROW_COUNTS["occurrence"]
+            assert await store.get_occurrence_data(clone, "oslo-note") is None
+            await assert_populated(store, source)
+            clone_map = await store.get_map(clone)
+            assert clone_map is not None
+            assert clone_map.name == "Source"
+
+    asyncio.run(scenario())
+
+
+def test_failed_clone_is_removed(database_path: str) -> None:
+    def interrupt(table: str, rows: int) -> None:
+        if table == "member":
+            raise Interrupted
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            source = await store.create_map(USER_IDENTIFIER, "Source")
+            await populate(store, source)
+            with pytest.raises(Interrupted):
+                await store.clone_map(source, USER_IDENTIFIER, progress=interrupt)
+
+            assert [map_.identifier for map_ in await store.get_maps(USER_IDENTIFIER)] == [source]
+            assert await store.get_map(source + 1) is None
+            for table in ROW_COUNTS:
+                assert count_rows(database_path, table, source + 1) == 0
+            with pytest.raises(TopicDbError):
+                await store.clone_map(source + 1, USER_IDENTIFIER)
+
+    asyncio.run(scenario())
@@ -0,0 +1,109 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import random
+import sqlite3
+import zlib
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.store.codec import Codec, LzmaCodec, ZlibCodec
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+TEXT = b"Oslo is the capital of Norway. " * 100
+NOISE = random.Random(42).randbytes(4 * 1024)
+
+
+class XorCodec(Codec):
+    # Compressed data that can only be decompressed by a codec configured the same way
+    name = "xor"
+
+    def __init__(self, key: int) -> None:
+        self.key = key
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(byte ^ self.key for byte in zlib.compress(data))
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(bytes(byte ^ self.key for byte in data))
+
+
+def stored_codecs(database_path: str) -> dict[str, str | None]:
+    connection = sqlite3.connect(database_path)
+    try:
+        return dict(connection.execute("SELECT identifier, resource_codec FROM occurrence").fetchall())
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("codec", [ZlibCodec(), LzmaCodec()])
+def test_resource_data_round_trip(database_path: str, codec: Codec) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path, codec=codec) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_occurrences(
+                map_identifier,
+                [
+                    Occurrence(identifier="text", instance_of="note", resource_data=TEXT),
+                    Occurrence(identifier="noise", instance_of="note", resource_data=NOISE),
+                    Occurrence(identifier="image", instance_of="image", resource_data=TEXT),
+                ],
+            )
+            # Data is only stored compressed if that makes it smaller, and never for media types
+            assert stored_codecs(database_path) == {"text": codec.name, "noise": None, "image": None}
+            assert await store.get_occurrence_data(map_identifier, "text") == TEXT
+            assert await store.get_occurrence_data(map_identifier, "noise") == NOISE
+            assert await store.get_occurrence_data(map_identifier, "image") == TEXT
+
+        # Built-in codecs are decoded by any store
+        async with TopicStore(database_path) as store:
+            assert await store.get_occurrence_data(map_identifier, "text") == TEXT
+
+    asyncio.run(scenario())
+
+
+def test_codecs_are_kept_per_store(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path, codec=XorCodec(1)) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_occurrence(
+                map_identifier, Occurrence(identifier="text", instance_of="note", resource_data=TEXT)
+            )
+            # Another store's codec of the same name doesn't replace this store's
+            other_store = TopicStore(database_path, codec=XorCodec(2))
+            assert other_store.codecs["xor"].key == 2  # type: ignore
+            assert await store.get_occurrence_data(map_identifier, "text") == TEXT
+            await other_store.close()
+
+        async with TopicStore(database_path) as store:
+            with pytest.raises(TopicDbError, match="Unknown codec"):
+                await store.get_occurrence_data(map_identifier, "text")
+        # A store that doesn't compress with it can still be given the codec, to read data written with it
+        async with TopicStore(database_path, codecs=[XorCodec(1)]) as store:
+            assert await store.get_occurrence_data(map_identifier, "text") == TEXT
+
+    asyncio.run(scenario())
+
+
+def test_codec_names_are_checked() -> None:
+    with pytest.raises(TopicDbError):
+        TopicStore(codec=XorCodec(1), codecs=[XorCodec(2)])
+    XorCodec.name = ""
+    try:
+        with pytest.raises(TopicDbError):
+            TopicStore(codec=XorCodec(1))
+    finally:
+        XorCodec.name = "xor"
+    # The same codec may be given twice
+    codec = XorCodec(1)
+    assert TopicStore(codec=codec, codecs=[codec]).codecs["xor"] is codec
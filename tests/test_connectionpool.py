@@ -0,0 +1,128 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiosqlite
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.store.connectionpool import ConnectionPool
+from aiotopicdb.store.retrievalmode import RetrievalMode
+from aiotopicdb.store.topicstore import TopicStore
+
+
+class Failed(Exception):
+    pass
+
+
+def test_idle_connections_are_reused(database_path: str) -> None:
+    async def scenario() -> None:
+        pool = ConnectionPool(database_path, size=1)
+        async with pool.connection() as db:
+            await db.execute("CREATE TABLE city (name TEXT)")
+            await db.commit()
+            first = db
+        assert len(pool) == 1
+        async with pool.connection() as db, pool.connection() as other_db:
+            assert db is first
+            assert other_db is not first
+            # Left uncommitted
+            await db.execute("INSERT INTO city VALUES ('Oslo')")
+        # Only as many connections as the pool's size are kept; uncommitted changes are rolled back on release
+        assert len(pool) == 1
+        async with pool.connection() as db:
+            assert not db.in_transaction
+            async with db.execute("SELECT COUNT(*) FROM city") as cursor:
+                assert (await cursor.fetchone())[0] == 0
+
+        # A connection whose user failed is not handed out again
+        with pytest.raises(Failed):
+            async with pool.connection() as db:
+                raise Failed
+        assert len(pool) == 0
+        await pool.close()
+
+        unpooled = ConnectionPool(database_path)
+        async with unpooled.connection():
+            pass
+        assert len(unpooled) == 0
+
+    asyncio.run(scenario())
+
+
+def test_fan_out_is_limited(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path, pool_size=4, max_concurrency=2) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_occurrences(
+                map_identifier,
+                [
+                    Occurrence(
+                        identifier=f"note-{index}",
+                        instance_of="note",
+                        topic_identifier="oslo",
+                        resource_data=f"Note {index}".encode(),
+                    )
+                    for index in range(6)
+                ],
+            )
+
+            # Count the connections in use at the same time
+            connection = store.connection_pool.connection
+            in_use = 0
+            most_in_use = 0
+
+            @asynccontextmanager
+            async def counting_connection() -> AsyncIterator[aiosqlite.Connection]:
+                nonlocal in_use, most_in_use
+                async with connection() as db:
+                    in_use += 1
+                    most_in_use = max(most_in_use, in_use)
+                    try:
+                        await asyncio.sleep(0.01)
+                        yield db
+                    finally:
+                        in_use -= 1
+
+            store.connection_pool.connection = counting_connection  # type: ignore
+            occurrences = await store.get_topic_occurrences(
+                map_identifier, "oslo", inline_resource_data=RetrievalMode.INLINE_RESOURCE_DATA
+            )
+            assert sorted(occurrence.resource_data for occurrence in occurrences) == [
+                f"Note {index}".encode() for index in range(6)
+            ]
+            assert most_in_use == 2
+
+    asyncio.run(scenario())
+
+
+def test_gather(database_path: str) -> None:
+    async def scenario() -> None:
+        finished = []
+
+        async def fetch(value: int, delay: float = 0.0) -> int:
+            await asyncio.sleep(delay)
+            if value < 0:
+                raise Failed
+            finished.append(value)
+            return value
+
+        async with TopicStore(database_path, max_concurrency=1) as store:
+            # Results are in order; nested fan-outs share the request's limit
+            assert await store._gather(fetch(1, 0.02), fetch(2), store._gather(fetch(3), fetch(4))) == [1, 2, [3, 4]]
+            # The first error is raised once every fetch has finished
+            finished.clear()
+            with pytest.raises(Failed):
+                await store._gather(fetch(-1), fetch(5, 0.02))
+            assert finished == [5]
+
+    asyncio.run(scenario())
@@ -0,0 +1,137 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.occurrence import Occurrence
+from aiotopicdb.store import contentindex
+from aiotopicdb.store.contentindex import ContentIndex, tokenize
+from aiotopicdb.store.similarity import SimilarTopic
+from aiotopicdb.store.topicstore import TopicStore
+
+DOCUMENTS = [
+    ("oslo", "Oslo is the capital of Norway, on the Oslofjord."),
+    ("bergen", "Bergen is a city in Norway, between the fjords."),
+    ("stockholm", "Stockholm is the capital of Sweden."),
+    ("tulips", "Tulips flower every spring."),
+    ("empty", "1999 -- 42"),
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def numpy(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Scores the main segment with NumPy and in pure Python
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(contentindex, "np", None)
+
+
+def identifiers(similar: list[tuple[str, float]]) -> list[str]:
+    return [identifier for identifier, _ in similar]
+
+
+def note(topic_identifier: str, text: str, instance_of: str = "note") -> Occurrence:
+    return Occurrence(
+        identifier=f"{topic_identifier}-{instance_of}",
+        instance_of=instance_of,
+        topic_identifier=topic_identifier,
+        resource_data=text.encode("utf-8"),
+    )
+
+
+def test_tokenize() -> None:
+    assert tokenize("Oslo's 2 fjords, OSLO_fjords and a 42nd fjord") == {
+        "oslo": 2,
+        "fjords": 2,
+        "and": 1,
+        "nd": 1,
+        "fjord": 1,
+    }
+
+
+def test_similar(numpy: None) -> None:
+    index = ContentIndex(DOCUMENTS)
+    assert len(index) == 4  # Documents without terms are left out
+    assert "empty" not in index
+    similar = index.similar("oslo")
+    assert identifiers(similar) == ["stockholm", "bergen"]
+    assert 0.0 < similar[1][1] < similar[0][1] < 1.0
+    assert index.similar("tulips") == []
+    assert index.similar("unknown") == []
+    assert identifiers(index.similar("oslo", k=1)) == ["stockholm"]
+
+    # Changed and new documents go to the delta segment until the index is compacted
+    index.set_document("bergen", "Bergen is the rainy capital of western Norway.")
+    index.set_document("copenhagen", "Copenhagen is the capital of Denmark.")
+    index.remove_document("stockholm")
+    assert len(index) == 4
+    changed = index.similar("oslo")
+    assert identifiers(changed) == ["bergen", "copenhagen"]
+    assert identifiers(index.similar("copenhagen")) == ["oslo", "bergen"]
+    index.compact()
+    assert len(index) == 4
+    compacted = index.similar("oslo")
+    assert identifiers(compacted) == identifiers(changed)
+    # Compaction brings the norms up to date: the scores are those of a freshly built index
+    rebuilt = ContentIndex(
+        [
+            DOCUMENTS[0],
+            ("bergen", "Bergen is the rainy capital of western Norway."),
+            DOCUMENTS[3],
+            ("copenhagen", "Copenhagen is the capital of Denmark."),
+        ]
+    ).similar("oslo")
+    assert [score for _, score in compacted] == pytest.approx([score for _, score in rebuilt])
+
+
+def test_both_scorings_agree(monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("numpy")
+    numpy_scores = ContentIndex(DOCUMENTS).similar("oslo")
+    monkeypatch.setattr(contentindex, "np", None)
+    python_scores = ContentIndex(DOCUMENTS).similar("oslo")
+    assert identifiers(python_scores) == identifiers(numpy_scores)
+    assert [score for _, score in python_scores] == pytest.approx([score for _, score in numpy_scores])
+
+
+def test_similar_by_content(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_occurrences(
+                map_identifier,
+                [note(identifier, text) for identifier, text in DOCUMENTS[:4]]
+                + [note("tulips", "Oslo capital Norway", instance_of="url")],  # Not prose
+            )
+
+            assert await store.similar_by_content(map_identifier, "oslo") == [
+                SimilarTopic(identifier, score) for identifier, score in ContentIndex(DOCUMENTS[:4]).similar("oslo")
+            ]
+            index = await store.get_content_index(map_identifier)
+            assert await store.get_content_index(map_identifier) is index
+
+            # The store's own writes update the index in place
+            await store.set_occurrence(map_identifier, note("tulips", "Tulips grow near Oslo, the capital.", "text"))
+            assert await store.get_content_index(map_identifier) is index
+            assert index.version == await store.get_map_version(map_identifier)
+            similar = await store.similar_by_content(map_identifier, "oslo")
+            assert "tulips" in [topic.identifier for topic in similar]
+
+            # Other writes make it be rebuilt
+            async with TopicStore(database_path) as other_store:
+                await other_store.set_occurrence(map_identifier, note("bergen", "Bergen has fjords and rain."))
+            rebuilt_index = await store.get_content_index(map_identifier)
+            assert rebuilt_index is not index
+            assert "bergen" not in [
+                topic.identifier for topic in await store.similar_by_content(map_identifier, "oslo")
+            ]
+
+    asyncio.run(scenario())
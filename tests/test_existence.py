@@ -0,0 +1,82 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.attribute import Attribute
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.topicstore import MAX_BIND_VARIABLES, TopicStore
+
+
+def test_existence_sees_other_writers(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as reader, TopicStore(database_path) as writer:
+            await reader.create_database()
+            map_identifier = await reader.create_map(USER_IDENTIFIER, "Map")
+            await reader.set_topic(map_identifier, Topic(identifier="oslo"), ontology_mode=OntologyMode.LENIENT)
+            assert await reader.topic_exists(map_identifier, "oslo")
+            assert not await reader.topic_exists(map_identifier, "bergen")  # The reader's filter is now built
+
+            # A key written by another store is never reported as absent
+            await writer.set_topic(map_identifier, Topic(identifier="bergen"), ontology_mode=OntologyMode.LENIENT)
+            assert await reader.topic_exists(map_identifier, "bergen")
+            assert await reader.topics_exist(map_identifier, ["oslo", "bergen", "stavanger"]) == {"oslo", "bergen"}
+
+    asyncio.run(scenario())
+
+
+def test_existence_follows_own_writes(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            assert not await store.topic_exists(map_identifier, "oslo")
+            await store.set_topic(map_identifier, Topic(identifier="oslo"), ontology_mode=OntologyMode.LENIENT)
+            assert await store.topic_exists(map_identifier, "oslo")
+
+    asyncio.run(scenario())
+
+
+def test_existence_of_more_keys_than_a_chunk_holds(database_path: str) -> None:
+    count = 2 * MAX_BIND_VARIABLES + 100
+    names = ("population", "area")
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_topics(map_identifier, [Topic(identifier=f"topic-{index}") for index in range(count)])
+            # Every other entity has both attributes, the others only the first
+            await store.set_attributes(
+                map_identifier,
+                [
+                    Attribute(name, "1", f"entity-{index}")
+                    for index in range(count)
+                    for name in (names if index % 2 == 0 else names[:1])
+                ],
+            )
+
+            keys = [f"topic-{index}" for index in range(count + 300)]
+            assert await store.topics_exist(map_identifier, keys) == set(keys[:count])
+
+            # Entity identifiers repeat across names; only the pairs that exist are reported
+            attribute_keys = [(f"entity-{index}", name) for index in range(count + 50) for name in (*names, "height")]
+            expected = {
+                (entity_identifier, name)
+                for entity_identifier, name in attribute_keys
+                if int(entity_identifier.split("-")[1]) < count
+                and (name == "population" or (name == "area" and int(entity_identifier.split("-")[1]) % 2 == 0))
+            }
+            assert len({key[0] for key in attribute_keys}) > MAX_BIND_VARIABLES
+            assert await store.attributes_exist(map_identifier, attribute_keys) == expected
+            assert await store.attribute_exists(map_identifier, "entity-1", "population")
+            assert not await store.attribute_exists(map_identifier, "entity-1", "area")
+
+    asyncio.run(scenario())
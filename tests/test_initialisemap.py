@@ -0,0 +1,95 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+from helpers import USER_IDENTIFIER, count_rows
+
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+
+def base_names(database_path: str, map_identifier: int) -> set[tuple]:
+    connection = sqlite3.connect(database_path)
+    try:
+        return set(
+            connection.execute(
+                """SELECT topic.identifier, topic.instance_of, basename.name, basename.scope, basename.language
+                FROM topic JOIN basename ON basename.map_identifier = topic.map_identifier
+                AND basename.topic_identifier = topic.identifier
+                WHERE topic.map_identifier = ?""",
+                (map_identifier,),
+            ).fetchall()
+        )
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("shard_count", [0, 2])
+def test_initialise_map(database_path: str, shard_count: int) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path, shard_count=shard_count) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            version = await store.get_map_version(map_identifier)
+
+            assert await store.initialise_map(map_identifier)
+            assert await store.get_map_version(map_identifier) > version
+            shard_path = store.get_shard_path(store._get_shard(map_identifier))
+            assert count_rows(shard_path, "topic", map_identifier) == len(store.base_topics)
+            assert count_rows(shard_path, "basename", map_identifier) == len(store.base_topics)
+            home = await store.get_topic(map_identifier, "home")
+            assert home is not None
+            assert await store.topic_exists(map_identifier, "home")
+
+            # Only once
+            assert not await store.initialise_map(map_identifier)
+            assert count_rows(shard_path, "topic", map_identifier) == len(store.base_topics)
+            with pytest.raises(TopicDbError, match="does not exist"):
+                await store.initialise_map(map_identifier + 10)
+
+    asyncio.run(scenario())
+
+
+def test_template_matches_set_topics(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            initialised_map = await store.create_map(USER_IDENTIFIER, "Initialised")
+            written_map = await store.create_map(USER_IDENTIFIER, "Written")
+            await store.initialise_map(initialised_map)
+            await store.set_topics(
+                written_map, [Topic(identifier=identifier, name=name) for identifier, name in store.base_topics.items()]
+            )
+            assert base_names(database_path, initialised_map) == base_names(database_path, written_map)
+
+    asyncio.run(scenario())
+
+
+def test_existing_base_topics_are_kept(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_topic(map_identifier, Topic(identifier="home", instance_of="navigation", name="Start"))
+            await store.initialise_map(map_identifier)
+
+            assert ("home", "navigation", "Start", "*", "eng") in base_names(database_path, map_identifier)
+            assert count_rows(database_path, "basename", map_identifier) == len(store.base_topics)
+
+        # The template follows the store's base topics when the database is (re)created
+        async with TopicStore(database_path) as store:
+            store.base_topics["fjord"] = "Fjord"
+            await store.create_database()
+            other_map = await store.create_map(USER_IDENTIFIER, "Other")
+            await store.initialise_map(other_map)
+            assert await store.topic_exists(other_map, "fjord")
+
+    asyncio.run(scenario())
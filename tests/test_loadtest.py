@@ -0,0 +1,55 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOAD_TEST = os.path.join(ROOT, "benchmarks", "loadtest.py")
+
+
+def run_load_test(*arguments: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, LOAD_TEST, *arguments],
+        check=False,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        env={**os.environ, "PYTHONPATH": os.path.join(ROOT, "src")},
+    )
+
+
+@pytest.mark.parametrize("shards", ["0", "2"])
+def test_smoke_run(database_path: str, shards: str) -> None:
+    result = run_load_test(
+        "--clients=4",
+        "--duration=0.5",
+        "--interval=0.25",
+        "--maps=2",
+        "--topics=50",
+        "--associations=100",
+        "--occurrences=50",
+        f"--shards={shards}",
+        f"--database={database_path}",
+    )
+    assert result.returncode == 0, result.stderr
+    summary = {line.split()[0]: line.split()[1:] for line in result.stdout.splitlines() if line and line[0].isalpha()}
+    count, *_, errors, busy = summary["all"]
+    assert int(count) > 0
+    # Writers may find the database locked; any other error is a bug
+    assert errors == busy
+    assert "get_topic" in summary
+    assert "set_association" in summary
+
+
+def test_unknown_operation() -> None:
+    result = run_load_test("--mix=get_topic=1,get_everything=1")
+    assert result.returncode != 0
+    assert "Unknown operation 'get_everything'" in result.stderr
@@ -0,0 +1,130 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import random
+
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.location import Location
+from aiotopicdb.store import topicstore
+from aiotopicdb.store.topicstore import TopicStore
+
+CITIES = {
+    "oslo": (59.9139, 10.7522),
+    "bergen": (60.3913, 5.3221),
+    "stockholm": (59.3293, 18.0686),
+    "suva": (-18.1248, 178.4501),
+    "apia": (-13.8333, -171.7667),
+}
+
+
+def location(identifier: str, latitude: float, longitude: float) -> Location:
+    result = Location(identifier=identifier, topic_identifier=identifier)
+    result.set_position(latitude, longitude)
+    return result
+
+
+async def add_cities(store: TopicStore, map_identifier: int) -> None:
+    for identifier, (latitude, longitude) in CITIES.items():
+        await store.set_location(map_identifier, location(identifier, latitude, longitude))
+
+
+def test_bounding_box(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await add_cities(store, map_identifier)
+
+            locations = await store.get_locations(map_identifier, 59.0, 4.0, 61.0, 11.0)
+            assert sorted(location_.identifier for location_ in locations) == ["bergen", "oslo"]
+            # A box whose minimum longitude is the greater crosses the antimeridian
+            locations = await store.get_locations(map_identifier, -20.0, 170.0, -10.0, -170.0)
+            assert sorted(location_.identifier for location_ in locations) == ["apia", "suva"]
+            assert len(await store.get_locations(map_identifier, -90.0, -180.0, 90.0, 180.0, limit=2)) == 2
+
+            oslo = await store.get_location(map_identifier, "oslo")
+            assert oslo is not None
+            assert (oslo.latitude, oslo.longitude) == CITIES["oslo"]
+
+    asyncio.run(scenario())
+
+
+def test_maps_with_nearby_identifiers_are_kept_apart(database_path: str) -> None:
+    # Map identifiers above 2^24 are not exactly representable in the R*Tree's 32-bit floats
+    map_identifiers = (2**24, 2**24 + 1)
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            for map_identifier in map_identifiers:
+                await store.set_location(map_identifier, location(f"place-{map_identifier}", 59.9139, 10.7522))
+            for map_identifier in map_identifiers:
+                locations = await store.get_locations(map_identifier, 59.0, 10.0, 61.0, 11.0)
+                assert [location_.identifier for location_ in locations] == [f"place-{map_identifier}"]
+                nearest = await store.get_nearest_locations(map_identifier, 59.9, 10.7, limit=5)
+                assert [location_.identifier for location_, _ in nearest] == [f"place-{map_identifier}"]
+
+    asyncio.run(scenario())
+
+
+def test_nearest_locations(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await add_cities(store, map_identifier)
+
+            nearest = await store.get_nearest_locations(map_identifier, 59.91, 10.75, limit=2)
+            assert [location_.identifier for location_, _ in nearest] == ["oslo", "bergen"]
+            assert nearest[0][1] < 1.0
+            assert 300.0 < nearest[1][1] < 310.0
+            # Nearest across the antimeridian
+            nearest = await store.get_nearest_locations(map_identifier, -16.0, 179.9, limit=1)
+            assert [location_.identifier for location_, _ in nearest] == ["suva"]
+            # Within a radius only
+            nearest = await store.get_nearest_locations(map_identifier, 59.91, 10.75, limit=5, radius=450.0)
+            assert [location_.identifier for location_, _ in nearest] == ["oslo", "bergen", "stockholm"]
+
+    asyncio.run(scenario())
+
+
+def test_nearest_locations_with_capped_candidates(database_path: str, monkeypatch) -> None:
+    # Boxes holding more candidates than a step may load are shrunk; the result is the same as a full scan's
+    monkeypatch.setattr(topicstore, "MAX_NEAREST_CANDIDATES", 8)
+    loaded: list[int] = []
+    get_locations = TopicStore.get_locations
+
+    async def get_locations_spy(self: TopicStore, *args, **kwargs) -> list[Location]:
+        result = await get_locations(self, *args, **kwargs)
+        loaded.append(len(result))
+        return result
+
+    monkeypatch.setattr(TopicStore, "get_locations", get_locations_spy)
+    generator = random.Random(7)
+    positions = {
+        f"place-{index}": (generator.uniform(59.0, 61.0), generator.uniform(9.0, 12.0)) for index in range(200)
+    }
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            for identifier, (latitude, longitude) in positions.items():
+                await store.set_location(map_identifier, location(identifier, latitude, longitude))
+            expected = sorted(
+                positions, key=lambda identifier: TopicStore._distance(60.0, 10.5, *positions[identifier])
+            )
+            for limit in (1, 5, 20):
+                loaded.clear()
+                nearest = await store.get_nearest_locations(map_identifier, 60.0, 10.5, limit=limit)
+                assert [location_.identifier for location_, _ in nearest] == expected[:limit]
+                if limit < 8:
+                    assert max(loaded) <= 9  # The cap, and one more to tell a full box from a crowded one
+
+    asyncio.run(scenario())
@@ -0,0 +1,214 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import logging
+import sqlite3
+
+import pytest
+from helpers import ROW_COUNTS, USER_IDENTIFIER, assert_populated, count_rows, populate
+
+from aiotopicdb.store.storagelayout import StorageLayout
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+CONFIGURATIONS = [(storage_layout, shard_count) for storage_layout in StorageLayout for shard_count in (0, 3)]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def catalog_rows(database_path: str, table: str, column: str, map_identifier: int) -> int:
+    connection = sqlite3.connect(database_path)
+    try:
+        return connection.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} = ?", (map_identifier,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def assert_purged(store: TopicStore, map_identifier: int) -> None:
+    path = store.get_shard_path(store._get_shard(map_identifier))
+    for table in ROW_COUNTS:
+        assert count_rows(path, table, map_identifier) == 0
+    assert catalog_rows(store.database_path, "map", "identifier", map_identifier) == 0
+    assert catalog_rows(store.database_path, "map_purge", "map_identifier", map_identifier) == 0
+
+
+@pytest.mark.parametrize(("storage_layout", "shard_count"), CONFIGURATIONS)
+def test_delete_and_purge_keeps_clone(database_path: str, storage_layout: StorageLayout, shard_count: int) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path, storage_layout=storage_layout, shard_count=shard_count) as store:
+            await store.create_database()
+            source = await store.create_map(USER_IDENTIFIER, "Source")
+            await populate(store, source)
+            clone = await store.clone_map(source, USER_IDENTIFIER, "Clone")
+
+            task = await store.delete_map(source)
+            assert task is not None
+            # The tombstone hides the map straight away, before its content is purged
+            assert [map_.identifier for map_ in await store.get_maps(USER_IDENTIFIER)] == [clone]
+            await task
+
+            assert_purged(store, source)
+            await assert_populated(store, clone)
+
+    asyncio.run(scenario())
+
+
+def test_purge_requires_tombstone(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+            with pytest.raises(TopicDbError):
+                await store.purge_map(map_identifier)
+            await assert_populated(store, map_identifier)
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(("storage_layout", "shard_count"), CONFIGURATIONS)
+def test_resume_interrupted_purge(database_path: str, storage_layout: StorageLayout, shard_count: int) -> None:
+    def interrupt(table: str, purged_rows: int) -> None:
+        raise Interrupted
+
+    async def interrupted() -> int:
+        async with TopicStore(database_path, storage_layout=storage_layout, shard_count=shard_count) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+            assert await store.delete_map(map_identifier, purge=False) is None
+            # Stops after the first committed batch
+            with pytest.raises(Interrupted):
+                await store.purge_map(map_identifier, batch_size=1, progress=interrupt)
+        return map_identifier
+
+    async def resumed(map_identifier: int) -> None:
+        async with TopicStore(database_path, shard_count=shard_count) as store:
+            assert await store.get_maps(USER_IDENTIFIER) == []
+            assert await store.resume_map_purges() == [map_identifier]
+            assert_purged(store, map_identifier)
+            assert await store.resume_map_purges() == []
+
+    map_identifier = asyncio.run(interrupted())
+    store = TopicStore(database_path, shard_count=shard_count)
+    path = store.get_shard_path(store._get_shard(map_identifier))
+    assert sum(count_rows(path, table, map_identifier) for table in ROW_COUNTS) == sum(ROW_COUNTS.values()) - 1
+    asyncio.run(resumed(map_identifier))
+
+
+def test_delete_unknown_map_raises(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            with pytest.raises(TopicDbError):
+                await store.delete_map(map_identifier + 1)
+            assert await store.delete_map(map_identifier, purge=False) is None
+            # Already deleted
+            with pytest.raises(TopicDbError):
+                await store.delete_map(map_identifier)
+            assert catalog_rows(database_path, "map_purge", "map_identifier", map_identifier + 1) == 0
+
+    asyncio.run(scenario())
+
+
+def test_failed_background_purge_is_logged(database_path: str, caplog: pytest.LogCaptureFixture) -> None:
+    async def failing_purge(map_identifier: int) -> None:
+        raise TopicDbError("Disk on fire")
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            store.purge_map = failing_purge  # type: ignore
+            task = await store.delete_map(map_identifier)
+            assert task is not None
+            await asyncio.wait([task])
+            assert not store._purge_tasks
+
+    with caplog.at_level(logging.ERROR, logger="aiotopicdb.store.topicstore"):
+        asyncio.run(scenario())
+    assert [record.getMessage() for record in caplog.records] == ["Error purging map 1"]
+    assert "Disk on fire" in caplog.text
+
+
+def test_close_stops_background_purges(database_path: str) -> None:
+    async def interrupted() -> int:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+            purge_map = store.purge_map
+            store.purge_map = lambda map_identifier: purge_map(map_identifier, batch_size=1, pause=60.0)  # type: ignore
+            task = await store.delete_map(map_identifier)
+            assert task is not None
+            while count_rows(database_path, "topic", map_identifier) == ROW_COUNTS["topic"]:
+                await asyncio.sleep(0.01)
+        # Closing the store cancelled the purge (rather than closing its connection under it)
+        assert task.cancelled()
+        return map_identifier
+
+    async def resumed(map_identifier: int) -> None:
+        async with TopicStore(database_path) as store:
+            assert await store.resume_map_purges() == [map_identifier]
+            assert_purged(store, map_identifier)
+
+    map_identifier = asyncio.run(interrupted())
+    assert count_rows(database_path, "topic", map_identifier) == ROW_COUNTS["topic"] - 1
+    asyncio.run(resumed(map_identifier))
+
+
+def test_purge_removes_full_text_rows(database_path: str) -> None:
+    # Occurrence identifiers are bound, so characters that are full-text query syntax do no harm
+    identifiers = ["oslo-note", 'quoted"note', "or OR note*"]
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            source = await store.create_map(USER_IDENTIFIER, "Source")
+            await populate(store, source)
+            connection = sqlite3.connect(database_path)
+            try:
+                for identifier in identifiers[1:]:
+                    connection.execute(
+                        """INSERT INTO occurrence (map_identifier, identifier, instance_of, scope, resource_ref,
+                        topic_identifier, language) VALUES (?, ?, 'note', '*', '', 'oslo', 'eng')""",
+                        (source, identifier),
+                    )
+                connection.executemany(
+                    "INSERT INTO text (occurrence_identifier, resource_data) VALUES (?, 'Oslo')",
+                    [(identifier,) for identifier in [*identifiers, "elsewhere"]],
+                )
+                connection.commit()
+            finally:
+                connection.close()
+            clone = await store.clone_map(source, USER_IDENTIFIER)
+            connection = sqlite3.connect(database_path)
+            try:
+                connection.execute(
+                    "DELETE FROM occurrence WHERE map_identifier = ? AND identifier != ?", (clone, "oslo-note")
+                )
+                connection.commit()
+            finally:
+                connection.close()
+
+            task = await store.delete_map(source)
+            assert task is not None
+            await task
+
+            connection = sqlite3.connect(database_path)
+            try:
+                remaining = connection.execute("SELECT occurrence_identifier FROM text ORDER BY 1").fetchall()
+            finally:
+                connection.close()
+            # The clone still refers to its note
+            assert remaining == [("elsewhere",), ("oslo-note",)]
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import sqlite3
+
+from helpers import USER_IDENTIFIER, populate
+
+from aiotopicdb.models.location import Location
+from aiotopicdb.models.temporal import Temporal
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.topicstore import TopicStore
+
+
+def test_temporal_and_location_writes_bump_map_version(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            version = await store.get_map_version(map_identifier)
+
+            temporal = Temporal(identifier="founding", topic_identifier="oslo")
+            temporal.start_date = "1040-01-01"
+            await store.set_temporal(map_identifier, temporal)
+            assert await store.get_map_version(map_identifier) > version
+            version = await store.get_map_version(map_identifier)
+
+            location = Location(identifier="oslo-centre", topic_identifier="oslo")
+            location.coordinates = "59.9139, 10.7522"
+            await store.set_location(map_identifier, location)
+            assert await store.get_map_version(map_identifier) > version
+            version = await store.get_map_version(map_identifier)
+
+            await store.delete_temporal(map_identifier, "founding")
+            assert await store.get_map_version(map_identifier) > version
+            version = await store.get_map_version(map_identifier)
+
+            await store.delete_location(map_identifier, "oslo-centre")
+            assert await store.get_map_version(map_identifier) > version
+
+    asyncio.run(scenario())
+
+
+def test_writes_bump_map_version_once_per_transaction(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            topics = [Topic(identifier=f"topic-{index}", name=f"Topic {index}") for index in range(100)]
+            await store.set_topics(map_identifier, topics, ontology_mode=OntologyMode.LENIENT)
+            assert await store.get_map_version(map_identifier) == 1
+            # Deleting what is not there changes nothing
+            await store.delete_temporal(map_identifier, "unknown")
+            await store.delete_location(map_identifier, "unknown")
+            assert await store.get_map_version(map_identifier) == 1
+
+            # A clone's content is copied in chunks, but its version is set once
+            clone_identifier = await store.clone_map(map_identifier, USER_IDENTIFIER, chunk_size=10)
+            assert await store.get_map_version(clone_identifier) == 1
+
+    asyncio.run(scenario())
+
+
+def test_legacy_map_state_triggers_are_dropped(database_path: str) -> None:
+    async def create() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+
+    asyncio.run(create())
+    # A per-row trigger as databases created by earlier versions have them
+    connection = sqlite3.connect(database_path)
+    connection.execute(
+        """CREATE TRIGGER topic_state_insert_trigger AFTER INSERT ON topic BEGIN
+        INSERT INTO map_state (map_identifier, version) VALUES (new.map_identifier, 1)
+        ON CONFLICT (map_identifier) DO UPDATE SET version = version + 1;
+        END"""
+    )
+    connection.commit()
+    connection.close()
+
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+            assert await store.get_map_version(map_identifier) == 3  # One per 'populate' write
+
+    asyncio.run(scenario())
+    connection = sqlite3.connect(database_path)
+    try:
+        triggers = connection.execute("SELECT name FROM sqlite_schema WHERE name GLOB '*_state_*_trigger'").fetchall()
+    finally:
+        connection.close()
+    assert triggers == []
@@ -0,0 +1,74 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+
+def test_writes_are_lenient_by_default(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_topic(map_identifier, Topic(identifier="oslo", instance_of="undeclared"))
+            assert await store.topic_exists(map_identifier, "oslo")
+
+    asyncio.run(scenario())
+
+
+def test_strict_mode_accepts_declared_types_only(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            strict = OntologyMode.STRICT
+
+            # Base topics, and types defined by the same write, are declared
+            await store.set_topics(
+                map_identifier,
+                [Topic(identifier="city", instance_of="topic"), Topic(identifier="oslo", instance_of="city")],
+                ontology_mode=strict,
+            )
+            assert (map_identifier, "city") in store.ontology_registry
+            # An existing topic that is not used as a type is not one
+            await store.set_topic(map_identifier, Topic(identifier="norway"), ontology_mode=strict)
+            with pytest.raises(TopicDbError, match="norway"):
+                await store.set_topic(
+                    map_identifier, Topic(identifier="bergen", instance_of="norway"), ontology_mode=strict
+                )
+            assert not await store.topic_exists(map_identifier, "bergen")
+            with pytest.raises(TopicDbError, match="country"):
+                await store.set_association(
+                    map_identifier,
+                    Association(
+                        identifier="oslo-norway",
+                        instance_of="association",
+                        src_topic_ref="oslo",
+                        src_role_spec="city",
+                        dest_topic_ref="norway",
+                        dest_role_spec="country",
+                    ),
+                    ontology_mode=strict,
+                )
+
+            # Types used by lenient writes are picked up when the registry is reloaded
+            await store.set_topic(map_identifier, Topic(identifier="country"))
+            await store.set_topic(map_identifier, Topic(identifier="sweden", instance_of="country"))
+            await store.set_topic(
+                map_identifier, Topic(identifier="denmark", instance_of="country"), ontology_mode=strict
+            )
+            assert await store.topic_exists(map_identifier, "denmark")
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+from helpers import USER_IDENTIFIER, populate
+
+from aiotopicdb.store.topicgraph import Hop, TopicGraph, TopicGraphBuilder
+from aiotopicdb.store.topicstore import TopicStore
+
+# Two routes of two hops from 'a' to 'd', and one of three
+ROWS = [
+    ("a", "from", "b", "to", "road"),
+    ("b", "from", "d", "to", "road"),
+    ("a", "from", "c", "to", "rail"),
+    ("c", "from", "d", "to", "rail"),
+    ("a", "from", "e", "to", "road"),
+    ("e", "from", "f", "to", "road"),
+    ("f", "from", "d", "to", "road"),
+    ("a", "from", "b", "to", "road"),  # Parallel to the first
+    ("x", "from", "y", "to", "road"),
+]
+
+
+def build() -> TopicGraph:
+    builder = TopicGraphBuilder()
+    builder.add(ROWS)
+    return builder.build()
+
+
+def nodes(path: list[Hop]) -> list[str]:
+    return [path[0].topic_identifier, *(hop.neighbour_identifier for hop in path)]
+
+
+def test_shortest_paths_first() -> None:
+    graph = build()
+    paths = graph.find_paths("a", "d")
+    assert len(paths) == 3
+    assert sorted(nodes(path) for path in paths[:2]) == [["a", "b", "d"], ["a", "c", "d"]]
+    assert nodes(paths[2]) == ["a", "e", "f", "d"]
+    assert graph.find_paths("a", "d", k=1)[0][0].neighbour_identifier in ("b", "c")
+
+    # The hops carry the association type and the roles, in the direction walked
+    assert graph.find_paths("d", "c", k=1) == [[Hop("d", "rail", "to", "from", "c")]]
+
+
+def test_path_limits() -> None:
+    graph = build()
+    assert [nodes(path) for path in graph.find_paths("a", "d", instance_ofs=["road"])] == [
+        ["a", "b", "d"],
+        ["a", "e", "f", "d"],
+    ]
+    assert len(graph.find_paths("a", "d", max_depth=2)) == 2
+    assert graph.find_paths("a", "d", max_depth=1) == []
+    assert graph.find_paths("a", "y") == []
+    assert graph.find_paths("a", "unknown") == []
+    assert graph.find_paths("a", "a") == [[]]
+    assert graph.find_paths("a", "d", k=0) == []
+    # An exhausted search returns the paths found so far
+    assert graph.find_paths("a", "d", max_visits=1) == []
+    assert 0 < len(graph.find_paths("a", "d", max_visits=12)) < 3
+
+
+def test_find_paths(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+
+            assert await store.find_paths(map_identifier, "norway", "oslo") == [
+                [Hop("norway", "capital", "country", "city", "oslo")]
+            ]
+            assert await store.find_paths(map_identifier, "oslo", "norway", instance_ofs=["located-in"]) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiosqlite
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.collaborationmode import CollaborationMode
+from aiotopicdb.store.permissioncache import Permission, PermissionCache
+from aiotopicdb.store.topicstore import TopicStore
+
+COLLABORATOR_IDENTIFIER = 2
+VIEW = Permission(False, CollaborationMode.VIEW)
+
+
+def test_least_recently_used_entries_are_evicted() -> None:
+    cache = PermissionCache(max_entries=2)
+    cache.set(1, 10, VIEW)
+    cache.set(1, 11, None)
+    assert cache.get(1, 10) == (True, VIEW)  # Now the most recently used
+    cache.set(1, 12, VIEW)
+    assert len(cache) == 2
+    assert cache.get(1, 11) == (False, None)
+    assert cache.get(1, 10) == (True, VIEW)
+    assert cache.get(1, 12) == (True, VIEW)
+    # Replacing an entry evicts nothing
+    cache.set(1, 12, None)
+    assert len(cache) == 2
+    assert cache.get(1, 10) == (True, VIEW)
+    cache.invalidate(10)
+    assert len(cache) == 1
+
+
+def test_results_read_before_an_invalidation_are_not_cached() -> None:
+    cache = PermissionCache()
+    generation = cache.generation
+    cache.invalidate(10, 1)
+    cache.set(1, 10, VIEW, generation)
+    assert cache.get(1, 10) == (False, None)
+    cache.set(1, 10, VIEW, cache.generation)
+    assert cache.get(1, 10) == (True, VIEW)
+
+
+def test_revoke_during_read(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.create_collaboration(map_identifier, COLLABORATOR_IDENTIFIER, CollaborationMode.VIEW)
+
+            # The read has fetched the permission, but not cached it yet, when the collaboration is deleted
+            read = asyncio.Event()
+            revoked = asyncio.Event()
+            connect = store._connect
+            pause = True
+
+            @asynccontextmanager
+            async def pausing_connect(map_identifier: int | None = None) -> AsyncIterator[aiosqlite.Connection]:
+                nonlocal pause
+                async with connect(map_identifier) as db:
+                    yield db
+                if pause:
+                    pause = False
+                    read.set()
+                    await revoked.wait()
+
+            store._connect = pausing_connect  # type: ignore
+            task = asyncio.create_task(store.get_permission(map_identifier, COLLABORATOR_IDENTIFIER))
+            await read.wait()
+            await store.delete_collaboration(map_identifier, COLLABORATOR_IDENTIFIER)
+            revoked.set()
+            assert await task == VIEW  # As of when the read started
+
+            # The revoked permission is not served from the cache
+            assert await store.get_permission(map_identifier, COLLABORATOR_IDENTIFIER) is None
+            hit, permission = store.permission_cache.get(COLLABORATOR_IDENTIFIER, map_identifier)
+            assert hit
+            assert permission is None
+
+    asyncio.run(scenario())
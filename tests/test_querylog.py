@@ -0,0 +1,80 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import aiosqlite
+from helpers import USER_IDENTIFIER, populate
+
+from aiotopicdb.store.querylog import QueryLog
+from aiotopicdb.store.topicstore import TopicStore
+
+BASE_NAME_DELETE = "DELETE FROM basename WHERE map_identifier = ? AND topic_identifier = ?"
+
+
+def test_shape() -> None:
+    assert (
+        QueryLog.shape("SELECT *  FROM topic\n WHERE map_identifier = 7 AND identifier IN (?, ?, ?) AND name = 'It''s'")
+        == "SELECT * FROM topic WHERE map_identifier = ? AND identifier IN (?, ...) AND name = ?"
+    )
+    assert QueryLog.shape("INSERT INTO topic VALUES (?, ?, ?)") == "INSERT INTO topic VALUES (?, ...)"
+    assert QueryLog.shape("SELECT topic_1 FROM t WHERE x > -1.5") == "SELECT topic_1 FROM t WHERE x > ?"
+
+
+def test_full_scans() -> None:
+    plan = (
+        "SCAN topic",
+        "SEARCH basename USING INDEX basename_2_index (map_identifier=? AND topic_identifier=?)",
+        "SCAN text VIRTUAL TABLE INDEX 0:",
+        "SCAN CONSTANT ROW",
+    )
+    assert QueryLog.full_scans(plan) == ("SCAN topic",)
+
+
+def test_slow_statements_are_logged_with_their_plans(database_path: str) -> None:
+    query_log = QueryLog(threshold=0.0)
+
+    async def scenario() -> None:
+        async with TopicStore(database_path, query_log=query_log) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+            await store.get_topics(map_identifier)
+
+    asyncio.run(scenario())
+    assert len(query_log) > 0
+    # An 'executemany' statement is explained with its first set of parameters
+    entries = query_log.entries(shape=BASE_NAME_DELETE)
+    assert entries
+    assert entries[0].parameter_count == 4  # Two topics, two parameters each
+    plan = query_log.get_plan(BASE_NAME_DELETE)
+    assert plan
+    assert all("basename" in step for step in plan)
+    assert not query_log.entries(shape=BASE_NAME_DELETE, full_scans_only=True)
+    query_log.clear()
+    assert len(query_log) == 0
+    assert query_log.get_plan(BASE_NAME_DELETE) is None
+
+
+def test_failed_plans_are_not_cached(database_path: str) -> None:
+    query_log = QueryLog(threshold=0.0)
+
+    async def scenario() -> None:
+        async with aiosqlite.connect(database_path) as connection:
+            db = query_log.connection(connection)
+            await db.execute("CREATE TABLE basename (map_identifier INTEGER, topic_identifier TEXT)")
+            # Without a first set of parameters, there is nothing to explain the statement with
+            await db.executemany(BASE_NAME_DELETE, [])
+            assert query_log.get_plan(BASE_NAME_DELETE) is None
+            assert query_log.entries(shape=BASE_NAME_DELETE)[0].plan == ()
+
+            await db.executemany(BASE_NAME_DELETE, ((1, f"topic-{index}") for index in range(3)))
+            assert query_log.get_plan(BASE_NAME_DELETE) == ("SCAN basename",)
+            entry = query_log.entries(shape=BASE_NAME_DELETE)[-1]
+            assert (entry.parameter_count, entry.full_scans) == (6, ("SCAN basename",))
+
+    asyncio.run(scenario())
@@ -0,0 +1,116 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.store import ranking
+from aiotopicdb.store.ranking import pagerank, topic_scores
+from aiotopicdb.store.rankingmeasure import RankingMeasure
+from aiotopicdb.store.topicgraph import TopicGraph, TopicGraphBuilder
+from aiotopicdb.store.topicstore import TopicStore
+
+# Oslo is the hub; Bergen and Trondheim are also connected to each other
+ROWS = [
+    ("oslo", "city", "bergen", "city", "road"),
+    ("oslo", "city", "trondheim", "city", "road"),
+    ("oslo", "city", "stavanger", "city", "road"),
+    ("bergen", "city", "trondheim", "city", "road"),
+]
+
+
+def build() -> TopicGraph:
+    builder = TopicGraphBuilder()
+    builder.add(ROWS)
+    return builder.build()
+
+
+def road(identifier: str, source: str, destination: str) -> Association:
+    return Association(
+        identifier=identifier,
+        instance_of="road",
+        src_topic_ref=source,
+        src_role_spec="city",
+        dest_topic_ref=destination,
+        dest_role_spec="city",
+    )
+
+
+@pytest.fixture(params=["numpy", "python"])
+def numpy(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Ranks with NumPy and with the pure-Python power iteration
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(ranking, "np", None)
+
+
+def test_pagerank(numpy: None) -> None:
+    scores = {score.identifier: score for score in topic_scores(build())}
+    assert {identifier: score.degree for identifier, score in scores.items()} == {
+        "oslo": 3,
+        "bergen": 2,
+        "trondheim": 2,
+        "stavanger": 1,
+    }
+    assert sum(score.pagerank for score in scores.values()) == pytest.approx(1.0)
+    assert scores["oslo"].pagerank > scores["bergen"].pagerank > scores["stavanger"].pagerank
+    assert scores["bergen"].pagerank == pytest.approx(scores["trondheim"].pagerank)
+
+    # A warm start converges to the same scores, whatever it starts from
+    warm_scores = topic_scores(build(), {"oslo": 0.9, "bergen": 0.1})
+    for score in warm_scores:
+        assert score.pagerank == pytest.approx(scores[score.identifier].pagerank, abs=1e-5)
+    assert len(pagerank(TopicGraphBuilder().build())) == 0
+
+
+def test_both_rankings_agree(monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("numpy")
+    builder = TopicGraphBuilder()
+    builder.add((f"topic-{index % 40}", "a", f"topic-{index * 7 % 40}", "b", "link") for index in range(1, 150))
+    graph = builder.build()
+    numpy_scores = pagerank(graph)
+    monkeypatch.setattr(ranking, "np", None)
+    assert list(pagerank(graph)) == pytest.approx(list(numpy_scores), abs=1e-6)
+
+
+def test_topic_scores(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            first_map = await store.create_map(USER_IDENTIFIER, "First")
+            second_map = await store.create_map(USER_IDENTIFIER, "Second")
+            for index, (source, _, destination, _, _) in enumerate(ROWS):
+                await store.set_association(first_map, road(f"road-{index}", source, destination))
+            await store.set_association(second_map, road("road", "oslo", "bergen"))
+
+            assert await store.update_topic_scores(first_map)
+            # Not recomputed until the map changes, unless forced
+            assert not await store.update_topic_scores(first_map)
+            assert await store.update_topic_scores(first_map, force=True)
+
+            top_topics = await store.get_top_topics(first_map, limit=2)
+            assert len(top_topics) == 2
+            assert top_topics[0].identifier == "oslo"
+            top_topics = await store.get_top_topics(first_map, limit=1, measure=RankingMeasure.DEGREE)
+            assert [(score.identifier, score.degree) for score in top_topics] == [("oslo", 3)]
+            scores = await store.get_topic_scores(first_map, ["stavanger", "oslo", "stavanger", "unknown"])
+            assert sorted(scores) == ["oslo", "stavanger"]
+            assert scores["stavanger"].degree == 1
+
+            # Only the maps that changed since their scores were computed are updated
+            assert await store.update_all_topic_scores() == [second_map]
+            assert await store.update_all_topic_scores() == []
+            await store.set_association(first_map, road("road-new", "stavanger", "bergen"))
+            assert await store.update_all_topic_scores() == [first_map]
+            scores = await store.get_topic_scores(first_map, ["stavanger"])
+            assert scores["stavanger"].degree == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import os
+
+import pytest
+from helpers import ROW_COUNTS, USER_IDENTIFIER, assert_populated, count_rows, populate
+
+from aiotopicdb.store.storagelayout import StorageLayout
+from aiotopicdb.store.topicstore import TopicStore
+
+SHARD_COUNT = 3
+
+
+@pytest.mark.parametrize("storage_layout", list(StorageLayout))
+def test_round_trip_across_shards(database_path: str, storage_layout: StorageLayout) -> None:
+    async def scenario() -> list[int]:
+        async with TopicStore(database_path, storage_layout=storage_layout, shard_count=SHARD_COUNT) as store:
+            await store.create_database()
+            map_identifiers = [await store.create_map(USER_IDENTIFIER, f"Map {index}") for index in range(3)]
+            assert {map_identifier % SHARD_COUNT for map_identifier in map_identifiers} == set(range(SHARD_COUNT))
+            for map_identifier in map_identifiers:
+                await populate(store, map_identifier)
+            for map_identifier in map_identifiers:
+                await assert_populated(store, map_identifier)
+                assert await store.get_storage_layout(map_identifier) is storage_layout
+        return map_identifiers
+
+    map_identifiers = asyncio.run(scenario())
+
+    # The catalog keeps the maps; each map's content is in its own shard, and only there
+    store = TopicStore(database_path, shard_count=SHARD_COUNT)
+    assert count_rows(database_path, "topic", map_identifiers[0]) == 0
+    for map_identifier in map_identifiers:
+        for shard in range(SHARD_COUNT):
+            shard_path = store.get_shard_path(shard)
+            assert os.path.exists(shard_path)
+            for table, count in ROW_COUNTS.items():
+                expected = count if shard == map_identifier % SHARD_COUNT else 0
+                assert count_rows(shard_path, table, map_identifier) == expected
+
+    # Another store on the same files reads everything back
+    async def reopen() -> None:
+        async with TopicStore(database_path, shard_count=SHARD_COUNT) as store:
+            maps = await store.get_maps(USER_IDENTIFIER)
+            assert sorted(map_.identifier for map_ in maps) == map_identifiers
+            for map_identifier in map_identifiers:
+                await assert_populated(store, map_identifier)
+
+    asyncio.run(reopen())
+
+
+@pytest.mark.parametrize("storage_layout", list(StorageLayout))
+def test_clone_into_another_shard(database_path: str, storage_layout: StorageLayout) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path, storage_layout=storage_layout, shard_count=SHARD_COUNT) as store:
+            await store.create_database()
+            source = await store.create_map(USER_IDENTIFIER, "Source")
+            await store.create_map(USER_IDENTIFIER, "Other")  # So the clone gets a different shard than the source
+            await populate(store, source)
+            clone = await store.clone_map(source, USER_IDENTIFIER, "Clone")
+            assert clone % SHARD_COUNT != source % SHARD_COUNT
+            await assert_populated(store, clone)
+            await assert_populated(store, source)
+            for table, count in ROW_COUNTS.items():
+                assert count_rows(store.get_shard_path(clone % SHARD_COUNT), table, clone) == count
+
+    asyncio.run(scenario())
+
+
+def test_unsharded_store_keeps_everything_in_one_database(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+            await assert_populated(store, map_identifier)
+            for table, count in ROW_COUNTS.items():
+                assert count_rows(database_path, table, map_identifier) == count
+            assert not os.path.exists(TopicStore(database_path, shard_count=1).get_shard_path(0))
+
+    asyncio.run(scenario())
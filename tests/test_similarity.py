@@ -0,0 +1,129 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import math
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.store import similarity
+from aiotopicdb.store.similarity import SimilarityIndex, SimilarTopic
+from aiotopicdb.store.similaritymeasure import SimilarityMeasure
+from aiotopicdb.store.topicgraph import TopicGraph, TopicGraphBuilder
+from aiotopicdb.store.topicstore import TopicStore
+
+# Article -> tags
+TAGS = {
+    "fjords": ["norway", "nature"],
+    "glaciers": ["norway", "nature"],
+    "oslo": ["norway"],
+    "tulips": ["netherlands"],
+}
+
+
+def build() -> TopicGraph:
+    builder = TopicGraphBuilder()
+    builder.add((article, "article", tag, "tag", "categorization") for article, tags in TAGS.items() for tag in tags)
+    # A topic tagged twice with the same tag has one neighbour
+    builder.add([("oslo", "article", "norway", "tag", "categorization")])
+    return builder.build()
+
+
+def similar(index: SimilarityIndex, identifier: str, measure: SimilarityMeasure) -> dict[str, float]:
+    graph = index.graph
+    return {graph.identifier(node): score for node, score in index.similar(graph.index(identifier), 10, measure)}
+
+
+def tagging(article: str, tag: str) -> Association:
+    return Association(
+        identifier=f"{article}-{tag}",
+        instance_of="categorization",
+        src_topic_ref=article,
+        src_role_spec="article",
+        dest_topic_ref=tag,
+        dest_role_spec="tag",
+    )
+
+
+@pytest.fixture(params=["numpy", "python"])
+def numpy(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Counts shared neighbours with NumPy and in pure Python
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(similarity, "np", None)
+
+
+def test_similar_topics(numpy: None) -> None:
+    index = SimilarityIndex(build())
+    assert similar(index, "fjords", SimilarityMeasure.JACCARD) == {"glaciers": 1.0, "oslo": 0.5}
+    assert similar(index, "fjords", SimilarityMeasure.COSINE) == {
+        "glaciers": 1.0,
+        "oslo": pytest.approx(1 / math.sqrt(2)),
+    }
+    assert similar(index, "tulips", SimilarityMeasure.JACCARD) == {}
+    # Topics two hops away, through a changed topic's neighbours, are affected by the change
+    graph = index.graph
+    assert {graph.identifier(node) for node in index.affected([graph.index("oslo")])} == {
+        "oslo",
+        "fjords",
+        "glaciers",
+    }
+
+
+def test_hubs_are_not_expanded(numpy: None) -> None:
+    # With 'norway' as a hub, topics with the same neighbours still meet in an LSH bucket, and scores stay exact
+    index = SimilarityIndex(build(), hub_degree=2)
+    assert set(index.hubs) == {index.graph.index("norway")}
+    assert similar(index, "fjords", SimilarityMeasure.JACCARD)["glaciers"] == 1.0
+
+
+def test_fingerprints_follow_neighbour_sets() -> None:
+    index = SimilarityIndex(build())
+    graph = index.graph
+    fingerprints = {graph.identifier(node): index.fingerprint(node) for node in range(graph.node_count)}
+    assert fingerprints["fjords"] == fingerprints["glaciers"]
+    assert fingerprints["fjords"] != fingerprints["oslo"]
+    # Node numbers differ between loads; fingerprints don't
+    builder = TopicGraphBuilder()
+    builder.add([("norway", "tag", "oslo", "article", "categorization")])
+    other_index = SimilarityIndex(builder.build())
+    assert other_index.fingerprint(other_index.graph.index("oslo")) == fingerprints["oslo"]
+
+
+def test_similar_topics_are_refreshed_incrementally(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await store.set_associations(
+                map_identifier, [tagging(article, tag) for article, tags in TAGS.items() for tag in tags]
+            )
+
+            assert await store.update_similar_topics(map_identifier) == 7  # Every topic, tags included
+            assert await store.update_similar_topics(map_identifier) == 0
+            assert await store.get_similar_topics(map_identifier, "fjords") == [
+                SimilarTopic("glaciers", 1.0),
+                SimilarTopic("oslo", 0.5),
+            ]
+            assert await store.get_similar_topics(map_identifier, "fjords", limit=1) == [SimilarTopic("glaciers", 1.0)]
+
+            # Only the topics around the change are recomputed
+            await store.set_association(map_identifier, tagging("oslo", "nature"))
+            recomputed = await store.update_similar_topics(map_identifier)
+            assert 0 < recomputed < 7
+            assert await store.get_similar_topics(map_identifier, "fjords") == [
+                SimilarTopic("glaciers", 1.0),
+                SimilarTopic("oslo", 1.0),
+            ]
+            # A different measure recomputes everything
+            assert await store.update_similar_topics(map_identifier, measure=SimilarityMeasure.COSINE) == 7
+            assert await store.get_similar_topics(map_identifier, "tulips") == []
+
+    asyncio.run(scenario())
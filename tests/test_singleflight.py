@@ -0,0 +1,157 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiosqlite
+import pytest
+from helpers import USER_IDENTIFIER, populate
+
+from aiotopicdb.store.singleflight import SingleFlight
+from aiotopicdb.store.topicstore import TopicStore
+
+
+class Failed(Exception):
+    pass
+
+
+def test_concurrent_calls_are_coalesced() -> None:
+    async def scenario() -> None:
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def fetch() -> list[str]:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return ["oslo"]
+
+        first, *others = await asyncio.gather(*(single_flight.do((1, "fetch"), fetch) for _ in range(3)))
+        assert calls == 1
+        # Callers that joined get copies
+        assert all(other == first and other is not first for other in others)
+        assert len(single_flight) == 0
+        await single_flight.do((1, "fetch"), fetch)
+        assert calls == 2
+
+        async def fail() -> None:
+            await asyncio.sleep(0.01)
+            raise Failed
+
+        results = await asyncio.gather(*(single_flight.do((1, "fail"), fail) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(result, Failed) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_callers() -> None:
+    async def scenario() -> None:
+        single_flight = SingleFlight()
+        started = asyncio.Event()
+        release = asyncio.Event()
+        cancelled = False
+
+        async def fetch() -> str:
+            nonlocal cancelled
+            started.set()
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            return "oslo"
+
+        # The call goes on as long as somebody waits for it
+        first = asyncio.create_task(single_flight.do((1, "fetch"), fetch))
+        second = asyncio.create_task(single_flight.do((1, "fetch"), fetch))
+        await started.wait()
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == "oslo"
+        assert first.cancelled()
+        assert not cancelled
+
+        # ... and is cancelled once nobody does
+        started.clear()
+        release.clear()
+        task = asyncio.create_task(single_flight.do((1, "fetch"), fetch))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        assert cancelled
+
+    asyncio.run(scenario())
+
+
+def test_forgotten_calls_are_not_joined() -> None:
+    async def scenario() -> None:
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def fetch() -> int:
+            nonlocal calls
+            calls += 1
+            number = calls
+            await asyncio.sleep(0.01)
+            return number
+
+        first = asyncio.create_task(single_flight.do((1, "fetch"), fetch))
+        other_map = asyncio.create_task(single_flight.do((2, "fetch"), fetch))
+        await asyncio.sleep(0)
+        single_flight.forget(1)
+        assert len(single_flight) == 1
+        second = asyncio.create_task(single_flight.do((1, "fetch"), fetch))
+        joined = asyncio.create_task(single_flight.do((2, "fetch"), fetch))
+        assert await asyncio.gather(first, other_map, second, joined) == [1, 2, 3, 2]
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("coalesce_reads", [True, False])
+def test_coalesced_reads(database_path: str, coalesce_reads: bool) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path, coalesce_reads=coalesce_reads) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+
+            connect = store._connect
+            connections = 0
+
+            @asynccontextmanager
+            async def counting_connect(map_identifier: int | None = None) -> AsyncIterator[aiosqlite.Connection]:
+                nonlocal connections
+                connections += 1
+                async with connect(map_identifier) as db:
+                    yield db
+
+            store._connect = counting_connect  # type: ignore
+            await store.get_topic_associations(map_identifier, "norway")
+            connections_per_call = connections
+            connections = 0
+            first, *others = await asyncio.gather(
+                store.get_topic_associations(map_identifier, "norway"),
+                store.get_topic_associations(map_identifier, identifier="norway"),  # The same arguments
+                store.get_topic_associations(map_identifier, "norway", None),
+            )
+            assert connections == connections_per_call * (1 if coalesce_reads else 3)
+            assert [association.identifier for association in first] == ["oslo-norway"]
+            assert all(other is not first for other in others)
+            # Calls with other arguments are not
+            connections = 0
+            await asyncio.gather(
+                store.get_topic_associations(map_identifier, "norway"),
+                store.get_topic_associations(map_identifier, "oslo"),
+            )
+            assert connections > connections_per_call
+
+    asyncio.run(scenario())
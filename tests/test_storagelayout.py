@@ -0,0 +1,109 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+from helpers import ROW_COUNTS, USER_IDENTIFIER, assert_populated, count_rows, populate
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.store.ontologymode import OntologyMode
+from aiotopicdb.store.storagelayout import StorageLayout
+from aiotopicdb.store.topicstore import TopicStore
+
+
+def member_type(database_path: str) -> str:
+    connection = sqlite3.connect(database_path)
+    try:
+        return connection.execute("SELECT type FROM sqlite_schema WHERE name = 'member'").fetchone()[0]
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("shard_count", [0, 3])
+def test_migrate_to_compact_and_back(database_path: str, shard_count: int) -> None:
+    async def create() -> list[int]:
+        async with TopicStore(database_path, shard_count=shard_count) as store:
+            await store.create_database()
+            map_identifiers = [await store.create_map(USER_IDENTIFIER, f"Map {index}") for index in range(2)]
+            for map_identifier in map_identifiers:
+                await populate(store, map_identifier)
+        return map_identifiers
+
+    async def migrate(storage_layout: StorageLayout) -> None:
+        async with TopicStore(database_path, shard_count=shard_count) as store:
+            assert await store.migrate_storage_layout(storage_layout)
+            assert not await store.migrate_storage_layout(storage_layout)  # Nothing left to do
+
+    async def check(storage_layout: StorageLayout, map_identifiers: list[int]) -> None:
+        # A fresh store, so that nothing is served from a cache
+        async with TopicStore(database_path, shard_count=shard_count) as store:
+            assert await store.get_storage_layout() is storage_layout
+            for map_identifier in map_identifiers:
+                assert await store.get_storage_layout(map_identifier) is storage_layout
+                await assert_populated(store, map_identifier)
+                path = store.get_shard_path(store._get_shard(map_identifier))
+                assert member_type(path) == ("view" if storage_layout is StorageLayout.COMPACT else "table")
+                for table, count in ROW_COUNTS.items():
+                    assert count_rows(path, table, map_identifier) == count
+
+    map_identifiers = asyncio.run(create())
+    asyncio.run(migrate(StorageLayout.COMPACT))
+    asyncio.run(check(StorageLayout.COMPACT, map_identifiers))
+    asyncio.run(migrate(StorageLayout.STANDARD))
+    asyncio.run(check(StorageLayout.STANDARD, map_identifiers))
+
+
+def test_writes_after_migration(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+            assert await store.migrate_storage_layout(StorageLayout.COMPACT)
+
+            # Members written through the view land in the compact table and bump the map's version
+            version = await store.get_map_version(map_identifier)
+            await store.set_association(
+                map_identifier,
+                Association(
+                    identifier="bergen-norway",
+                    instance_of="city-of",
+                    src_topic_ref="bergen",
+                    src_role_spec="city",
+                    dest_topic_ref="norway",
+                    dest_role_spec="country",
+                ),
+                ontology_mode=OntologyMode.LENIENT,
+            )
+            assert await store.get_map_version(map_identifier) > version
+            associations = await store.get_topic_associations(map_identifier, "norway")
+            assert sorted(association.identifier for association in associations) == ["bergen-norway", "oslo-norway"]
+            association = await store.get_association(map_identifier, "bergen-norway")
+            assert association is not None
+            assert (association.member.src_topic_ref, association.member.dest_topic_ref) == ("bergen", "norway")
+
+            # Setting the association again replaces its member in the compact table
+            await store.set_association(
+                map_identifier,
+                Association(
+                    identifier="bergen-norway",
+                    instance_of="city-of",
+                    src_topic_ref="stavanger",
+                    src_role_spec="city",
+                    dest_topic_ref="norway",
+                    dest_role_spec="country",
+                ),
+                ontology_mode=OntologyMode.LENIENT,
+            )
+            association = await store.get_association(map_identifier, "bergen-norway")
+            assert association is not None
+            assert association.member.src_topic_ref == "stavanger"
+            assert count_rows(database_path, "member", map_identifier) == ROW_COUNTS["member"] + 1
+
+    asyncio.run(scenario())
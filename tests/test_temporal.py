@@ -0,0 +1,122 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.temporal import Temporal
+from aiotopicdb.models.temporaltype import TemporalType
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+
+def temporal(
+    identifier: str, start_date: str, end_date: str | None = None, topic_identifier: str = "norway"
+) -> Temporal:
+    result = Temporal(
+        identifier=identifier,
+        type=TemporalType.ERA if end_date else TemporalType.EVENT,
+        topic_identifier=topic_identifier,
+    )
+    result.start_date = start_date
+    if end_date:
+        result.end_date = end_date
+    return result
+
+
+TEMPORALS = [
+    temporal("viking-age", "0793-06-08", "1066-09-25"),
+    temporal("oslo-founded", "1040-01-01", topic_identifier="oslo"),
+    temporal("kalmar-union", "1397-06-17", "1523-06-06"),
+    temporal("constitution", "1814-05-17"),
+    temporal("independence", "1905-06-07"),
+]
+
+
+async def add_temporals(store: TopicStore, map_identifier: int) -> None:
+    for temporal_ in TEMPORALS:
+        await store.set_temporal(map_identifier, temporal_)
+
+
+def identifiers(temporals: list[Temporal]) -> list[str]:
+    return [temporal_.identifier for temporal_ in temporals]
+
+
+def test_interval_queries(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            other_map_identifier = await store.create_map(USER_IDENTIFIER, "Other")
+            await add_temporals(store, map_identifier)
+            await store.set_temporal(other_map_identifier, temporal("elsewhere", "1000-01-01"))
+
+            # Eras overlapping the interval are included, whatever their start date
+            temporals = await store.get_temporals(map_identifier, "1000-01-01", "1400-01-01")
+            assert identifiers(temporals) == ["viking-age", "oslo-founded", "kalmar-union"]
+            temporals = await store.get_temporals(map_identifier, "1000-01-01", "1400-01-01", type_=TemporalType.ERA)
+            assert identifiers(temporals) == ["viking-age", "kalmar-union"]
+            temporals = await store.get_temporals(map_identifier, "0001-01-01", "2000-01-01", offset=1, limit=2)
+            assert identifiers(temporals) == ["oslo-founded", "kalmar-union"]
+            assert await store.get_temporals(map_identifier, "1600-01-01", "1700-01-01") == []
+            with pytest.raises(TopicDbError):
+                await store.get_temporals(map_identifier, "1400-01-01", "1000-01-01")
+
+            era = await store.get_temporal(map_identifier, "kalmar-union")
+            assert era is not None
+            assert (era.type_, era.start_date, era.end_date) == (TemporalType.ERA, "1397-06-17", "1523-06-06")
+            assert identifiers(await store.get_topic_temporals(map_identifier, "oslo")) == ["oslo-founded"]
+
+    asyncio.run(scenario())
+
+
+def test_timeline(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await add_temporals(store, map_identifier)
+
+            timeline = await store.get_timeline(map_identifier, "1397-06-17", before=2, after=2)
+            assert identifiers(timeline) == ["viking-age", "oslo-founded", "kalmar-union", "constitution"]
+
+    asyncio.run(scenario())
+
+
+def test_update_and_delete_keep_the_index_in_sync(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await add_temporals(store, map_identifier)
+
+            await store.set_temporal(map_identifier, temporal("constitution", "1914-05-17"))
+            assert identifiers(await store.get_temporals(map_identifier, "1800-01-01", "1850-01-01")) == []
+            temporals = await store.get_temporals(map_identifier, "1900-01-01", "1950-01-01")
+            assert identifiers(temporals) == ["independence", "constitution"]
+
+            await store.delete_temporal(map_identifier, "independence")
+            assert await store.get_temporal(map_identifier, "independence") is None
+            temporals = await store.get_temporals(map_identifier, "1900-01-01", "1950-01-01")
+            assert identifiers(temporals) == ["constitution"]
+
+    asyncio.run(scenario())
+
+
+def test_invalid_temporals_are_rejected(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            with pytest.raises(TopicDbError):
+                await store.set_temporal(map_identifier, Temporal(identifier="undated", topic_identifier="norway"))
+            with pytest.raises(TopicDbError):
+                await store.set_temporal(map_identifier, temporal("detached", "1905-06-07", topic_identifier=""))
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import pytest
+from helpers import USER_IDENTIFIER, populate
+
+from aiotopicdb.models.association import Association
+from aiotopicdb.store import topicgraph
+from aiotopicdb.store.topicgraph import Neighbour, TopicGraph, TopicGraphBuilder
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+# (source topic, source role, destination topic, destination role, association instance of)
+ROWS = [
+    ("oslo", "city", "norway", "country", "capital"),
+    ("bergen", "city", "norway", "country", "located-in"),
+    ("norway", "country", "europe", "continent", "located-in"),
+    ("stockholm", "city", "sweden", "country", "capital"),
+]
+
+
+def build(rows: list[tuple[str, str, str, str, str]]) -> TopicGraph:
+    builder = TopicGraphBuilder()
+    builder.add(rows)
+    return builder.build()
+
+
+@pytest.fixture(params=["numpy", "python"])
+def numpy(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Builds the graph with NumPy and with the pure-Python fallback
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(topicgraph, "np", None)
+
+
+def test_adjacency(numpy: None) -> None:
+    graph = build(ROWS)
+    assert (graph.node_count, graph.edge_count) == (6, 4)
+    assert list(graph.offsets) == [0, 1, 4, 5, 6, 7, 8]
+    assert sorted(graph.neighbours_of("norway")) == [
+        Neighbour("bergen", "located-in", "country", "city"),
+        Neighbour("europe", "located-in", "country", "continent"),
+        Neighbour("oslo", "capital", "country", "city"),
+    ]
+    assert graph.neighbours_of("oslo") == [Neighbour("norway", "capital", "city", "country")]
+    assert graph.neighbours_of("norway", ["capital"]) == [Neighbour("oslo", "capital", "country", "city")]
+    assert graph.neighbours_of("copenhagen") == []
+    assert (graph.degree("norway"), graph.degree("norway", ["located-in"]), graph.degree("copenhagen")) == (3, 2, 0)
+    assert list(graph.degrees()) == [1, 3, 1, 1, 1, 1]
+
+    assert graph.traverse("oslo") == {"oslo": 0, "norway": 1, "bergen": 2, "europe": 2}
+    assert graph.traverse("oslo", max_depth=1) == {"oslo": 0, "norway": 1}
+    assert graph.traverse("oslo", instance_ofs=["capital"]) == {"oslo": 0, "norway": 1}
+    assert graph.is_reachable("bergen", "europe")
+    assert not graph.is_reachable("oslo", "sweden")
+    assert list(graph.connected_components()) == [0, 0, 0, 0, 1, 1]
+
+
+def test_both_builds_are_equivalent(monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("numpy")
+    rows = [(f"topic-{index % 50}", "a", f"topic-{index * 7 % 50}", "b", f"type-{index % 3}") for index in range(200)]
+    numpy_graph = build(rows)
+    monkeypatch.setattr(topicgraph, "np", None)
+    python_graph = build(rows)
+    assert list(numpy_graph.offsets) == list(python_graph.offsets)
+    for index in range(numpy_graph.node_count):
+        identifier = numpy_graph.identifier(index)
+        assert sorted(numpy_graph.neighbours_of(identifier)) == sorted(python_graph.neighbours_of(identifier))
+
+
+def test_memory_budget() -> None:
+    builder = TopicGraphBuilder(memory_budget=TopicGraphBuilder.estimate(6, 3))
+    with pytest.raises(TopicDbError, match="memory budget"):
+        builder.add(ROWS)
+
+
+def test_graph_is_cached_until_the_map_changes(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await populate(store, map_identifier)
+
+            # Concurrent callers share a load
+            graph, *graphs = await asyncio.gather(*(store.get_topic_graph(map_identifier) for _ in range(3)))
+            assert all(other is graph for other in graphs)
+            assert graph.neighbours_of("oslo") == [Neighbour("norway", "capital", "city", "country")]
+            assert await store.get_topic_graph(map_identifier) is graph
+
+            await store.set_association(
+                map_identifier,
+                Association(
+                    identifier="bergen-norway",
+                    instance_of="located-in",
+                    src_topic_ref="bergen",
+                    src_role_spec="city",
+                    dest_topic_ref="norway",
+                    dest_role_spec="country",
+                ),
+            )
+            changed_graph = await store.get_topic_graph(map_identifier)
+            assert changed_graph is not graph
+            assert changed_graph.version > graph.version
+            assert changed_graph.degree("norway") == 2
+
+        # A graph over budget is refused before it is read
+        async with TopicStore(database_path) as store:
+            store.graph_memory_budget = TopicGraphBuilder.estimate(1, 1)
+            with pytest.raises(TopicDbError, match="memory budget"):
+                await store.get_topic_graph(map_identifier)
+
+    asyncio.run(scenario())
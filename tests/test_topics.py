@@ -0,0 +1,121 @@
+"""
+Part of the Contextualise AI (https://contextualise.dev) project
+
+Brett Alistair Kromkamp - brettkromkamp@gmail.com
+December 8, 2024
+"""
+
+import asyncio
+
+import pytest
+from helpers import USER_IDENTIFIER
+
+from aiotopicdb.models.basename import BaseName
+from aiotopicdb.models.language import Language
+from aiotopicdb.models.topic import Topic
+from aiotopicdb.store.retrievalmode import RetrievalMode
+from aiotopicdb.store.topicordering import TopicOrdering
+from aiotopicdb.store.topicstore import TopicStore
+from aiotopicdb.topicdberror import TopicDbError
+
+
+def city(identifier: str, name: str, dutch_name: str | None = None) -> Topic:
+    result = Topic(identifier=identifier, instance_of="city", name=name)
+    if dutch_name:
+        result.add_base_name(BaseName(dutch_name, language=Language.NLD))
+    return result
+
+
+CITIES = [
+    city("oslo", "Oslo"),
+    city("bergen", "Bergen"),
+    city("the-hague", "The Hague", "Den Haag"),
+    city("trondheim", "Trondheim"),
+    city("antwerp", "Antwerp", "Antwerpen"),
+]
+
+
+def names(topic: Topic) -> list[tuple[str, Language]]:
+    return [(base_name.name, base_name.language) for base_name in topic.base_names]
+
+
+async def add_cities(store: TopicStore, map_identifier: int) -> None:
+    await store.initialise_map(map_identifier)
+    await store.set_topics(map_identifier, [Topic(identifier="country"), *CITIES])
+
+
+def test_identifier_ordering(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await add_cities(store, map_identifier)
+
+            pages = []
+            after = None
+            while True:
+                page = await store.get_topics(map_identifier, instance_of="city", after=after, limit=2)
+                if not page:
+                    break
+                pages.append([topic.identifier for topic in page])
+                after = page[-1].identifier
+            assert pages == [["antwerp", "bergen"], ["oslo", "the-hague"], ["trondheim"]]
+
+            # Topics come with all of their base names, as they do when ordered by name
+            topics = await store.get_topics(map_identifier, instance_of="city")
+            assert names(topics[0]) == [("Antwerp", Language.ENG), ("Antwerpen", Language.NLD)]
+            assert names(topics[1]) == [("Bergen", Language.ENG)]
+            topics = await store.get_topics(map_identifier, instance_of="city", language=Language.NLD)
+            assert [names(topic) for topic in topics] == [
+                [("Antwerpen", Language.NLD)],
+                [],
+                [],
+                [("Den Haag", Language.NLD)],
+                [],
+            ]
+            # Base topics are filtered in SQL, so pages are full
+            topics = await store.get_topics(map_identifier, limit=3)
+            assert [topic.identifier for topic in topics] == ["antwerp", "bergen", "country"]
+            topics = await store.get_topics(map_identifier, filter_base_topics=RetrievalMode.DONT_FILTER_BASE_TOPICS)
+            assert "home" in [topic.identifier for topic in topics]
+            assert names(next(topic for topic in topics if topic.identifier == "home")) == [("Home", Language.ENG)]
+            with pytest.raises(TopicDbError):
+                await store.get_topics(map_identifier, after=("Oslo", "oslo"))
+
+    asyncio.run(scenario())
+
+
+def test_name_ordering(database_path: str) -> None:
+    async def scenario() -> None:
+        async with TopicStore(database_path) as store:
+            await store.create_database()
+            map_identifier = await store.create_map(USER_IDENTIFIER, "Map")
+            await add_cities(store, map_identifier)
+
+            topics = await store.get_topics(map_identifier, instance_of="city", ordering=TopicOrdering.NAME)
+            # Once per base name
+            assert [topic.first_base_name.name for topic in topics] == [
+                "Antwerp",
+                "Antwerpen",
+                "Bergen",
+                "Den Haag",
+                "Oslo",
+                "The Hague",
+                "Trondheim",
+            ]
+            topics = await store.get_topics(
+                map_identifier,
+                instance_of="city",
+                ordering=TopicOrdering.NAME,
+                after=("Den Haag", "the-hague"),
+                limit=2,
+            )
+            assert [topic.identifier for topic in topics] == ["oslo", "the-hague"]
+            topics = await store.get_topics(
+                map_identifier, instance_of="city", ordering=TopicOrdering.NAME, language=Language.NLD
+            )
+            assert [names(topic) for topic in topics] == [[("Antwerpen", Language.NLD)], [("Den Haag", Language.NLD)]]
+            with pytest.raises(TopicDbError):
+                await store.get_topics(map_identifier, ordering=TopicOrdering.NAME, after="oslo")
+
+    asyncio.run(scenario())